@@ -0,0 +1,217 @@
+"""
+Векторизованная цепочка улучшения синтезированной речи на NumPy/SciPy.
+
+Повторяет этапы и параметры pydub-цепочки
+(low_pass_filter → compress_dynamic_range → normalize),
+но работает с массивами и без поэлементного цикла Python по всем сэмплам.
+Сэмплы — моно float32 в диапазоне [-1, 1]; внутри расчёт ведётся
+в 16-битной шкале, как в pydub, чтобы результат совпадал с ним.
+"""
+
+import math
+import numpy as np
+
+_INT16_FULL_SCALE = 32768.0
+
+
+def _db_to_float(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def _apply_gain(pcm: np.ndarray, factor) -> np.ndarray:
+    """Умножение с насыщением и округлением вниз (как audioop.mul)."""
+    return np.floor(np.clip(pcm * factor, -32768.0, 32767.0))
+
+
+def low_pass(pcm: np.ndarray, sample_rate: int, cutoff: float) -> np.ndarray:
+    """RC-фильтр первого порядка; первый сэмпл проходит без изменений."""
+    if len(pcm) == 0:
+        return pcm
+    from scipy.signal import lfilter  # scipy.signal импортируется ~1 с — только по необходимости
+    rc = 1.0 / (cutoff * 2 * math.pi)
+    dt = 1.0 / sample_rate
+    alpha = dt / (rc + dt)
+    filtered, _ = lfilter([alpha], [1.0, alpha - 1.0], pcm, zi=[(1.0 - alpha) * pcm[0]])
+    return np.trunc(filtered)
+
+
+def _compress_block(
+    pcm: np.ndarray,
+    history: np.ndarray,
+    attenuation: float,
+    sample_rate: int,
+    threshold: float,
+    ratio: float,
+    attack: float,
+    release: float
+) -> tuple[np.ndarray, float]:
+    """
+    Компрессор с той же моделью, что у pydub.
+
+    RMS по окну attack перед каждым сэмплом считается через кумулятивные суммы;
+    history — хвост предыдущего блока, чтобы окно на стыке было полным.
+    Ослабление меняется только на сэмплах выше порога (ниже порога pydub
+    его удерживает), поэтому рекуррентный шаг проходит лишь по ним,
+    а остальное заполняется вперёд.
+
+    Возвращает обработанный блок и ослабление на его конце.
+    """
+    n = len(pcm)
+    thresh_rms = _INT16_FULL_SCALE * _db_to_float(threshold)
+    look_frames = int(sample_rate * attack / 1000)
+    attack_frames = sample_rate * attack / 1000
+    release_frames = sample_rate * release / 1000
+
+    # RMS окна [i - look_frames, i)
+    offset = len(history)
+    squares = np.concatenate(([0], np.cumsum(np.concatenate((history, pcm)).astype(np.int64) ** 2)))
+    end = np.arange(n) + offset
+    start = np.maximum(end - look_frames, 0)
+    counts = end - start
+    sums = squares[end] - squares[start]
+    rms = np.zeros(n)
+    nonempty = counts > 0
+    rms[nonempty] = np.floor(np.sqrt(sums[nonempty] / counts[nonempty]))
+
+    above = rms > thresh_rms
+    above_idx = np.flatnonzero(above)
+    carried = attenuation
+
+    max_attenuation = (1 - 1.0 / ratio) * 20 * np.log10(rms[above_idx] / thresh_rms)
+    inc = (max_attenuation / attack_frames).tolist()
+    dec = (max_attenuation / release_frames).tolist()
+    values = []
+    for max_att, att_inc, att_dec in zip(max_attenuation.tolist(), inc, dec):
+        if attenuation <= max_att:
+            attenuation = min(attenuation + att_inc, max_att)
+        else:
+            attenuation = max(attenuation - att_dec, 0.0)
+        values.append(attenuation)
+
+    # Ослабление на каждом сэмпле = последнее значение на сэмпле выше порога
+    # (до первого такого сэмпла — унаследованное от предыдущего блока)
+    last_above = np.maximum.accumulate(np.where(above, np.arange(n), -1))
+    per_sample = np.zeros(n)
+    per_sample[above_idx] = values
+    per_sample = np.where(last_above >= 0, per_sample[np.maximum(last_above, 0)], carried)
+
+    if not per_sample.any():
+        return pcm, attenuation
+    gains = np.where(per_sample != 0.0, 10 ** (-per_sample / 20), 1.0)
+    return np.where(per_sample != 0.0, _apply_gain(pcm, gains), pcm), attenuation
+
+
+def compress_dynamic_range(
+    pcm: np.ndarray,
+    sample_rate: int,
+    threshold: float = -20.0,
+    ratio: float = 4.0,
+    attack: float = 5.0,
+    release: float = 50.0
+) -> np.ndarray:
+    """Компрессор pydub (compress_dynamic_range) для целого трека."""
+    if len(pcm) == 0:
+        return pcm
+    compressed, _ = _compress_block(
+        pcm, np.zeros(0), 0.0, sample_rate, threshold, ratio, attack, release
+    )
+    return compressed
+
+
+def normalize_peak(pcm: np.ndarray, headroom: float = 0.1) -> np.ndarray:
+    """Пиковая нормализация до -headroom дБ от полной шкалы."""
+    if len(pcm) == 0:
+        return pcm
+    peak = float(np.max(np.abs(pcm)))
+    if peak == 0:
+        return pcm
+    target_peak = _INT16_FULL_SCALE * _db_to_float(-headroom)
+    return _apply_gain(pcm, target_peak / peak)
+
+
+class AudioEnhancer:
+    """
+    Потоковый вариант цепочки улучшения.
+
+    Фильтр и компрессор сохраняют состояние между блоками, поэтому
+    поблочная обработка даёт тот же результат, что и обработка целиком.
+    Нормализация — по пику каждого блока (для потока общего пика ещё нет).
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        cutoff: float = 6500,
+        threshold: float = -20.0,
+        ratio: float = 2.5,
+        attack: float = 5.0,
+        release: float = 50.0,
+        headroom: float = 0.5
+    ):
+        self.sample_rate = sample_rate
+        self.cutoff = cutoff
+        self.threshold = threshold
+        self.ratio = ratio
+        self.attack = attack
+        self.release = release
+        self.headroom = headroom
+
+        rc = 1.0 / (cutoff * 2 * math.pi)
+        dt = 1.0 / sample_rate
+        self._alpha = dt / (rc + dt)
+        self._look_frames = int(sample_rate * attack / 1000)
+        self._filter_state = None
+        self._history = np.zeros(0)
+        self._attenuation = 0.0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Обрабатывает очередной блок (моно float32 в [-1, 1])."""
+        pcm = np.trunc(np.asarray(samples, dtype=np.float64) * _INT16_FULL_SCALE)
+        if len(pcm) == 0:
+            return pcm.astype(np.float32)
+
+        # 1. Агрессивный low-pass для устранения "цифровой резкости"
+        from scipy.signal import lfilter
+        if self._filter_state is None:
+            # первый сэмпл проходит без изменений (как в pydub)
+            self._filter_state = [(1.0 - self._alpha) * pcm[0]]
+        filtered, self._filter_state = lfilter(
+            [self._alpha], [1.0, self._alpha - 1.0], pcm, zi=self._filter_state
+        )
+        pcm = np.trunc(filtered)
+
+        # 2. Лёгкая компрессия (сглаживает пики → звук "мягче")
+        compressed, self._attenuation = _compress_block(
+            pcm, self._history, self._attenuation, self.sample_rate,
+            self.threshold, self.ratio, self.attack, self.release
+        )
+        if self._look_frames:
+            self._history = np.concatenate((self._history, pcm))[-self._look_frames:]
+
+        # 3. Нормализация с запасом
+        pcm = normalize_peak(compressed, self.headroom)
+        return (pcm / _INT16_FULL_SCALE).astype(np.float32)
+
+
+def enhance_audio_array(
+    samples: np.ndarray,
+    sample_rate: int,
+    cutoff: float = 6500,
+    threshold: float = -20.0,
+    ratio: float = 2.5,
+    attack: float = 5.0,
+    release: float = 50.0,
+    headroom: float = 0.5
+) -> np.ndarray:
+    """
+    Улучшает качество синтезированной речи:
+    - Сильно подавляет высокие частоты (>6.5 кГц), где "резкость"
+    - Применяет компрессию для сглаживания динамики
+    - Нормализует громкость с запасом headroom дБ
+
+    Параметры по умолчанию совпадают с прежней pydub-цепочкой.
+    """
+    enhancer = AudioEnhancer(
+        sample_rate, cutoff, threshold, ratio, attack, release, headroom
+    )
+    return enhancer.process(samples)
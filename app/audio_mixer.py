@@ -0,0 +1,168 @@
+"""
+Потоковое смешивание оригинальной дорожки видео с TTS (NumPy, по блокам).
+
+Обе дорожки декодируются ffmpeg в PCM и читаются блоками, поэтому расход
+памяти не зависит от длины видео. Поддерживается:
+- усиление TTS (tts_volume_boost_db)
+- обрезка/дополнение тишиной до итоговой длительности
+- приглушение оригинала под речью (duck_original_db)
+- нарастание/затухание звука в начале и в конце (fade_in/fade_out)
+
+Результат подаётся прямо в кодировщик через stdin (as_ffmpeg_input)
+или, если нужен файл (MoviePy), пишется в WAV по блокам (write_wav).
+"""
+
+import wave
+from typing import Iterator, Optional
+import numpy as np
+from app.ffmpeg_utils import PipedInput, probe_media, read_pcm_blocks
+
+DEFAULT_BLOCK_SECONDS = 0.5
+# Параметры смеси, если у видео нет своей дорожки
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_CHANNELS = 2
+
+
+def _db_to_gain(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def audio_duration(path: str) -> float:
+    """Длительность аудиофайла: точно из заголовка WAV, иначе через ffmpeg."""
+    try:
+        with wave.open(path, "rb") as wf:
+            return wf.getnframes() / wf.getframerate()
+    except (wave.Error, EOFError, OSError):
+        pass
+    duration = probe_media(path)["duration"]
+    if duration is None:
+        raise ValueError(f"Не удалось определить длительность: {path}")
+    return duration
+
+
+class MixedAudio:
+    def __init__(
+        self,
+        tts_path: str,
+        duration: float,
+        original_path: Optional[str] = None,
+        sample_rate: int = DEFAULT_SAMPLE_RATE,
+        channels: int = DEFAULT_CHANNELS,
+        tts_volume_boost_db: float = 0.0,
+        duck_original_db: float = 0.0,
+        duck_release: float = 0.3,
+        fade_in: float = 0.0,
+        fade_out: float = 0.0,
+        tts_duration: Optional[float] = None,
+        block_seconds: float = DEFAULT_BLOCK_SECONDS
+    ):
+        """
+        Параметры:
+            tts_path: дорожка TTS (звучит с нулевой секунды, не продлевается)
+            duration: итоговая длительность; оригинал обрезается или дополняется тишиной
+            original_path: файл с оригинальной дорожкой (видео или WAV); None — тишина
+            sample_rate, channels: параметры смеси (обе дорожки приводятся к ним)
+            tts_volume_boost_db: усиление TTS
+            duck_original_db: насколько приглушить оригинал, пока звучит речь (0 — не приглушать)
+            duck_release: за сколько секунд после речи оригинал возвращается к полной громкости
+            fade_in, fade_out: нарастание/затухание всей смеси, сек
+            tts_duration: длительность TTS, если уже известна
+            block_seconds: размер блока обработки
+        """
+        self.tts_path = tts_path
+        self.duration = duration
+        self.original_path = original_path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.tts_gain = _db_to_gain(tts_volume_boost_db)
+        self.duck_gain = _db_to_gain(-abs(duck_original_db))
+        self.duck_release = duck_release
+        self.fade_in = fade_in
+        self.fade_out = fade_out
+        self.tts_duration = tts_duration if tts_duration is not None else audio_duration(tts_path)
+        self.block_frames = max(1, int(sample_rate * block_seconds))
+
+    @property
+    def total_frames(self) -> int:
+        return int(round(self.duration * self.sample_rate))
+
+    def _track(self, path: str) -> Iterator[bytes]:
+        return read_pcm_blocks(path, self.sample_rate, self.channels, self.block_frames)
+
+    def _take(self, track: Optional[Iterator[bytes]], frames: int) -> np.ndarray:
+        """Следующий блок дорожки как float32 (frames, channels); после конца — тишина."""
+        block = np.zeros((frames, self.channels), dtype=np.float32)
+        raw = next(track, None) if track is not None else None
+        if raw:
+            pcm = np.frombuffer(raw, dtype=np.int16).reshape(-1, self.channels)[:frames]
+            block[:len(pcm)] = pcm / 32768.0
+        return block
+
+    def _original_gain(self, t: np.ndarray) -> np.ndarray:
+        """Коэффициент оригинала: приглушение под речью с плавным возвратом."""
+        if self.duck_gain >= 1.0:
+            return np.ones_like(t)
+        if self.duck_release > 0:
+            weight = np.clip((self.tts_duration + self.duck_release - t) / self.duck_release, 0.0, 1.0)
+        else:
+            weight = (t < self.tts_duration).astype(np.float32)
+        return 1.0 - (1.0 - self.duck_gain) * weight
+
+    def _fade_gain(self, t: np.ndarray) -> Optional[np.ndarray]:
+        gain = None
+        if self.fade_in > 0:
+            gain = np.clip(t / self.fade_in, 0.0, 1.0)
+        if self.fade_out > 0:
+            fade = np.clip((self.duration - t) / self.fade_out, 0.0, 1.0)
+            gain = fade if gain is None else gain * fade
+        return gain
+
+    def blocks(self) -> Iterator[bytes]:
+        """Смесь блоками s16le (чередующиеся каналы), ровно total_frames кадров."""
+        total = self.total_frames
+        tts_end = int(round(self.tts_duration * self.sample_rate))
+        tts_track = self._track(self.tts_path)
+        original_track = self._track(self.original_path) if self.original_path else None
+        try:
+            for start in range(0, total, self.block_frames):
+                frames = min(self.block_frames, total - start)
+                t = ((start + np.arange(frames)) / self.sample_rate).astype(np.float32)
+
+                # TTS: усиление; за пределами своей длительности не звучит
+                mixed = self._take(tts_track, frames)
+                if start + frames > tts_end:
+                    mixed[max(tts_end - start, 0):] = 0.0
+                if self.tts_gain != 1.0:
+                    mixed *= self.tts_gain
+
+                # Оригинал (с приглушением под речью)
+                if original_track is not None:
+                    original = self._take(original_track, frames)
+                    original *= self._original_gain(t)[:, None]
+                    mixed += original
+
+                fade = self._fade_gain(t)
+                if fade is not None:
+                    mixed *= fade[:, None]
+
+                yield np.clip(np.round(mixed * 32768.0), -32768, 32767).astype(np.int16).tobytes()
+        finally:
+            tts_track.close()
+            if original_track is not None:
+                original_track.close()
+
+    def as_ffmpeg_input(self) -> PipedInput:
+        """Вход для ffmpeg: смесь подаётся в stdin по мере вычисления."""
+        return PipedInput(
+            ["-f", "s16le", "-ar", str(self.sample_rate), "-ac", str(self.channels), "-i", "pipe:0"],
+            self.blocks()
+        )
+
+    def write_wav(self, path: str):
+        """Записывает смесь в WAV (16 бит) по блокам."""
+        with wave.open(path, "wb") as wf:
+            wf.setnchannels(self.channels)
+            wf.setsampwidth(2)
+            wf.setframerate(self.sample_rate)
+            for block in self.blocks():
+                wf.writeframes(block)
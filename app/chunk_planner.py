@@ -0,0 +1,233 @@
+"""
+Планировщик фрагментов текста для синтеза.
+
+Каждый вызов модели имеет постоянные накладные расходы, поэтому короткие
+соседние предложения (восклицания, обращения) объединяются во фрагменты
+длиной около target_length, а слишком длинные предложения делятся
+по границам фраз (запятые, тире, точки с запятой), в крайнем случае — по словам.
+
+- фрагмент не длиннее max_length и лимита символов XTTS для языка
+- объединяются только предложения одного абзаца; после абзаца вставляется пауза
+- разбиение выбирается динамическим программированием: меньше вызовов модели
+  и длины фрагментов ближе к target_length
+- при потоковом синтезе первое предложение можно оставить отдельным
+  фрагментом (separate_first), чтобы первый звук был готов быстрее
+
+plan_chunks() возвращает план (ChunkPlan), его можно посмотреть до синтеза.
+"""
+
+import re
+from dataclasses import dataclass, asdict
+from typing import Callable, Optional
+
+# Лимиты длины текста на один вызов XTTS v2 (символов), см. tokenizer.char_limits
+XTTS_CHAR_LIMITS = {
+    "en": 250, "de": 253, "fr": 273, "es": 239, "it": 213, "pt": 203,
+    "pl": 224, "tr": 226, "ru": 182, "nl": 251, "cs": 186, "ar": 166,
+    "zh-cn": 82, "ja": 71, "hu": 224, "ko": 95
+}
+
+DEFAULT_MAX_LENGTH = 180
+DEFAULT_PARAGRAPH_PAUSE_MS = 350
+# Цена одного вызова модели в единицах штрафа за отклонение от target_length
+DEFAULT_CALL_COST = 0.5
+
+# Штраф за конец фрагмента не на границе предложения: обрыв фразы слышен
+_BREAK_COSTS = {"sentence": 0.0, "clause": 0.15, "word": 0.6}
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+# Граница фразы внутри предложения: знак препинания и пробел после него
+_CLAUSE_RE = re.compile(r"(?<=[,;:—–])\s+|\s+(?=[—–]\s)")
+
+
+@dataclass
+class PlannedChunk:
+    text: str
+    sentences: list[str]           # исходные предложения, которые заканчиваются во фрагменте
+    pause_after_ms: int = 0        # тишина после фрагмента
+    split: str = "sentence"        # граница в конце: "sentence" | "clause" | "word"
+
+    @property
+    def length(self) -> int:
+        return len(self.text)
+
+
+@dataclass
+class ChunkPlan:
+    chunks: list[PlannedChunk]
+    target_length: int
+    max_length: int
+    sentence_count: int            # предложений до объединения/деления
+    language: Optional[str] = None
+
+    @property
+    def texts(self) -> list[str]:
+        return [chunk.text for chunk in self.chunks]
+
+    @property
+    def pauses_ms(self) -> list[int]:
+        return [chunk.pause_after_ms for chunk in self.chunks]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class _Unit:
+    """Предложение, фраза или слово — неделимая единица при упаковке."""
+    text: str
+    split: str = "sentence"        # граница после единицы: "sentence" | "clause" | "word"
+    paragraph_end: bool = False
+    sentence: Optional[str] = None  # исходное предложение, если единица его завершает
+
+
+def _sentence_units(sentence: str, max_length: int) -> list[_Unit]:
+    """
+    Предложение не длиннее max_length — одна единица. Длинное делится на фразы
+    по знакам препинания, фразы длиннее max_length — на слова; где именно
+    резать, решает _pack с учётом штрафа за границу.
+    """
+    if len(sentence) <= max_length:
+        return [_Unit(sentence, sentence=sentence)]
+    units = []
+    for clause in _CLAUSE_RE.split(sentence):
+        clause = clause.strip()
+        if not clause:
+            continue
+        if len(clause) <= max_length:
+            units.append(_Unit(clause, "clause"))
+            continue
+        for word in clause.split():
+            # Слово длиннее лимита режется как есть
+            while len(word) > max_length:
+                units.append(_Unit(word[:max_length], "word"))
+                word = word[max_length:]
+            if word:
+                units.append(_Unit(word, "word"))
+        units[-1].split = "clause"
+    units[-1].split = "sentence"
+    units[-1].sentence = sentence
+    return units
+
+
+def _pack(
+    units: list[_Unit],
+    target_length: int,
+    max_length: int,
+    call_cost: float,
+    merge_sentences: bool = True,
+    first_end: Optional[int] = None
+) -> list[list[_Unit]]:
+    """
+    Делит последовательность единиц на группы подряд идущих так, чтобы длина
+    группы не превышала max_length, а сумма по группам
+    call_cost + ((длина - target) / target)² + штраф за границу в конце группы
+    была минимальной. Окно перебора ограничено max_length, поэтому время линейно
+    по длине текста. merge_sentences=False — предложения не объединяются,
+    длинные только делятся. first_end — индекс единицы, после которой группа
+    обязательно заканчивается (конец первого предложения).
+    """
+    n = len(units)
+    best = [0.0] + [float("inf")] * n
+    start_of = [0] * (n + 1)
+    for end in range(1, n + 1):
+        boundary_cost = _BREAK_COSTS[units[end - 1].split]
+        length = -1
+        for start in range(end - 1, -1, -1):
+            # Не объединяем через границу абзаца (и предложения, если не просили)
+            if start < end - 1 and (
+                units[start].paragraph_end
+                or start == first_end
+                or (not merge_sentences and units[start].split == "sentence")
+            ):
+                break
+            length += len(units[start].text) + 1
+            if length > max_length and start < end - 1:
+                break
+            deviation = (length - target_length) / target_length
+            cost = best[start] + call_cost + deviation * deviation + boundary_cost
+            if cost < best[end]:
+                best[end] = cost
+                start_of[end] = start
+
+    groups = []
+    end = n
+    while end > 0:
+        start = start_of[end]
+        groups.append(units[start:end])
+        end = start
+    groups.reverse()
+    return groups
+
+
+def plan_chunks(
+    text: str,
+    split_sentences: Callable[[str], list[str]],
+    max_length: int = DEFAULT_MAX_LENGTH,
+    target_length: Optional[int] = None,
+    language: Optional[str] = None,
+    pack: bool = True,
+    call_cost: float = DEFAULT_CALL_COST,
+    paragraph_pause_ms: int = DEFAULT_PARAGRAPH_PAUSE_MS,
+    separate_first: bool = False
+) -> ChunkPlan:
+    """
+    Строит план фрагментов для синтеза.
+
+    Параметры:
+        split_sentences: функция разбиения абзаца на предложения (например, nltk)
+        max_length: максимальная длина фрагмента (ограничивается лимитом XTTS для language)
+        target_length: желаемая длина фрагмента (по умолчанию 80% от max_length)
+        pack: объединять короткие соседние предложения (False — как раньше, по предложению)
+        call_cost: цена лишнего вызова модели — чем больше, тем охотнее объединение
+        paragraph_pause_ms: пауза после абзаца
+        separate_first: первое предложение — отдельно от следующих (длинное
+            при этом всё равно делится)
+    """
+    if not text.strip():
+        raise ValueError("Текст не может быть пустым")
+
+    limit = XTTS_CHAR_LIMITS.get(language) if language else None
+    if limit is not None:
+        max_length = min(max_length, limit)
+    if max_length < 1:
+        raise ValueError("max_length должен быть >= 1")
+    if target_length is None:
+        target_length = max(1, int(max_length * 0.8))
+    target_length = min(target_length, max_length)
+
+    units: list[_Unit] = []
+    sentence_count = 0
+    for paragraph in _PARAGRAPH_RE.split(text.strip()):
+        paragraph_units = []
+        for sentence in split_sentences(" ".join(paragraph.split())):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            sentence_count += 1
+            paragraph_units.extend(_sentence_units(sentence, max_length))
+        if paragraph_units:
+            paragraph_units[-1].paragraph_end = True
+            units.extend(paragraph_units)
+
+    if not units:
+        raise ValueError("Не удалось извлечь осмысленные предложения")
+
+    first_end = None
+    if separate_first:
+        first_end = next(i for i, unit in enumerate(units) if unit.split == "sentence")
+    groups = _pack(
+        units, target_length, max_length, call_cost, merge_sentences=pack, first_end=first_end
+    )
+    chunks = []
+    for i, group in enumerate(groups):
+        last = group[-1]
+        is_last = i == len(groups) - 1
+        chunks.append(PlannedChunk(
+            text=" ".join(unit.text for unit in group),
+            sentences=[unit.sentence for unit in group if unit.sentence is not None],
+            pause_after_ms=paragraph_pause_ms if last.paragraph_end and not is_last else 0,
+            split=last.split
+        ))
+
+    return ChunkPlan(chunks, target_length, max_length, sentence_count, language)
@@ -0,0 +1,170 @@
+"""
+Режимы инференса XTTS на CPU.
+
+- динамическое int8-квантование линейных слоёв GPT и декодера
+  (torch.ao.quantization.quantize_dynamic); слои GPT-2 из transformers
+  (Conv1D) перед этим переводятся в nn.Linear, иначе квантование их не видит
+- выполнение под torch.inference_mode
+- число потоков intra-op / inter-op
+- необязательный torch.compile для forward GPT и декодера
+
+Квантование и компиляция меняют численный результат, поэтому
+InferenceMode.variant входит в ключи кэшей латентов и аудио
+(tts_generator.model_key). Сравнить режимы по качеству и скорости:
+python -m benchmarks.inference_modes.
+"""
+
+from contextlib import nullcontext
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, ContextManager, Optional, Union
+
+if TYPE_CHECKING:
+    import torch
+
+
+@dataclass(frozen=True)
+class InferenceMode:
+    name: str
+    quantize: bool = False               # int8 для nn.Linear в GPT и декодере
+    inference_mode: bool = True          # torch.inference_mode вокруг вызовов модели
+    num_threads: Optional[int] = None    # torch.set_num_threads (None — как есть)
+    num_interop_threads: Optional[int] = None
+    compile: bool = False                # torch.compile для forward GPT и декодера
+
+    @property
+    def variant(self) -> str:
+        """Часть ключа кэшей: только то, что меняет результат модели."""
+        parts = []
+        if self.quantize:
+            parts.append("int8")
+        if self.compile:
+            parts.append("compiled")
+        return "+".join(parts)
+
+
+MODES = {
+    # Как раньше: fp32, eager, настройки потоков torch по умолчанию
+    "fp32": InferenceMode("fp32", inference_mode=False),
+    "cpu": InferenceMode("cpu"),
+    "cpu-int8": InferenceMode("cpu-int8", quantize=True),
+    "cpu-int8-compile": InferenceMode("cpu-int8-compile", quantize=True, compile=True)
+}
+DEFAULT_MODE = "fp32"
+
+ModeArg = Union[str, InferenceMode, None]
+
+
+def get_mode(mode: ModeArg = None, **overrides) -> InferenceMode:
+    """Режим по имени (None — DEFAULT_MODE) или сам объект; overrides — поля для замены."""
+    if mode is None:
+        mode = DEFAULT_MODE
+    if isinstance(mode, str):
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим инференса: {mode} (есть: {', '.join(MODES)})")
+        mode = MODES[mode]
+    return replace(mode, **overrides) if overrides else mode
+
+
+def for_device(mode: InferenceMode, device: str) -> InferenceMode:
+    """Квантование и компиляция здесь — только для CPU; на GPU остаются потоки и inference_mode."""
+    if device == "cpu":
+        return mode
+    return replace(mode, quantize=False, compile=False)
+
+
+def configure_threads(mode: InferenceMode):
+    import torch
+
+    if mode.num_threads:
+        torch.set_num_threads(mode.num_threads)
+    if mode.num_interop_threads:
+        try:
+            torch.set_num_interop_threads(mode.num_interop_threads)
+        except RuntimeError:
+            # Задаётся только до первой параллельной операции в процессе
+            pass
+
+
+def inference_context(mode: InferenceMode) -> ContextManager:
+    if not mode.inference_mode:
+        return nullcontext()
+    import torch
+    return torch.inference_mode()
+
+
+def _conv1d_to_linear(module: "torch.nn.Module") -> int:
+    """
+    Заменяет transformers Conv1D (вес [in, out]) на эквивалентный nn.Linear
+    (вес [out, in]) по всему дереву модулей. Возвращает число заменённых слоёв.
+    """
+    import torch
+
+    replaced = 0
+    for name, child in list(module.named_children()):
+        if type(child).__name__ == "Conv1D" and child.weight.dim() == 2:
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features, bias=child.bias is not None)
+            with torch.no_grad():
+                linear.weight.copy_(child.weight.t())
+                if child.bias is not None:
+                    linear.bias.copy_(child.bias)
+            setattr(module, name, linear)
+            replaced += 1
+        else:
+            replaced += _conv1d_to_linear(child)
+    return replaced
+
+
+def _quantize_linear(module: "torch.nn.Module"):
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+
+    quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _compile_forward(module: "torch.nn.Module"):
+    import torch
+
+    if not hasattr(torch, "compile"):
+        raise RuntimeError("torch.compile недоступен: нужен torch>=2.0")
+    # Компилируется метод, а не модуль: generate() из transformers вызывает self.forward
+    module.forward = torch.compile(module.forward, dynamic=True)
+
+
+def apply_inference_mode(xtts, mode: InferenceMode) -> dict:
+    """
+    Готовит загруженную модель Xtts (tts.synthesizer.tts_model) под режим.
+    Модель меняется на месте; вернуть fp32 можно только перезагрузкой.
+
+    Возвращает сводку: сколько слоёв Conv1D переведено в Linear, что сделано.
+    """
+    import torch
+
+    configure_threads(mode)
+    summary = {"mode": mode.name, "converted_conv1d": 0, "quantized": [], "compiled": []}
+
+    parts = {
+        name: getattr(xtts, name, None)
+        for name in ("gpt", "hifigan_decoder")
+    }
+    parts = {name: part for name, part in parts.items() if isinstance(part, torch.nn.Module)}
+
+    if mode.quantize:
+        for name, part in parts.items():
+            part.eval()
+            summary["converted_conv1d"] += _conv1d_to_linear(part)
+            _quantize_linear(part)
+            summary["quantized"].append(name)
+
+    if mode.compile:
+        # Авторегрессионный проход GPT (создаётся init_gpt_for_inference) и вокодер
+        targets = {
+            "gpt_inference": getattr(parts.get("gpt"), "gpt_inference", None),
+            "hifigan_decoder": parts.get("hifigan_decoder")
+        }
+        for name, part in targets.items():
+            if isinstance(part, torch.nn.Module):
+                _compile_forward(part)
+                summary["compiled"].append(name)
+
+    return summary
@@ -0,0 +1,222 @@
+"""
+Индекс записей дискового кэша в памяти для вытеснения (LRU по времени
+обращения, необязательный TTL).
+
+Раньше каждая запись в кэш перечитывала каталог (os.listdir + stat каждого
+файла) — стоимость росла с размером кэша. Индекс строится сканированием
+один раз при создании, дальше обновляется при записи и обращении.
+Каталог может пополняться и другими процессами (например, процессами
+app.tts_pool), поэтому индекс изредка пересканируется (rescan_seconds).
+
+Файлы, начинающиеся с точки (временные), в индекс не попадают.
+
+pin_file закрепляет запись на время чтения: жёсткая ссылка (или копия) под
+скрытым именем, которую вытеснение не трогает. Закрепления, оставшиеся после
+падения процесса, удаляются при сканировании, если они старше PIN_MAX_AGE.
+"""
+
+import os
+import time
+import uuid
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+PIN_PREFIX = ".pin-"
+# Закрепление старше этого считается брошенным (процесс упал, не удалив его), сек
+PIN_MAX_AGE = 6 * 3600
+
+
+def pin_file(path: str, directory: str) -> Optional[str]:
+    """
+    Закрепляет файл записи: жёсткая ссылка (или копия, если файловая система
+    их не поддерживает) под скрытым именем в directory. Удаляет вызывающий код.
+    None — файла уже нет.
+    """
+    suffix = os.path.splitext(path)[1]
+    # Время закрепления — в имени: у жёсткой ссылки mtime общий с записью
+    pinned = os.path.join(directory, f"{PIN_PREFIX}{int(time.time())}-{uuid.uuid4().hex}{suffix}")
+    try:
+        os.link(path, pinned)
+    except FileNotFoundError:
+        return None
+    except OSError:
+        try:
+            shutil.copyfile(path, pinned)
+        except FileNotFoundError:
+            if os.path.exists(pinned):
+                os.remove(pinned)
+            return None
+    return pinned
+
+
+def _pin_is_stale(name: str, now: float) -> bool:
+    try:
+        pinned_at = int(name[len(PIN_PREFIX):].split("-", 1)[0])
+    except ValueError:
+        return True
+    return now - pinned_at > PIN_MAX_AGE
+
+
+def release_pin(pinned: Optional[str]):
+    """Удаляет закрепление pin_file (None — ничего не делает)."""
+    if pinned is not None and os.path.exists(pinned):
+        try:
+            os.remove(pinned)
+        except (OSError, PermissionError):
+            pass
+
+
+class DiskLRUIndex:
+    def __init__(
+        self,
+        root: str,
+        suffix: str,
+        max_bytes: int,
+        ttl_seconds: Optional[float] = None,
+        rescan_seconds: Optional[float] = 300.0
+    ):
+        """
+        Параметры:
+            root: каталог кэша (просматривается рекурсивно)
+            suffix: расширение файлов записей, например ".wav"
+            max_bytes: лимит суммарного размера
+            ttl_seconds: удалять записи без обращений дольше этого срока (None — без срока)
+            rescan_seconds: как часто сверять индекс с диском (None — только при создании)
+        """
+        self.root = root
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.rescan_seconds = rescan_seconds
+        self._lock = threading.Lock()
+        # путь -> (размер, время последнего обращения); порядок — от давних к свежим
+        self._entries: "OrderedDict[str, tuple[int, float]]" = OrderedDict()
+        self._total = 0
+        self._scanned_at = 0.0
+        self.rescan()
+
+    def _is_entry(self, name: str) -> bool:
+        return not name.startswith(".") and name.endswith(self.suffix)
+
+    def rescan(self):
+        """Перестраивает индекс по содержимому каталога; удаляет брошенные закрепления."""
+        found = []
+        now = time.time()
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.startswith(PIN_PREFIX):
+                    if _pin_is_stale(name, now):
+                        release_pin(os.path.join(directory, name))
+                    continue
+                if not self._is_entry(name):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, stat.st_size, path))
+        found.sort()
+        with self._lock:
+            self._entries = OrderedDict((path, (size, mtime)) for mtime, size, path in found)
+            self._total = sum(size for _, size, _ in found)
+            self._scanned_at = time.monotonic()
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def touch(self, path: str):
+        """Отмечает обращение к записи (вызывающий код сам обновляет mtime файла)."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries[path] = (entry[0], time.time())
+                self._entries.move_to_end(path)
+
+    def add(self, path: str):
+        """Добавляет (или обновляет) только что записанный файл."""
+        try:
+            size = os.stat(path).st_size
+        except OSError:
+            return
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._total -= previous[0]
+            self._entries[path] = (size, time.time())
+            self._total += size
+
+    def discard(self, path: str):
+        """Убирает запись из индекса (файл уже удалён или удаляется вызывающим кодом)."""
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._total -= previous[0]
+
+    def remove_if(self, predicate: Callable[[str], bool], keep: Optional[str] = None) -> list[str]:
+        """Удаляет записи, путь которых подходит под predicate (кроме keep); возвращает удалённые."""
+        with self._lock:
+            victims = [path for path in self._entries if path != keep and predicate(path)]
+            for path in victims:
+                size, _ = self._entries.pop(path)
+                self._total -= size
+        for path in victims:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return victims
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    def evict(self, keep: Optional[str] = None) -> list[str]:
+        """
+        Удаляет записи старше TTL, затем давно не использованные,
+        пока кэш не уложится в лимит. Возвращает удалённые пути.
+        """
+        if (self.rescan_seconds is not None
+                and time.monotonic() - self._scanned_at > self.rescan_seconds):
+            self.rescan()
+
+        removed = []
+        with self._lock:
+            victims = []
+            if self.ttl_seconds is not None:
+                expired_before = time.time() - self.ttl_seconds
+                for path, (size, used_at) in self._entries.items():
+                    if used_at >= expired_before:
+                        break
+                    if path != keep:
+                        victims.append(path)
+            expired = set(victims)
+            total = self._total - sum(self._entries[path][0] for path in victims)
+            for path, (size, _) in self._entries.items():
+                if total <= self.max_bytes:
+                    break
+                if path == keep or path in expired:
+                    continue
+                victims.append(path)
+                total -= size
+
+            for path in victims:
+                size, _ = self._entries.pop(path)
+                self._total -= size
+                removed.append(path)
+
+        for path in removed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return removed
@@ -0,0 +1,211 @@
+"""
+Оценка длительности речи до синтеза.
+
+Длительность TTS оценивается по плану фрагментов (tts_generator.plan_speech):
+символы / скорость голоса + накладные расходы на фрагмент + паузы между
+фрагментами. Скорость (символов в секунду) калибруется по каждому
+reference-голосу: после синтеза фактическая длительность уточняет оценку
+(экспоненциальное сглаживание), а разброс ошибок задаёт запас сверху.
+
+По оценке заранее известен нужный отрезок основного видео
+(TTS + post_audio_padding), поэтому его можно готовить параллельно с синтезом,
+и до синтеза видно, что текст не помещается в основное видео.
+"""
+
+import os
+import json
+import logging
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Optional
+from app.chunk_planner import ChunkPlan
+
+logger = logging.getLogger(__name__)
+
+# Скорость XTTS v2 для русского без калибровки, символов в секунду
+DEFAULT_CHARS_PER_SECOND = 14.0
+# Тишина в начале/конце каждого фрагмента, сек
+CHUNK_OVERHEAD_SECONDS = 0.15
+# Запас сверху, пока голос не откалиброван (доля оценки)
+DEFAULT_MARGIN = 0.25
+MIN_MARGIN = 0.08
+# Вес нового наблюдения при сглаживании
+DEFAULT_SMOOTHING = 0.3
+# Ограничение ошибки одного наблюдения: единичный выброс не раздувает запас
+MAX_OBSERVED_ERROR = 0.5
+
+
+@dataclass(frozen=True)
+class DurationEstimate:
+    seconds: float                 # ожидаемая длительность TTS
+    margin: float                  # запас сверху, доля от seconds
+    chars: int
+    chunks: int
+    chars_per_second: float
+    calibrated: bool               # скорость голоса уже уточнялась по синтезу
+
+    @property
+    def upper(self) -> float:
+        """Верхняя граница длительности с запасом."""
+        return self.seconds * (1 + self.margin)
+
+
+@dataclass(frozen=True)
+class VideoSpan:
+    seconds: float                 # сколько основного видео готовить
+    video_duration: float
+    speech_seconds: float          # оценка длительности TTS
+    exceeds_video: bool            # текст (по оценке) длиннее основного видео
+
+
+def plan_video_span(
+    estimate: DurationEstimate,
+    video_duration: float,
+    post_audio_padding: float = 1.0
+) -> VideoSpan:
+    """Отрезок основного видео под оценку речи: верхняя граница + padding, но не длиннее видео."""
+    return VideoSpan(
+        seconds=min(estimate.upper + post_audio_padding, video_duration),
+        video_duration=video_duration,
+        speech_seconds=estimate.seconds,
+        exceeds_video=estimate.seconds > video_duration
+    )
+
+
+class SpeechRateModel:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        default_chars_per_second: float = DEFAULT_CHARS_PER_SECOND,
+        smoothing: float = DEFAULT_SMOOTHING
+    ):
+        """
+        Параметры:
+            path: JSON-файл с калибровкой голосов (None — только в памяти процесса)
+            default_chars_per_second: скорость для ещё не калиброванного голоса
+            smoothing: вес нового наблюдения (0..1)
+        """
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing должен быть в диапазоне (0, 1]")
+        self.path = path
+        self.default_chars_per_second = default_chars_per_second
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._voices: dict[str, dict] = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._voices = json.load(f)
+
+    @staticmethod
+    def _plan_terms(plan: ChunkPlan) -> tuple[int, int, float]:
+        """(символов, фрагментов, секунд на паузы и накладные расходы)."""
+        chars = sum(chunk.length for chunk in plan.chunks)
+        chunks = len(plan.chunks)
+        # Пауза после последнего фрагмента не добавляется (как в _concatenate_audio_arrays)
+        pauses = sum(plan.pauses_ms[:-1]) / 1000
+        return chars, chunks, pauses + chunks * CHUNK_OVERHEAD_SECONDS
+
+    def estimate(self, plan: ChunkPlan, voice: str) -> DurationEstimate:
+        """Оценка длительности синтеза плана голосом voice (например, ID reference)."""
+        chars, chunks, fixed = self._plan_terms(plan)
+        with self._lock:
+            record = self._voices.get(voice)
+        if record is None:
+            chars_per_second, margin = self.default_chars_per_second, DEFAULT_MARGIN
+        else:
+            chars_per_second = record["chars_per_second"]
+            # Два средних отклонения покрывают большую часть разброса
+            margin = max(MIN_MARGIN, 2 * record["error"])
+        seconds = (chars / chars_per_second + fixed) if chars else 0.0
+        return DurationEstimate(
+            seconds, margin, chars, chunks, chars_per_second, calibrated=record is not None
+        )
+
+    def observe(self, plan: ChunkPlan, voice: str, actual_seconds: float) -> DurationEstimate:
+        """
+        Уточняет скорость голоса по фактической длительности синтеза.
+        Возвращает оценку, которая была до уточнения (для сравнения с фактом).
+        """
+        estimate = self.estimate(plan, voice)
+        chars, _, fixed = self._plan_terms(plan)
+        speech = actual_seconds - fixed
+        if chars == 0 or speech <= 0:
+            return estimate
+        observed_rate = chars / speech
+        error = min(abs(actual_seconds - estimate.seconds) / actual_seconds, MAX_OBSERVED_ERROR)
+
+        with self._lock:
+            record = self._voices.get(voice)
+            if record is None:
+                record = {"chars_per_second": observed_rate, "error": error, "samples": 0}
+            else:
+                a = self.smoothing
+                record = {
+                    "chars_per_second": (1 - a) * record["chars_per_second"] + a * observed_rate,
+                    "error": (1 - a) * record["error"] + a * error,
+                    "samples": record["samples"]
+                }
+            record["samples"] += 1
+            self._voices[voice] = record
+            if self.path:
+                self._save()
+        return estimate
+
+    def voices(self) -> dict:
+        """Калибровка по голосам: chars_per_second, error (средняя относительная ошибка), samples."""
+        with self._lock:
+            return {voice: dict(record) for voice, record in self._voices.items()}
+
+    def _save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._voices, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except (OSError, PermissionError):
+                    pass
+
+
+# Модель по умолчанию: калибруется в памяти процесса
+_DEFAULT_MODEL = SpeechRateModel()
+
+
+def default_model() -> SpeechRateModel:
+    return _DEFAULT_MODEL
+
+
+def _warn_speech_too_long(speech: str, video_duration: float, template_id: Optional[str]):
+    logger.warning(
+        "Текст длиннее основного видео%s: речь %s, видео %.1f с — конец речи будет обрезан",
+        f" шаблона {template_id}" if template_id else "",
+        speech, video_duration
+    )
+
+
+def warn_if_exceeds(span: VideoSpan, template_id: Optional[str] = None) -> bool:
+    """Пишет предупреждение, если речь по оценке длиннее основного видео; возвращает флаг."""
+    if span.exceeds_video:
+        _warn_speech_too_long(f"~{span.speech_seconds:.1f} с", span.video_duration, template_id)
+    return span.exceeds_video
+
+
+def warn_if_speech_exceeds(
+    span: VideoSpan,
+    tts_seconds: float,
+    template_id: Optional[str] = None
+) -> bool:
+    """
+    То же по фактической длительности синтеза: оценка могла не заметить превышения.
+    Если о нём уже предупредили по оценке, повторно не пишет; возвращает флаг.
+    """
+    exceeds = tts_seconds > span.video_duration
+    if exceeds and not span.exceeds_video:
+        _warn_speech_too_long(f"{tts_seconds:.1f} с", span.video_duration, template_id)
+    return exceeds
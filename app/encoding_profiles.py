@@ -0,0 +1,126 @@
+"""
+Профили кодирования итогового видео.
+
+Профиль задаёт пресет и CRF (или битрейт) libx264, число потоков,
+ограничение размера кадра и fps, битрейт AAC и +faststart. Выбирается
+на каждый запрос по имени или объектом EncodingProfile; участвует в ключах
+кэшей (см. EncodingProfile.key и segment_cache.build_segment_profile).
+
+- fast-preview: быстрый черновик — 480p, до 15 fps, ultrafast
+- standard: как раньше (пресет medium, CRF 23 — умолчания MoviePy/libx264)
+- archive: высокое качество для хранения — slow, CRF 18
+"""
+
+import json
+from dataclasses import dataclass, asdict, replace
+from typing import Optional, Union
+
+
+@dataclass(frozen=True)
+class EncodingProfile:
+    name: str
+    preset: str = "medium"
+    crf: Optional[int] = 23
+    video_bitrate: Optional[str] = None    # "2M" — вместо CRF
+    threads: Optional[int] = None          # None — решает ffmpeg
+    max_height: Optional[int] = None       # уменьшить кадр до этой высоты
+    max_fps: Optional[float] = None        # ограничить частоту кадров
+    audio_bitrate: str = "128k"
+    faststart: bool = True
+
+    @property
+    def key(self) -> str:
+        """Строка для ключей кэшей: все параметры профиля, а не только имя."""
+        return json.dumps(asdict(self), sort_keys=True)
+
+    def output_size(self, width: int, height: int) -> tuple[int, int]:
+        """Размер кадра на выходе; libx264 с yuv420p требует чётных размеров."""
+        if self.max_height and height > self.max_height:
+            width = width * self.max_height / height
+            height = self.max_height
+        return max(2, int(round(width / 2)) * 2), max(2, int(height // 2) * 2)
+
+    def output_fps(self, fps: Optional[float]) -> Optional[float]:
+        if fps and self.max_fps and fps > self.max_fps:
+            return self.max_fps
+        return fps
+
+    def changes_stream(self, info: dict) -> bool:
+        """
+        Масштабирует ли профиль кадр или меняет fps видео (probe_media) — тогда
+        копировать поток нельзя. Округление нечётных размеров до чётных нужно
+        только при кодировании libx264 и копированию не мешает.
+        """
+        if not info.get("width") or not info.get("height"):
+            return False
+        scales = bool(self.max_height) and info["height"] > self.max_height
+        return scales or self.output_fps(info.get("fps")) != info.get("fps")
+
+    def target_resolution(self, info: dict) -> Optional[tuple[int, int]]:
+        """Параметр target_resolution для VideoFileClip: кадры уменьшаются ещё при декодировании."""
+        if not self.max_height or not info.get("height") or info["height"] <= self.max_height:
+            return None
+        width, height = self.output_size(info["width"], info["height"])
+        return height, width
+
+    def movflags_args(self) -> list[str]:
+        """Аргументы ffmpeg для MP4-контейнера: moov в начале файла, если профиль просит faststart."""
+        return ["-movflags", "+faststart"] if self.faststart else []
+
+    def ffmpeg_video_args(self) -> list[str]:
+        args = ["-preset", self.preset]
+        if self.video_bitrate:
+            args += ["-b:v", self.video_bitrate]
+        elif self.crf is not None:
+            args += ["-crf", str(self.crf)]
+        if self.threads:
+            args += ["-threads", str(self.threads)]
+        return args
+
+    def moviepy_kwargs(self, fps: Optional[float] = None) -> dict:
+        """Параметры write_videofile (codec/audio_codec задаёт вызывающий)."""
+        ffmpeg_params = []
+        if self.video_bitrate is None and self.crf is not None:
+            ffmpeg_params += ["-crf", str(self.crf)]
+        ffmpeg_params += self.movflags_args()
+        return {
+            "preset": self.preset,
+            "bitrate": self.video_bitrate,
+            "threads": self.threads,
+            "audio_bitrate": self.audio_bitrate,
+            "fps": self.output_fps(fps),
+            "ffmpeg_params": ffmpeg_params
+        }
+
+
+PROFILES = {
+    "fast-preview": EncodingProfile(
+        "fast-preview", preset="ultrafast", crf=30, max_height=480, max_fps=15, audio_bitrate="96k"
+    ),
+    "standard": EncodingProfile("standard"),
+    "archive": EncodingProfile("archive", preset="slow", crf=18, audio_bitrate="192k")
+}
+DEFAULT_PROFILE = "standard"
+
+ProfileArg = Union[str, EncodingProfile, None]
+
+
+def register_profile(profile: EncodingProfile):
+    """Добавляет (или заменяет) именованный профиль."""
+    PROFILES[profile.name] = profile
+
+
+def get_profile(profile: ProfileArg = None, **overrides) -> EncodingProfile:
+    """
+    Профиль по имени (None — DEFAULT_PROFILE) или сам объект.
+    overrides — поля, которые нужно поменять для этого запроса (например, threads=2).
+    """
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError(
+                f"Неизвестный профиль кодирования: {profile} (есть: {', '.join(PROFILES)})"
+            )
+        profile = PROFILES[profile]
+    return replace(profile, **overrides) if overrides else profile
@@ -0,0 +1,303 @@
+"""
+Вспомогательные функции для прямого вызова ffmpeg.
+
+Используется тот же бинарник ffmpeg, что и у MoviePy
+(imageio-ffmpeg или FFMPEG_BINARY), отдельный ffprobe не нужен.
+"""
+
+import os
+import re
+import subprocess
+import tempfile
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+
+# Видеокодеки, которые можно копировать в MP4 без перекодирования
+MP4_COPY_VIDEO_CODECS = {"h264", "hevc", "mpeg4"}
+
+
+def get_ffmpeg_binary() -> str:
+    from moviepy.config import get_setting
+    return get_setting("FFMPEG_BINARY")
+
+
+class PipedInput(NamedTuple):
+    """Вход ffmpeg, данные которого подаются через stdin (pipe:0) блоками."""
+    args: list[str]                # аргументы формата и "-i", "pipe:0"
+    blocks: Iterable[bytes]
+
+
+def _input_args(source: Union[str, PipedInput]) -> list[str]:
+    if isinstance(source, PipedInput):
+        return source.args
+    return ["-i", source]
+
+
+def run_ffmpeg(args: list[str], stdin_blocks: Optional[Iterable[bytes]] = None) -> None:
+    """
+    Запускает ffmpeg с заданными аргументами; при ошибке — RuntimeError с stderr.
+    stdin_blocks — данные для входа pipe:0, пишутся по мере генерации.
+    """
+    cmd = [get_ffmpeg_binary(), "-y", "-hide_banner", "-loglevel", "error", *args]
+    if stdin_blocks is None:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        returncode, stderr = result.returncode, result.stderr
+    else:
+        # stderr — во временный файл: ffmpeg не заблокируется, пока мы пишем в stdin
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(
+                cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr_file
+            )
+            try:
+                for block in stdin_blocks:
+                    process.stdin.write(block)
+            except BrokenPipeError:
+                # ffmpeg завершился раньше — причина будет в stderr
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                returncode = process.wait()
+            stderr_file.seek(0)
+            stderr = stderr_file.read()
+    if returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg завершился с кодом {returncode}: "
+            f"{stderr.decode('utf-8', errors='replace').strip()}"
+        )
+
+
+def read_pcm_blocks(
+    path: str,
+    sample_rate: int,
+    channels: int,
+    block_frames: int
+) -> Iterator[bytes]:
+    """
+    Декодирует первую аудиодорожку файла в s16le с заданными частотой и числом
+    каналов и выдаёт блоками по block_frames кадров (последний может быть короче).
+    Если генератор закрыть раньше конца, ffmpeg останавливается.
+    """
+    cmd = [
+        get_ffmpeg_binary(), "-hide_banner", "-loglevel", "error",
+        "-i", path, "-map", "0:a:0", "-vn",
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ar", str(sample_rate), "-ac", str(channels),
+        "pipe:1"
+    ]
+    block_bytes = block_frames * channels * 2
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        finished = False
+        try:
+            while True:
+                block = process.stdout.read(block_bytes)
+                if not block:
+                    break
+                yield block
+            finished = True
+        finally:
+            if not finished:
+                process.kill()
+            process.stdout.close()
+            returncode = process.wait()
+        if finished and returncode != 0:
+            stderr_file.seek(0)
+            raise RuntimeError(
+                f"ffmpeg не смог декодировать {path}: "
+                f"{stderr_file.read().decode('utf-8', errors='replace').strip()}"
+            )
+
+
+def _parse_duration(text: str) -> Optional[float]:
+    match = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", text)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def probe_media(path: str) -> dict:
+    """
+    Читает параметры потоков по выводу `ffmpeg -i`.
+
+    Возвращает словарь:
+        duration, video_codec, width, height, fps, pix_fmt,
+        audio_codec, audio_sample_rate, audio_channels
+    (отсутствующие значения — None)
+    """
+    cmd = [get_ffmpeg_binary(), "-hide_banner", "-i", path]
+    # Без выходного файла ffmpeg всегда завершается с кодом 1 — это ожидаемо
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    text = result.stderr.decode("utf-8", errors="replace")
+    if "Invalid data found" in text or "No such file" in text:
+        raise ValueError(f"Не удалось прочитать медиафайл: {path}")
+
+    info = {
+        "duration": _parse_duration(text),
+        "video_codec": None,
+        "width": None,
+        "height": None,
+        "fps": None,
+        "pix_fmt": None,
+        "audio_codec": None,
+        "audio_sample_rate": None,
+        "audio_channels": None
+    }
+
+    video = re.search(r"Stream #\d+:\d+.*?: Video: (\w+)(.*)", text)
+    if video:
+        info["video_codec"] = video.group(1)
+        details = video.group(2)
+        pix_fmt = re.match(r"[^,]*, (\w+)", details)
+        if pix_fmt:
+            info["pix_fmt"] = pix_fmt.group(1)
+        size = re.search(r", (\d{2,5})x(\d{2,5})", details)
+        if size:
+            info["width"], info["height"] = int(size.group(1)), int(size.group(2))
+        fps = re.search(r", (\d+(?:\.\d+)?) fps", details)
+        if fps:
+            info["fps"] = float(fps.group(1))
+
+    audio = re.search(r"Stream #\d+:\d+.*?: Audio: (\w+)(.*)", text)
+    if audio:
+        info["audio_codec"] = audio.group(1)
+        details = audio.group(2)
+        rate = re.search(r", (\d+) Hz", details)
+        if rate:
+            info["audio_sample_rate"] = int(rate.group(1))
+        if ", mono" in details:
+            info["audio_channels"] = 1
+        elif ", stereo" in details:
+            info["audio_channels"] = 2
+        else:
+            channels = re.search(r", (\d+) channels", details)
+            if channels:
+                info["audio_channels"] = int(channels.group(1))
+
+    return info
+
+
+# Параметры потоков, которые должны совпадать для склейки без перекодирования
+VIDEO_STREAM_KEYS = ("video_codec", "width", "height", "fps", "pix_fmt")
+AUDIO_STREAM_KEYS = ("audio_codec", "audio_sample_rate", "audio_channels")
+
+
+def streams_compatible(infos: list[dict], check_audio: bool = True) -> bool:
+    """
+    Проверяет, что сегменты (результаты probe_media) можно склеить concat-демуксером.
+    check_audio=False — сравнивать только видеопотоки (аудио будет перекодировано).
+    """
+    if not infos:
+        return False
+    first = infos[0]
+    if first["video_codec"] not in MP4_COPY_VIDEO_CODECS:
+        return False
+    keys = VIDEO_STREAM_KEYS
+    if check_audio:
+        if first["audio_codec"] is None:
+            return False
+        keys = VIDEO_STREAM_KEYS + AUDIO_STREAM_KEYS
+    return all(
+        all(info[key] == first[key] for key in keys)
+        for info in infos[1:]
+    )
+
+
+def concat_copy(paths: list[str], output_path: str, faststart: bool = True) -> None:
+    """
+    Склеивает сегменты concat-демуксером без перекодирования.
+    faststart: moov в начале файла (EncodingProfile.faststart).
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as list_tmp:
+        list_path = list_tmp.name
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", r"'\''")
+            list_tmp.write(f"file '{escaped}'\n")
+    try:
+        run_ffmpeg([
+            "-f", "concat",
+            "-safe", "0",
+            "-i", list_path,
+            "-c", "copy",
+            *(["-movflags", "+faststart"] if faststart else []),
+            output_path
+        ])
+    finally:
+        if os.path.exists(list_path):
+            os.remove(list_path)
+
+
+def encode_normalized(
+    video_path: str,
+    output_path: str,
+    profile: dict,
+    audio_path: Union[str, PipedInput, None] = None,
+    duration: Optional[float] = None,
+    fade_out: float = 0.0,
+    info: Optional[dict] = None
+) -> None:
+    """
+    Кодирует видео в нормализованный вид, пригодный для склейки concat-демуксером.
+
+    Параметры:
+        profile: width, height, fps, preset, crf, gop,
+                 audio_sample_rate, audio_channels, audio_bitrate
+                 и необязательные video_bitrate (вместо crf), threads
+        audio_path: заменить дорожку этим файлом или PipedInput (иначе своя дорожка или тишина)
+        duration: обрезать до этой длительности (по умолчанию — вся длина)
+        fade_out: затемнение видео в конце, сек (звук не затухает — как fadeout в MoviePy)
+        info: уже известные параметры потоков (probe_media), чтобы не определять их заново
+    """
+    if info is None:
+        info = probe_media(video_path)
+    total = duration if duration is not None else info["duration"]
+    if total is None:
+        raise ValueError(f"Не удалось определить длительность: {video_path}")
+
+    args = ["-i", video_path]
+    if audio_path:
+        args += _input_args(audio_path)
+        audio_map = "1:a:0"
+    elif info["audio_codec"] is not None:
+        audio_map = "0:a:0"
+    else:
+        layout = "mono" if profile["audio_channels"] == 1 else "stereo"
+        args += ["-f", "lavfi", "-i", f"anullsrc=r={profile['audio_sample_rate']}:cl={layout}"]
+        audio_map = "1:a:0"
+
+    width, height = profile["width"], profile["height"]
+    filters = [
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2",
+        "setsar=1",
+        f"fps={profile['fps']}",
+        "format=yuv420p"
+    ]
+    if fade_out > 0:
+        start = max(total - fade_out, 0.0)
+        filters.append(f"fade=t=out:st={start:.3f}:d={fade_out:.3f}")
+
+    video_args = ["-c:v", "libx264", "-preset", profile["preset"]]
+    if profile.get("video_bitrate"):
+        video_args += ["-b:v", profile["video_bitrate"]]
+    else:
+        video_args += ["-crf", str(profile["crf"])]
+    if profile.get("threads"):
+        video_args += ["-threads", str(profile["threads"])]
+
+    run_ffmpeg(args + [
+        "-map", "0:v:0",
+        "-map", audio_map,
+        "-vf", ",".join(filters),
+        "-t", f"{total:.3f}",
+        *video_args,
+        "-g", str(profile["gop"]),
+        "-c:a", "aac",
+        "-b:a", profile["audio_bitrate"],
+        "-ar", str(profile["audio_sample_rate"]),
+        "-ac", str(profile["audio_channels"]),
+        "-movflags", "+faststart",
+        output_path
+    ], stdin_blocks=audio_path.blocks if isinstance(audio_path, PipedInput) else None)
@@ -0,0 +1,178 @@
+"""
+Кэш готовой TTS-дорожки поздравления (WAV после улучшения звука).
+
+Нужен, чтобы черновой рендер (preview) и следующий за ним полный рендер
+того же запроса синтезировали речь один раз: полный рендер берёт WAV
+из кэша и сразу переходит к видео.
+
+Ключ — (нормализованный текст, ID reference-аудио, отпечаток его файла,
+язык, модель с режимом инференса). Записи — файлы .wav на диске; при превышении лимита размера
+вытесняются давно не использованные (LRU по времени обращения, индекс app.disk_lru).
+
+Для рендера запись берётся через checkout: рендер получает собственную жёсткую
+ссылку на файл (или копию), и вытеснение из-за параллельной записи в кэш
+не удаляет дорожку посреди рендера.
+
+Общий кэш процесса (default_cache) включается первым preview-рендером без
+явного tts_cache и лежит в DEFAULT_PROCESS_CACHE_DIR (каталог пакета, не
+зависит от текущего каталога); другой каталог или отключение —
+configure_default_cache.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from app.disk_lru import DiskLRUIndex, pin_file
+from app.sentence_cache import normalize_sentence
+
+# Каталог по умолчанию — рядом с app/db/templates.db
+DEFAULT_GREETING_AUDIO_CACHE_DIR = "app/db/greeting_audio_cache"
+# Каталог общего кэша процесса: абсолютный путь внутри пакета
+DEFAULT_PROCESS_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "db", "greeting_audio_cache"
+)
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+
+class GreetingAudioCache:
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_GREETING_AUDIO_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = DiskLRUIndex(cache_dir, ".wav", max_bytes)
+
+    @staticmethod
+    def make_key(
+        text: str,
+        reference_id: str,
+        reference_fingerprint: str,
+        language: str = "ru",
+        model: Optional[str] = None
+    ) -> str:
+        payload = json.dumps({
+            "text": normalize_sentence(text),
+            "reference": reference_id,
+            "fingerprint": reference_fingerprint,
+            "language": language,
+            "model": model
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def pin(self, path: str) -> Optional[str]:
+        """Закрепляет файл (app.disk_lru.pin_file); удаляет вызывающий код. None — файла уже нет."""
+        return pin_file(path, self.cache_dir)
+
+    def _touch(self, path: str):
+        try:
+            # Отмечаем использование для LRU
+            os.utime(path, None)
+        except OSError:
+            return False
+        self._index.touch(path)
+        return True
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def checkout(self, key: str) -> Optional[str]:
+        """Закреплённая копия записи (см. pin) или None при промахе."""
+        path = self.entry_path(key)
+        pinned = self.pin(path)
+        self._count(pinned is not None)
+        if pinned is not None:
+            self._touch(path)
+        return pinned
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Путь к WAV или None при промахе.
+        Файл может быть вытеснен в любой момент — для рендера используйте checkout.
+        """
+        path = self.entry_path(key)
+        hit = self._touch(path)
+        self._count(hit)
+        return path if hit else None
+
+    @contextmanager
+    def writing(self, key: str) -> Iterator[str]:
+        """
+        Отдаёт временный путь для записи WAV; после успешного выхода
+        из контекста запись атомарно появляется в кэше.
+        """
+        entry_path = self.entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".wav", dir=self.cache_dir)
+        os.close(fd)
+        try:
+            yield tmp_path
+            os.replace(tmp_path, entry_path)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except (OSError, PermissionError):
+                    pass
+        self._index.add(entry_path)
+        self._index.evict(keep=entry_path)
+
+    def stats(self) -> dict:
+        """Счётчики попаданий/промахов с момента создания."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+# Общий кэш процесса: создаётся первым preview-рендером без явного tts_cache
+_DEFAULT_CACHE: Optional[GreetingAudioCache] = None
+_DEFAULT_CACHE_DIR: Optional[str] = DEFAULT_PROCESS_CACHE_DIR
+_DEFAULT_MAX_BYTES = DEFAULT_MAX_BYTES
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def configure_default_cache(
+    cache_dir: Optional[str] = DEFAULT_PROCESS_CACHE_DIR,
+    max_bytes: int = DEFAULT_MAX_BYTES
+):
+    """
+    Задаёт каталог общего кэша процесса (cache_dir=None — выключает его:
+    preview без tts_cache больше ничего не пишет на диск). Уже созданный
+    кэш заменяется при следующем обращении.
+    """
+    global _DEFAULT_CACHE, _DEFAULT_CACHE_DIR, _DEFAULT_MAX_BYTES
+    with _DEFAULT_CACHE_LOCK:
+        _DEFAULT_CACHE = None
+        _DEFAULT_CACHE_DIR = os.path.abspath(cache_dir) if cache_dir else None
+        _DEFAULT_MAX_BYTES = max_bytes
+
+
+def default_cache(create: bool = True) -> Optional[GreetingAudioCache]:
+    """
+    Общий кэш процесса (по умолчанию в DEFAULT_PROCESS_CACHE_DIR).
+    create=False — только если он уже создан; None — если не создан или выключен.
+    """
+    global _DEFAULT_CACHE
+    with _DEFAULT_CACHE_LOCK:
+        if _DEFAULT_CACHE is None and create and _DEFAULT_CACHE_DIR is not None:
+            _DEFAULT_CACHE = GreetingAudioCache(_DEFAULT_CACHE_DIR, _DEFAULT_MAX_BYTES)
+        return _DEFAULT_CACHE
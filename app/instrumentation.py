@@ -0,0 +1,403 @@
+"""
+Трассировка этапов и метрики конвейера.
+
+- span(name) — замер этапа (вложенные спаны знают родителя)
+- trace(name) — запрос целиком: собирает свои спаны и счётчики;
+  вложенный trace (например, render_greeting_to внутри
+  generate_greeting_from_template_to) работает как обычный спан
+- count(name, value) / gauge(name, value) — счётчики и текущие значения
+- экспортёры: LoggingExporter, PrometheusExporter (текстовый формат),
+  JsonExporter (словарь трассы в callback)
+- профилирование cProfile на запрос: trace(..., profile=True) или configure_profiling
+
+Пока не добавлен ни один экспортёр, span/count/gauge ничего не делают
+(одна проверка списка), а trace возвращает None.
+
+Пример:
+    from app import instrumentation
+    prometheus = instrumentation.PrometheusExporter()
+    instrumentation.add_exporter(instrumentation.LoggingExporter())
+    instrumentation.add_exporter(prometheus)
+    ...
+    text = prometheus.render()
+"""
+
+import io
+import os
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+_EXPORTERS: list["Exporter"] = []
+_PROFILE_DIR: Optional[str] = None
+_PROFILE_ALWAYS = False
+_PROFILE_TOP = 25
+
+_CURRENT_SPAN: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_CURRENT_TRACE: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "duration", "parent", "error")
+
+    def __init__(self, name: str, attrs: dict, parent: Optional["Span"]):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        """Добавляет атрибуты (например, выбранный путь рендера)."""
+        self.attrs.update(attrs)
+
+
+class _NoopSpan:
+    """Заглушка, когда инструментирование выключено."""
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """Спаны и счётчики одного запроса."""
+
+    def __init__(self, name: str, attrs: dict):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.spans: list[Span] = []
+        self.counters: dict[str, float] = {}
+        self.gauges: dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.profile_path: Optional[str] = None
+        self.profile_stats: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _add_span(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def _add_count(self, name: str, value: float):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0.0) + value
+
+    def _set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def stage_totals(self) -> dict[str, float]:
+        """Суммарное время по именам спанов."""
+        totals: dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        return totals
+
+    def to_dict(self) -> dict:
+        ids = {id(span): i for i, span in enumerate(self.spans)}
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "duration": self.duration,
+            "error": self.error,
+            "spans": [
+                {
+                    "id": i,
+                    "parent": ids.get(id(span.parent)),
+                    "name": span.name,
+                    "offset": span.start - self.start,
+                    "duration": span.duration,
+                    "attrs": span.attrs,
+                    "error": span.error
+                }
+                for i, span in enumerate(self.spans)
+            ],
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "profile_path": self.profile_path
+        }
+
+
+class _SpanContext:
+    __slots__ = ("span", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.span = Span(name, attrs, _CURRENT_SPAN.get())
+
+    def __enter__(self) -> Span:
+        self._token = _CURRENT_SPAN.set(self.span)
+        self.span.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        span.duration = time.perf_counter() - span.start
+        if exc is not None:
+            span.error = f"{exc_type.__name__}: {exc}"
+        _CURRENT_SPAN.reset(self._token)
+        trace = _CURRENT_TRACE.get()
+        if trace is not None:
+            trace._add_span(span)
+        for exporter in _EXPORTERS:
+            exporter.on_span(span, trace)
+        return False
+
+
+# === Экспортёры ===
+
+class Exporter:
+    """Базовый экспортёр: переопределите нужные методы."""
+
+    def on_span(self, span: Span, trace: Optional[Trace]):
+        pass
+
+    def on_count(self, name: str, value: float):
+        pass
+
+    def on_gauge(self, name: str, value: float):
+        pass
+
+    def on_trace(self, trace: Trace):
+        pass
+
+
+class LoggingExporter(Exporter):
+    def __init__(
+        self,
+        logger: Optional[logging.Logger] = None,
+        level: int = logging.INFO,
+        log_spans: bool = False
+    ):
+        """log_spans=True — дополнительно каждый спан на уровне DEBUG."""
+        self.logger = logger or logging.getLogger("app.instrumentation")
+        self.level = level
+        self.log_spans = log_spans
+
+    def on_span(self, span: Span, trace: Optional[Trace]):
+        if self.log_spans:
+            self.logger.debug("span %s %.3fs %s", span.name, span.duration, span.attrs)
+
+    def on_trace(self, trace: Trace):
+        stages = ", ".join(
+            f"{name} {seconds:.3f}s" for name, seconds in trace.stage_totals().items()
+        )
+        counters = ", ".join(f"{name}={value:g}" for name, value in trace.counters.items())
+        self.logger.log(
+            self.level, "trace %s %s %.3fs%s | %s | %s",
+            trace.name, trace.trace_id, trace.duration,
+            f" ОШИБКА {trace.error}" if trace.error else "", stages, counters
+        )
+
+
+class JsonExporter(Exporter):
+    def __init__(self, callback: Callable[[dict], None]):
+        """callback получает Trace.to_dict() каждой завершённой трассы."""
+        self.callback = callback
+
+    def on_trace(self, trace: Trace):
+        self.callback(trace.to_dict())
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class PrometheusExporter(Exporter):
+    """Копит метрики в памяти; render() отдаёт их в текстовом формате Prometheus."""
+
+    def __init__(self, prefix: str = "greeting"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stage_seconds: dict[str, list[float]] = {}     # имя -> [сумма, количество]
+        self._stage_errors: dict[str, int] = {}
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+
+    def on_span(self, span: Span, trace: Optional[Trace]):
+        with self._lock:
+            entry = self._stage_seconds.setdefault(span.name, [0.0, 0])
+            entry[0] += span.duration
+            entry[1] += 1
+            if span.error is not None:
+                self._stage_errors[span.name] = self._stage_errors.get(span.name, 0) + 1
+
+    def on_count(self, name: str, value: float):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0.0) + value
+
+    def on_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def render(self) -> str:
+        prefix = self.prefix
+        lines = []
+        with self._lock:
+            if self._stage_seconds:
+                lines.append(f"# HELP {prefix}_stage_seconds Время этапов конвейера")
+                lines.append(f"# TYPE {prefix}_stage_seconds summary")
+                for name, (total, count) in sorted(self._stage_seconds.items()):
+                    label = f'{{stage="{_escape_label(name)}"}}'
+                    lines.append(f"{prefix}_stage_seconds_sum{label} {total:.6f}")
+                    lines.append(f"{prefix}_stage_seconds_count{label} {count}")
+            if self._stage_errors:
+                lines.append(f"# TYPE {prefix}_stage_errors_total counter")
+                for name, count in sorted(self._stage_errors.items()):
+                    lines.append(f'{prefix}_stage_errors_total{{stage="{_escape_label(name)}"}} {count}')
+            for name, value in sorted(self._counters.items()):
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value:g}")
+            for name, value in sorted(self._gauges.items()):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+# === Настройка ===
+
+def add_exporter(exporter: Exporter) -> Exporter:
+    _EXPORTERS.append(exporter)
+    return exporter
+
+
+def remove_exporter(exporter: Exporter):
+    if exporter in _EXPORTERS:
+        _EXPORTERS.remove(exporter)
+
+
+def clear_exporters():
+    _EXPORTERS.clear()
+
+
+def enabled() -> bool:
+    return bool(_EXPORTERS)
+
+
+def configure_profiling(
+    profile_dir: Optional[str] = None,
+    always: bool = False,
+    top: int = 25
+):
+    """
+    profile_dir: куда сохранять .prof профилированных запросов (None — только в trace.profile_stats)
+    always: профилировать каждый запрос, а не только trace(..., profile=True)
+    top: сколько строк pstats (по cumulative) сохранять в trace.profile_stats
+    """
+    global _PROFILE_DIR, _PROFILE_ALWAYS, _PROFILE_TOP
+    _PROFILE_DIR = profile_dir
+    _PROFILE_ALWAYS = always
+    _PROFILE_TOP = top
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+
+
+# === API для кода конвейера ===
+
+def span(name: str, **attrs):
+    """Контекст замера этапа; без экспортёров — общая заглушка."""
+    if not _EXPORTERS:
+        return _NOOP_SPAN
+    return _SpanContext(name, attrs)
+
+
+def count(name: str, value: float = 1.0):
+    """Увеличивает счётчик (в текущей трассе и у экспортёров)."""
+    if not _EXPORTERS:
+        return
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace._add_count(name, value)
+    for exporter in _EXPORTERS:
+        exporter.on_count(name, value)
+
+
+def gauge(name: str, value: float):
+    """Запоминает текущее значение (например, realtime factor последнего синтеза)."""
+    if not _EXPORTERS:
+        return
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace._set_gauge(name, value)
+    for exporter in _EXPORTERS:
+        exporter.on_gauge(name, value)
+
+
+def current_trace() -> Optional[Trace]:
+    return _CURRENT_TRACE.get()
+
+
+def _finish_profile(trace: Trace, profiler: cProfile.Profile):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(_PROFILE_TOP)
+    trace.profile_stats = stream.getvalue()
+    if _PROFILE_DIR:
+        trace.profile_path = os.path.join(_PROFILE_DIR, f"{trace.name}-{trace.trace_id}.prof")
+        stats.dump_stats(trace.profile_path)
+
+
+@contextmanager
+def trace(name: str, profile: Optional[bool] = None, **attrs) -> Iterator[Optional[Trace]]:
+    """
+    Трасса запроса. Если трасса уже открыта выше по стеку — ведёт себя как span
+    и отдаёт внешнюю трассу. Без экспортёров и профилирования отдаёт None.
+
+    profile: включить cProfile на время запроса (по умолчанию — configure_profiling(always=...))
+    """
+    outer = _CURRENT_TRACE.get()
+    if outer is not None:
+        with span(name, **attrs):
+            yield outer
+        return
+
+    if profile is None:
+        profile = _PROFILE_ALWAYS
+    if not _EXPORTERS and not profile:
+        yield None
+        return
+
+    current = Trace(name, attrs)
+    trace_token = _CURRENT_TRACE.set(current)
+    span_token = _CURRENT_SPAN.set(None)
+    profiler = None
+    if profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # В потоке уже работает другой профилировщик
+            profiler = None
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        current.duration = time.perf_counter() - current.start
+        _CURRENT_SPAN.reset(span_token)
+        _CURRENT_TRACE.reset(trace_token)
+        if profiler is not None:
+            _finish_profile(current, profiler)
+        for exporter in _EXPORTERS:
+            exporter.on_trace(current)
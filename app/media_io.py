@@ -0,0 +1,107 @@
+"""
+Источники и приёмники медиа: путь, байты или файловый объект.
+
+Функции *_to (mix_video_with_audio_to, generate_speech_to,
+generate_greeting_from_template_to) читают входные файлы на месте и пишут
+результат прямо в указанный путь или поток, без промежуточных копий в памяти.
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Union
+
+# Вход: путь к файлу, байты или файловый объект для чтения
+MediaSource = Union[str, os.PathLike, bytes, BinaryIO]
+# Выход: путь к файлу или файловый объект для записи
+MediaTarget = Union[str, os.PathLike, BinaryIO]
+
+
+def _is_path(value) -> bool:
+    return isinstance(value, (str, os.PathLike))
+
+
+def _remove_quietly(path: str):
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except (OSError, PermissionError):
+            pass
+
+
+def make_temp_path(suffix: str = "") -> str:
+    """
+    Создаёт пустой временный файл и возвращает его путь; удаляет вызывающий код.
+    В отличие от tempfile.mktemp имя занимается сразу, без гонки между процессами.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    return path
+
+
+def read_source_bytes(source: MediaSource) -> bytes:
+    """Содержимое источника целиком (для небольших файлов, например reference-аудио)."""
+    if isinstance(source, bytes):
+        return source
+    if _is_path(source):
+        with open(source, "rb") as f:
+            return f.read()
+    return source.read()
+
+
+@contextmanager
+def source_path(source: MediaSource, suffix: str = "") -> Iterator[str]:
+    """
+    Путь к файлу с содержимым источника.
+    Путь отдаётся как есть; байты и потоки записываются во временный файл,
+    который удаляется при выходе из контекста.
+    """
+    if _is_path(source):
+        yield os.fspath(source)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp_path = tmp.name
+        if isinstance(source, bytes):
+            tmp.write(source)
+        else:
+            shutil.copyfileobj(source, tmp)
+    try:
+        yield tmp_path
+    finally:
+        _remove_quietly(tmp_path)
+
+
+@contextmanager
+def target_path(target: MediaTarget, suffix: str = "") -> Iterator[str]:
+    """
+    Путь, по которому нужно записать результат.
+    Для пути — он сам (каталог создаётся при необходимости); для потока —
+    временный файл, который после успешной записи копируется в поток и удаляется.
+    """
+    if _is_path(target):
+        path = os.fspath(target)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        yield path
+        return
+
+    tmp_path = make_temp_path(suffix)
+    try:
+        yield tmp_path
+        with open(tmp_path, "rb") as f:
+            shutil.copyfileobj(f, target)
+    finally:
+        _remove_quietly(tmp_path)
+
+
+def copy_to_target(path: str, target: MediaTarget):
+    """Копирует готовый файл в путь или поток."""
+    if _is_path(target):
+        with target_path(target) as output_path:
+            shutil.copyfile(path, output_path)
+        return
+    with open(path, "rb") as f:
+        shutil.copyfileobj(f, target)
@@ -4,21 +4,84 @@
 
 import os
 import sqlite3
+import threading
 import uuid
-from typing import Optional, Tuple, List
-from app.tts_generator import generate_speech
-from app.video_mixer import mix_video_with_audio
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple, List
+
+
+# Колонки VideoAssetInfo ↔ ключи словаря с метаданными видео
+_VIDEO_INFO_COLUMNS = (
+    ("SourceFingerprint", "source_fingerprint"),
+    ("NormalizedPath", "normalized_path"),
+    ("OriginalAudioPath", "original_audio_path"),
+    ("Duration", "duration"),
+    ("VideoCodec", "video_codec"),
+    ("Width", "width"),
+    ("Height", "height"),
+    ("Fps", "fps"),
+    ("PixFmt", "pix_fmt"),
+    ("KeyframeInterval", "keyframe_interval"),
+    ("AudioCodec", "audio_codec"),
+    ("AudioSampleRate", "audio_sample_rate"),
+    ("AudioChannels", "audio_channels"),
+)
+
+_REFERENCE_INFO_COLUMNS = (
+    ("SourceFingerprint", "source_fingerprint"),
+    ("ContentHash", "content_hash"),
+    ("Duration", "duration"),
+    ("XttsWavPath", "xtts_wav_path"),
+)
+
+
+# Настройки SQLite для постоянного соединения
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",        # чтение не блокируется записью
+    "PRAGMA synchronous=NORMAL",      # в режиме WAL безопасно и заметно быстрее FULL
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",       # ~16 МБ страничного кэша
+    "PRAGMA busy_timeout=5000",
+)
 
 
 class TemplateManager:
-    def __init__(self, db_path: str = "app/db/templates.db"):
+    def __init__(self, db_path: str = "app/db/templates.db", template_cache_size: int = 256):
         self.db_path = db_path
+        # Подготовленные ассеты (нормализованные видео, PCM, reference для XTTS)
+        self.assets_dir = os.path.join(os.path.dirname(db_path), "assets")
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+        # Одно соединение на менеджер; доступ из разных потоков — под блокировкой
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        for pragma in _PRAGMAS:
+            self._conn.execute(pragma)
+
+        # LRU разрешённых шаблонов; сбрасывается при любой записи
+        self._template_cache_size = template_cache_size
+        self._template_cache: "OrderedDict[str, dict]" = OrderedDict()
+        self._generation = 0
         self._init_db()
 
+    @contextmanager
+    def _connection(self, write: bool = False) -> Iterator[sqlite3.Connection]:
+        """Постоянное соединение в транзакции; write=True — сбросить кэш шаблонов."""
+        with self._lock:
+            with self._conn:
+                yield self._conn
+            if write:
+                self._template_cache.clear()
+                self._generation += 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
     def _init_db(self):
         """Создаёт таблицы, если их нет."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection(write=True) as conn:
             cursor = conn.cursor()
             cursor.executescript("""
                 CREATE TABLE IF NOT EXISTS ReferenceAudioFiles (
@@ -43,21 +106,80 @@ class TemplateManager:
                     FOREIGN KEY (OutroId) REFERENCES VideoFiles (Id) ON DELETE SET NULL,
                     FOREIGN KEY (ReferenceId) REFERENCES ReferenceAudioFiles (Id) ON DELETE CASCADE
                 );
+                CREATE TABLE IF NOT EXISTS VideoAssetInfo (
+                    VideoId TEXT PRIMARY KEY,
+                    SourceFingerprint TEXT NOT NULL,
+                    NormalizedPath TEXT NULL,
+                    OriginalAudioPath TEXT NULL,
+                    Duration REAL NOT NULL,
+                    VideoCodec TEXT,
+                    Width INTEGER,
+                    Height INTEGER,
+                    Fps REAL,
+                    PixFmt TEXT,
+                    KeyframeInterval INTEGER NULL,
+                    AudioCodec TEXT NULL,
+                    AudioSampleRate INTEGER NULL,
+                    AudioChannels INTEGER NULL,
+                    FOREIGN KEY (VideoId) REFERENCES VideoFiles (Id) ON DELETE CASCADE
+                );
+                CREATE TABLE IF NOT EXISTS ReferenceAssetInfo (
+                    ReferenceId TEXT PRIMARY KEY,
+                    SourceFingerprint TEXT NOT NULL,
+                    ContentHash TEXT NOT NULL,
+                    Duration REAL NOT NULL,
+                    XttsWavPath TEXT NOT NULL,
+                    FOREIGN KEY (ReferenceId) REFERENCES ReferenceAudioFiles (Id) ON DELETE CASCADE
+                );
             """)
-            conn.commit()
 
     # --- Методы для ReferenceAudioFiles ---
-    def add_reference(self, file_path: str, description: Optional[str] = None) -> str:
+    def add_reference(
+        self,
+        file_path: str,
+        description: Optional[str] = None,
+        ingest: bool = True
+    ) -> str:
+        """
+        Регистрирует reference-аудио.
+        ingest=True — сразу проверяет файл и готовит копию в формате XTTS.
+        """
         ref_id = str(uuid.uuid4())
-        with sqlite3.connect(self.db_path) as conn:
+        info = None
+        if ingest:
+            from app.services.asset_ingest import ingest_reference
+            info = ingest_reference(file_path, self.assets_dir, ref_id)
+        with self._connection(write=True) as conn:
             conn.execute(
                 "INSERT INTO ReferenceAudioFiles (Id, FilePath, Description) VALUES (?, ?, ?)",
                 (ref_id, file_path, description)
             )
+            if info is not None:
+                self._save_asset_info(conn, "ReferenceAssetInfo", "ReferenceId", ref_id,
+                                      _REFERENCE_INFO_COLUMNS, info)
         return ref_id
 
+    def ingest_reference(self, ref_id: str) -> dict:
+        """(Пере)подготавливает уже зарегистрированный reference."""
+        from app.services.asset_ingest import ingest_reference
+        info = ingest_reference(self.get_reference_path(ref_id), self.assets_dir, ref_id)
+        with self._connection(write=True) as conn:
+            self._save_asset_info(conn, "ReferenceAssetInfo", "ReferenceId", ref_id,
+                                  _REFERENCE_INFO_COLUMNS, info)
+        return info
+
+    def get_reference_info(self, ref_id: str) -> Optional[dict]:
+        """
+        Метаданные подготовленного reference или None, если ingest не выполнялся
+        или исходный файл изменился с тех пор.
+        """
+        return self._load_asset_info(
+            "ReferenceAssetInfo", "ReferenceId", ref_id,
+            _REFERENCE_INFO_COLUMNS, self.get_reference_path(ref_id)
+        )
+
     def get_reference_path(self, ref_id: str) -> str:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             row = conn.execute(
                 "SELECT FilePath FROM ReferenceAudioFiles WHERE Id = ?", (ref_id,)
             ).fetchone()
@@ -66,17 +188,56 @@ class TemplateManager:
         return row[0]
 
     # --- Методы для VideoFiles ---
-    def add_video(self, file_path: str, description: Optional[str] = None) -> str:
+    def add_video(
+        self,
+        file_path: str,
+        description: Optional[str] = None,
+        ingest: bool = True,
+        normalize: bool = True
+    ) -> str:
+        """
+        Регистрирует видео.
+        ingest=True — сразу проверяет файл, сохраняет параметры потоков,
+        извлекает оригинальную дорожку в PCM; normalize=True — дополнительно
+        перекодирует видео в единый профиль (fps, интервал ключевых кадров, кодеки).
+        """
         vid_id = str(uuid.uuid4())
-        with sqlite3.connect(self.db_path) as conn:
+        info = None
+        if ingest:
+            from app.services.asset_ingest import ingest_video
+            info = ingest_video(file_path, self.assets_dir, vid_id, normalize=normalize)
+        with self._connection(write=True) as conn:
             conn.execute(
                 "INSERT INTO VideoFiles (Id, FilePath, Description) VALUES (?, ?, ?)",
                 (vid_id, file_path, description)
             )
+            if info is not None:
+                self._save_asset_info(conn, "VideoAssetInfo", "VideoId", vid_id,
+                                      _VIDEO_INFO_COLUMNS, info)
         return vid_id
 
+    def ingest_video(self, vid_id: str, normalize: bool = True) -> dict:
+        """(Пере)подготавливает уже зарегистрированное видео."""
+        from app.services.asset_ingest import ingest_video
+        info = ingest_video(self.get_video_path(vid_id), self.assets_dir, vid_id, normalize=normalize)
+        with self._connection(write=True) as conn:
+            self._save_asset_info(conn, "VideoAssetInfo", "VideoId", vid_id,
+                                  _VIDEO_INFO_COLUMNS, info)
+        return info
+
+    def get_video_info(self, vid_id: str) -> Optional[dict]:
+        """
+        Метаданные подготовленного видео (ключи как у probe_media + normalized_path,
+        original_audio_path, keyframe_interval) или None, если ingest не выполнялся
+        или исходный файл изменился с тех пор.
+        """
+        return self._load_asset_info(
+            "VideoAssetInfo", "VideoId", vid_id,
+            _VIDEO_INFO_COLUMNS, self.get_video_path(vid_id)
+        )
+
     def get_video_path(self, vid_id: str) -> str:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             row = conn.execute(
                 "SELECT FilePath FROM VideoFiles WHERE Id = ?", (vid_id,)
             ).fetchone()
@@ -94,7 +255,7 @@ class TemplateManager:
         description: Optional[str] = None
     ) -> str:
         template_id = str(uuid.uuid4())
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection(write=True) as conn:
             conn.execute("""
                 INSERT INTO Templates (Id, IntroId, VideoId, OutroId, ReferenceId, Description)
                 VALUES (?, ?, ?, ?, ?, ?)
@@ -102,7 +263,7 @@ class TemplateManager:
         return template_id
 
     def get_template(self, template_id: str) -> dict:
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             row = conn.execute("""
                 SELECT IntroId, VideoId, OutroId, ReferenceId, Description
                 FROM Templates WHERE Id = ?
@@ -115,4 +276,126 @@ class TemplateManager:
             "outro_id": row[2],
             "reference_id": row[3],
             "description": row[4]
-        }
\ No newline at end of file
+        }
+
+    def get_resolved_template(self, template_id: str) -> dict:
+        """
+        Шаблон со всеми путями и метаданными ассетов — одним JOIN-запросом
+        (с LRU-кэшем в памяти, который сбрасывается при записи).
+
+        Возвращает словарь:
+            template_id, description, intro_id, video_id, outro_id, reference_id,
+            intro_path, video_path, outro_path, reference_path,
+            intro_info, video_info, outro_info, reference_info
+        (*_info — как у get_video_info/get_reference_info; None, если нет или устарело)
+        """
+        with self._lock:
+            row = self._template_cache.get(template_id)
+            if row is not None:
+                self._template_cache.move_to_end(template_id)
+        if row is None:
+            row = self._query_resolved_template(template_id)
+
+        resolved = {"template_id": template_id, **row["template"]}
+        for role in ("intro", "video", "outro"):
+            resolved[f"{role}_path"] = row["paths"][role]
+            resolved[f"{role}_info"] = self._fresh_info(
+                dict(row["infos"][role]) if row["infos"][role] else None, row["paths"][role]
+            )
+        resolved["reference_path"] = row["paths"]["reference"]
+        resolved["reference_info"] = self._fresh_info(
+            dict(row["infos"]["reference"]) if row["infos"]["reference"] else None,
+            row["paths"]["reference"]
+        )
+        return resolved
+
+    def _query_resolved_template(self, template_id: str) -> dict:
+        video_aliases = (("intro", "IntroId"), ("video", "VideoId"), ("outro", "OutroId"))
+        columns = ["t.IntroId", "t.VideoId", "t.OutroId", "t.ReferenceId", "t.Description"]
+        joins = []
+        for alias, id_column in video_aliases:
+            columns.append(f"{alias}_file.FilePath")
+            columns += [f"{alias}_info.{column}" for column, _ in _VIDEO_INFO_COLUMNS]
+            joins.append(f"LEFT JOIN VideoFiles {alias}_file ON {alias}_file.Id = t.{id_column}")
+            joins.append(f"LEFT JOIN VideoAssetInfo {alias}_info ON {alias}_info.VideoId = t.{id_column}")
+        columns.append("ref_file.FilePath")
+        columns += [f"ref_info.{column}" for column, _ in _REFERENCE_INFO_COLUMNS]
+        joins.append("LEFT JOIN ReferenceAudioFiles ref_file ON ref_file.Id = t.ReferenceId")
+        joins.append("LEFT JOIN ReferenceAssetInfo ref_info ON ref_info.ReferenceId = t.ReferenceId")
+
+        with self._connection() as conn:
+            values = conn.execute(
+                f"SELECT {', '.join(columns)} FROM Templates t {' '.join(joins)} WHERE t.Id = ?",
+                (template_id,)
+            ).fetchone()
+            generation = self._generation
+        if not values:
+            raise ValueError(f"Шаблон с ID {template_id} не найден")
+
+        values = list(values)
+        template = dict(zip(
+            ("intro_id", "video_id", "outro_id", "reference_id", "description"), values[:5]
+        ))
+        position = 5
+        paths, infos = {}, {}
+
+        def take(columns_map):
+            nonlocal position
+            path = values[position]
+            raw = values[position + 1:position + 1 + len(columns_map)]
+            position += 1 + len(columns_map)
+            info = {key: value for (_, key), value in zip(columns_map, raw)}
+            return path, (info if info["source_fingerprint"] is not None else None)
+
+        for role, _ in video_aliases:
+            paths[role], infos[role] = take(_VIDEO_INFO_COLUMNS)
+            if role == "video" and paths[role] is None:
+                raise ValueError(f"Видео с ID {template['video_id']} не найдено")
+            if role != "video" and template[f"{role}_id"] and paths[role] is None:
+                raise ValueError(f"Видео с ID {template[f'{role}_id']} не найдено")
+        paths["reference"], infos["reference"] = take(_REFERENCE_INFO_COLUMNS)
+        if paths["reference"] is None:
+            raise ValueError(f"Reference с ID {template['reference_id']} не найден")
+
+        row = {"template": template, "paths": paths, "infos": infos}
+        with self._lock:
+            # Не кладём в кэш, если между запросом и сюда была запись
+            if self._generation == generation:
+                self._template_cache[template_id] = row
+                while len(self._template_cache) > self._template_cache_size:
+                    self._template_cache.popitem(last=False)
+        return row
+
+    # --- Метаданные подготовленных ассетов ---
+    @staticmethod
+    def _save_asset_info(conn, table: str, id_column: str, asset_id: str, columns, info: dict):
+        names = [id_column] + [column for column, _ in columns]
+        values = [asset_id] + [info.get(key) for _, key in columns]
+        conn.execute(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(names)}) "
+            f"VALUES ({', '.join('?' for _ in names)})",
+            values
+        )
+
+    def _load_asset_info(self, table: str, id_column: str, asset_id: str, columns, source_path: str) -> Optional[dict]:
+        with self._connection() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(column for column, _ in columns)} FROM {table} WHERE {id_column} = ?",
+                (asset_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return self._fresh_info({key: value for (_, key), value in zip(columns, row)}, source_path)
+
+    @staticmethod
+    def _fresh_info(info: Optional[dict], source_path: Optional[str]) -> Optional[dict]:
+        """Возвращает info, если исходник не менялся после ingest, иначе None."""
+        if info is None or info["source_fingerprint"] is None or not source_path:
+            return None
+        try:
+            stat = os.stat(source_path)
+        except OSError:
+            return None
+        if info["source_fingerprint"] != f"{stat.st_mtime_ns}:{stat.st_size}":
+            return None
+        return info
@@ -0,0 +1,212 @@
+"""
+Кэш готовых роликов-поздравлений.
+
+Один и тот же текст часто запрашивают повторно для того же шаблона
+(повторы, повторные скачивания, типовые тексты) — при попадании готовый MP4
+отдаётся копированием файла, без синтеза речи и кодирования.
+
+Ключ — (ID шаблона, версии его ассетов, нормализованный текст, параметры
+смешивания, профиль кодирования, модель TTS с режимом инференса).
+Версия ассета — ID и отпечаток исходного файла (mtime + размер), для
+подготовленных ассетов также результат ingest; при замене файла или повторном
+ingest через TemplateManager ключ меняется. Записи шаблона лежат в его
+подкаталоге и именуются <версии ассетов>-<ключ>.mp4: при записи новой версии
+записи прежних версий того же шаблона удаляются сразу.
+
+Вытеснение — по TTL (время с последнего обращения) и LRU по времени
+обращения при превышении лимита размера (индекс app.disk_lru в памяти).
+Запись отдаётся через checkout — закреплённой копией, которую не удалит
+вытеснение из-за параллельной записи в кэш.
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from app.disk_lru import DiskLRUIndex, pin_file
+from app.sentence_cache import normalize_sentence
+from app.services.asset_ingest import source_fingerprint
+
+# Каталог по умолчанию — рядом с app/db/templates.db
+DEFAULT_RESULT_CACHE_DIR = "app/db/result_cache"
+
+
+def _asset_version(asset_id: Optional[str], path: Optional[str], info: Optional[dict]) -> Optional[dict]:
+    if not path:
+        return None
+    try:
+        fingerprint = source_fingerprint(path)
+    except OSError:
+        fingerprint = None
+    version = {"id": asset_id, "source": fingerprint}
+    if info is not None:
+        # Результат ingest: другой нормализованный файл или reference — другая версия
+        version["ingest"] = info.get("content_hash") or info.get("normalized_path") or True
+    return version
+
+
+def asset_versions(resolved: dict) -> dict:
+    """Версии ассетов шаблона из TemplateManager.get_resolved_template."""
+    versions = {
+        role: _asset_version(resolved[f"{role}_id"], resolved[f"{role}_path"], resolved[f"{role}_info"])
+        for role in ("intro", "video", "outro")
+    }
+    versions["reference"] = _asset_version(
+        resolved["reference_id"], resolved["reference_path"], resolved["reference_info"]
+    )
+    return versions
+
+
+def _digest(payload: dict) -> str:
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class GreetingResultCache:
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_RESULT_CACHE_DIR,
+        max_bytes: int = 2 * 1024 ** 3,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600
+    ):
+        """
+        Параметры:
+            cache_dir: каталог записей
+            max_bytes: лимит размера; сверх него вытесняются давно не использованные
+            ttl_seconds: через сколько секунд без обращений запись устаревает
+                         (None — без срока)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = DiskLRUIndex(cache_dir, ".mp4", max_bytes, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def make_key(
+        resolved: dict,
+        text: str,
+        render_params: dict,
+        encoding_key: str,
+        model: Optional[str] = None
+    ) -> str:
+        """
+        Ключ записи: "<ID шаблона>/<версии ассетов>-<хэш запроса>".
+        render_params — параметры смешивания и рендера (fade, громкость, preview и т.д.).
+        """
+        versions = _digest(asset_versions(resolved))[:16]
+        request = _digest({
+            "text": normalize_sentence(text),
+            "params": render_params,
+            "encoding": encoding_key,
+            "model": model
+        })
+        return f"{resolved['template_id']}/{versions}-{request}"
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Путь к действующей записи; устаревшая по TTL удаляется."""
+        path = self.entry_path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl_seconds is not None and time.time() - stat.st_mtime > self.ttl_seconds:
+                self._index.discard(path)
+                os.remove(path)
+                return None
+            # Отмечаем использование для LRU и TTL
+            os.utime(path, None)
+        except OSError:
+            return None
+        self._index.touch(path)
+        return path
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Путь к MP4 или None при промахе (в том числе для устаревшей по TTL записи).
+        Файл может быть вытеснен в любой момент — для чтения используйте checkout.
+        """
+        path = self._lookup(key)
+        self._count(path is not None)
+        return path
+
+    def checkout(self, key: str) -> Optional[str]:
+        """
+        Закреплённая копия записи (app.disk_lru.pin_file) или None при промахе;
+        удаляет её вызывающий код (disk_lru.release_pin).
+        """
+        path = self._lookup(key)
+        pinned = pin_file(path, os.path.dirname(path)) if path is not None else None
+        self._count(pinned is not None)
+        return pinned
+
+    @contextmanager
+    def writing(self, key: str) -> Iterator[str]:
+        """
+        Отдаёт временный путь для записи MP4; после успешного выхода
+        из контекста запись атомарно появляется в кэше, а записи прежних
+        версий ассетов того же шаблона удаляются.
+        """
+        entry_path = self.entry_path(key)
+        directory = os.path.dirname(entry_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".mp4", dir=directory)
+        os.close(fd)
+        try:
+            yield tmp_path
+            os.replace(tmp_path, entry_path)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except (OSError, PermissionError):
+                    pass
+        self._index.add(entry_path)
+        self._drop_other_versions(entry_path)
+        self._index.evict(keep=entry_path)
+
+    def _drop_other_versions(self, entry_path: str):
+        directory = os.path.dirname(entry_path) + os.sep
+        current = directory + os.path.basename(entry_path).split("-", 1)[0] + "-"
+        self._index.remove_if(
+            lambda path: path.startswith(directory) and not path.startswith(current)
+            and os.sep not in path[len(directory):]
+        )
+
+    def invalidate(self, template_id: Optional[str] = None):
+        """
+        Удаляет записи шаблона (None — все записи). Закреплённые копии
+        (checkout) не трогаются: их ещё читают.
+        """
+        # Записи могли добавить другие процессы — сверяем индекс с диском
+        self._index.rescan()
+        if template_id is None:
+            self._index.remove_if(lambda path: True)
+        else:
+            prefix = os.path.join(self.cache_dir, template_id) + os.sep
+            self._index.remove_if(lambda path: path.startswith(prefix))
+
+    def stats(self) -> dict:
+        """Счётчики попаданий/промахов с момента создания."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
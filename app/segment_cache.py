@@ -0,0 +1,192 @@
+"""
+Кэш предварительно закодированных сегментов шаблонов (intro, outro и их
+варианты с затемнением в конце).
+
+Сегменты приводятся к единому профилю кодирования, поэтому основное видео,
+закодированное с тем же профилем, склеивается с ними concat-демуксером
+без перекодирования. Ключ включает ID шаблона, роль сегмента, профиль
+и отпечаток исходного файла (mtime + размер) — при изменении исходника
+запись просто перестаёт находиться и со временем вытесняется.
+Вытеснение — LRU по времени последнего обращения при превышении лимита размера.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import Optional
+from app.ffmpeg_utils import encode_normalized
+from app.encoding_profiles import EncodingProfile
+from app.disk_lru import DiskLRUIndex, pin_file
+
+# Каталог по умолчанию — рядом с app/db/templates.db
+DEFAULT_SEGMENT_CACHE_DIR = "app/db/segment_cache"
+
+# Параметры кодирования сегментов (размер кадра и fps берутся из основного видео)
+DEFAULT_SEGMENT_PROFILE = {
+    "preset": "medium",
+    "crf": 23,
+    "gop_seconds": 2,
+    "audio_sample_rate": 44100,
+    "audio_channels": 2,
+    "audio_bitrate": "128k"
+}
+
+
+def build_segment_profile(
+    main_info: dict,
+    base: Optional[dict] = None,
+    encoding: Optional[EncodingProfile] = None
+) -> dict:
+    """
+    Профиль кодирования сегментов под параметры основного видео (probe_media).
+    encoding: профиль вывода — его пресет, CRF/битрейт, потоки, размер кадра и fps
+    попадают в профиль сегментов, а значит и в ключ кэша.
+    """
+    profile = dict(base or DEFAULT_SEGMENT_PROFILE)
+    fps = main_info["fps"] or 25
+    width, height = main_info["width"], main_info["height"]
+    if encoding is not None:
+        fps = encoding.output_fps(fps)
+        width, height = encoding.output_size(width, height)
+        profile["preset"] = encoding.preset
+        profile["crf"] = encoding.crf
+        profile["audio_bitrate"] = encoding.audio_bitrate
+        if encoding.video_bitrate:
+            profile["video_bitrate"] = encoding.video_bitrate
+        if encoding.threads:
+            profile["threads"] = encoding.threads
+    # libx264 с yuv420p требует чётных размеров кадра
+    profile["width"] = (width // 2) * 2
+    profile["height"] = (height // 2) * 2
+    profile["fps"] = fps
+    profile["gop"] = max(1, int(round(fps * profile.pop("gop_seconds", 2))))
+    return profile
+
+
+class SegmentCache:
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_SEGMENT_CACHE_DIR,
+        max_bytes: int = 2 * 1024 ** 3
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # Размеры и порядок использования сегментов — в памяти, без обхода каталога на каждую запись
+        self._index = DiskLRUIndex(cache_dir, ".mp4", max_bytes)
+
+    @staticmethod
+    def _fingerprint(source_path: str) -> str:
+        stat = os.stat(source_path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _entry_path(
+        self,
+        template_id: str,
+        role: str,
+        source_path: str,
+        profile: dict,
+        fade_out: float
+    ) -> str:
+        key = json.dumps({
+            "template_id": template_id,
+            "role": role,
+            "source": os.path.abspath(source_path),
+            "fingerprint": self._fingerprint(source_path),
+            "profile": profile,
+            "fade_out": round(fade_out, 3)
+        }, sort_keys=True)
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.mp4")
+
+    def get_segment(
+        self,
+        template_id: str,
+        role: str,
+        source_path: str,
+        profile: dict,
+        fade_out: float = 0.0,
+        info: Optional[dict] = None
+    ) -> str:
+        """
+        Возвращает путь к нормализованному сегменту, кодируя его при промахе.
+        Файл может вытеснить запись другого сегмента — для склейки используйте
+        checkout_segment.
+
+        Параметры:
+            role: "intro" | "outro" (или другая метка сегмента)
+            fade_out: длительность затемнения в конце (вариант для последнего сегмента)
+            info: параметры потоков исходника, если уже известны
+        """
+        return self._segment(template_id, role, source_path, profile, fade_out, info, pin=False)
+
+    def checkout_segment(
+        self,
+        template_id: str,
+        role: str,
+        source_path: str,
+        profile: dict,
+        fade_out: float = 0.0,
+        info: Optional[dict] = None
+    ) -> str:
+        """
+        То же, что get_segment, но возвращает закреплённую копию сегмента
+        (app.disk_lru.pin_file): параллельное вытеснение её не удалит.
+        Удаляет вызывающий код (disk_lru.release_pin).
+        """
+        return self._segment(template_id, role, source_path, profile, fade_out, info, pin=True)
+
+    def _segment(
+        self,
+        template_id: str,
+        role: str,
+        source_path: str,
+        profile: dict,
+        fade_out: float,
+        info: Optional[dict],
+        pin: bool
+    ) -> str:
+        path = self._entry_path(template_id, role, source_path, profile, fade_out)
+        if os.path.exists(path):
+            # Отмечаем использование для LRU
+            try:
+                os.utime(path, None)
+                self._index.touch(path)
+                if not pin:
+                    return path
+                pinned = pin_file(path, self.cache_dir)
+                if pinned is not None:
+                    return pinned
+            except OSError:
+                pass
+
+        # Временный файл с точкой в начале не попадает под вытеснение
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".mp4", dir=self.cache_dir)
+        os.close(fd)
+        pinned = None
+        try:
+            encode_normalized(source_path, tmp_path, profile, fade_out=fade_out, info=info)
+            # Закрепляем до публикации: сразу после неё сегмент может быть вытеснен
+            if pin:
+                pinned = pin_file(tmp_path, self.cache_dir)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._index.add(path)
+        self._index.evict(keep=path)
+        return pinned if pin else path
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if not name.startswith(".") and name.endswith(".mp4"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+            self._index.clear()
@@ -0,0 +1,106 @@
+"""
+Контентно-адресуемый кэш синтезированного аудио отдельных предложений.
+
+Ключ — (нормализованный текст, хэш reference, модель, язык, seed).
+Хранится «сырой» выход модели до улучшения звука: улучшение применяется
+ко всей склеенной дорожке, поэтому от флага enhance запись не зависит.
+Записи — файлы .npz на диске; при превышении лимита размера вытесняются
+давно не использованные (LRU по времени обращения).
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from typing import Optional
+import numpy as np
+from app.disk_lru import DiskLRUIndex
+
+# Каталог по умолчанию — рядом с app/db/templates.db
+DEFAULT_SENTENCE_CACHE_DIR = "app/db/sentence_cache"
+
+
+def normalize_sentence(sentence: str) -> str:
+    """Приводит текст к каноническому виду для ключа кэша (NFC, одиночные пробелы)."""
+    return " ".join(unicodedata.normalize("NFC", sentence).split())
+
+
+class SentenceAudioCache:
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_SENTENCE_CACHE_DIR,
+        max_bytes: int = 512 * 1024 ** 2
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # Размеры и порядок использования записей — в памяти, без обхода каталога на каждую запись
+        self._index = DiskLRUIndex(cache_dir, ".npz", max_bytes)
+
+    @staticmethod
+    def make_key(
+        sentence: str,
+        reference_hash: str,
+        model_name: str,
+        language: str,
+        seed: Optional[int] = None
+    ) -> str:
+        payload = json.dumps({
+            "text": normalize_sentence(sentence),
+            "reference": reference_hash,
+            "model": model_name,
+            "language": language,
+            "seed": seed
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key: str) -> Optional[tuple[np.ndarray, int]]:
+        """Возвращает (float32-сэмплы, частота) или None при промахе."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                samples = (data["samples"] / 32768.0).astype(np.float32)
+                sample_rate = int(data["sample_rate"])
+            # Отмечаем использование для LRU
+            os.utime(path, None)
+        except (OSError, KeyError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self._index.touch(path)
+
+        with self._lock:
+            self.hits += 1
+        return samples, sample_rate
+
+    def put(self, key: str, samples: np.ndarray, sample_rate: int):
+        pcm = np.clip(np.round(samples * 32768.0), -32768, 32767).astype(np.int16)
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".npz", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, samples=pcm, sample_rate=np.int32(sample_rate))
+            os.replace(tmp_path, self._path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._index.add(self._path(key))
+        self._index.evict()
+
+    def stats(self) -> dict:
+        """Счётчики попаданий/промахов с момента создания."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,128 @@
+"""
+Приём ассетов шаблонов: проверка, нормализация и предварительная подготовка.
+
+Всё, что раньше делалось на каждом запросе (определение длительности,
+извлечение оригинальной дорожки, конвертация reference в формат XTTS),
+выполняется один раз при регистрации файла.
+"""
+
+import os
+import hashlib
+from typing import Optional
+from app.ffmpeg_utils import encode_normalized, probe_media, run_ffmpeg
+
+# Профиль нормализации видео: размер кадра сохраняется (приводится к чётному)
+INGEST_VIDEO_PROFILE = {
+    "fps": 25,
+    "gop_seconds": 2,
+    "preset": "medium",
+    "crf": 20,
+    "audio_sample_rate": 44100,
+    "audio_channels": 2,
+    "audio_bitrate": "192k"
+}
+
+# Формат reference для XTTS
+XTTS_SAMPLE_RATE = 22050
+
+
+def source_fingerprint(file_path: str) -> str:
+    """Отпечаток исходного файла: mtime + размер."""
+    stat = os.stat(file_path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def ingest_video(
+    file_path: str,
+    assets_dir: str,
+    asset_id: str,
+    normalize: bool = True,
+    profile: Optional[dict] = None
+) -> dict:
+    """
+    Проверяет и подготавливает видео.
+
+    normalize=True — перекодирует в единый профиль (fps, GOP, yuv420p, AAC),
+    чтобы интервал ключевых кадров и параметры потоков были известны заранее.
+    Оригинальная дорожка извлекается в PCM WAV (16 бит) рядом с базой.
+
+    Возвращает словарь с полями probe_media и дополнительно:
+        normalized_path, original_audio_path, keyframe_interval, source_fingerprint
+    """
+    if not os.path.exists(file_path):
+        raise ValueError(f"Файл не найден: {file_path}")
+
+    info = probe_media(file_path)
+    if info["video_codec"] is None or not info["width"] or not info["duration"]:
+        raise ValueError(f"Файл не содержит видеопотока: {file_path}")
+
+    os.makedirs(assets_dir, exist_ok=True)
+    fingerprint = source_fingerprint(file_path)
+    profile = dict(profile or INGEST_VIDEO_PROFILE)
+    keyframe_interval = None
+    normalized_path = None
+
+    if normalize:
+        profile["width"] = (info["width"] // 2) * 2
+        profile["height"] = (info["height"] // 2) * 2
+        keyframe_interval = max(1, int(round(profile["fps"] * profile.pop("gop_seconds"))))
+        profile["gop"] = keyframe_interval
+
+        normalized_path = os.path.join(assets_dir, f"{asset_id}.mp4")
+        encode_normalized(file_path, normalized_path, profile)
+        info = probe_media(normalized_path)
+
+    original_audio_path = None
+    if info["audio_codec"] is not None:
+        original_audio_path = os.path.join(assets_dir, f"{asset_id}.wav")
+        run_ffmpeg([
+            "-i", normalized_path or file_path,
+            "-vn",
+            "-c:a", "pcm_s16le",
+            original_audio_path
+        ])
+
+    info.update({
+        "normalized_path": normalized_path,
+        "original_audio_path": original_audio_path,
+        "keyframe_interval": keyframe_interval,
+        "source_fingerprint": fingerprint
+    })
+    return info
+
+
+def ingest_reference(file_path: str, assets_dir: str, asset_id: str) -> dict:
+    """
+    Проверяет reference-аудио и сохраняет его копию в формате XTTS
+    (22050 Гц, моно, 16 бит, WAV).
+
+    Возвращает словарь:
+        content_hash, duration, xtts_wav_path, source_fingerprint
+    """
+    if not os.path.exists(file_path):
+        raise ValueError(f"Файл не найден: {file_path}")
+
+    info = probe_media(file_path)
+    if info["audio_codec"] is None or not info["duration"]:
+        raise ValueError(f"Файл не содержит аудиопотока: {file_path}")
+
+    with open(file_path, "rb") as f:
+        content_hash = hashlib.sha256(f.read()).hexdigest()
+
+    os.makedirs(assets_dir, exist_ok=True)
+    xtts_wav_path = os.path.join(assets_dir, f"{asset_id}.xtts.wav")
+    run_ffmpeg([
+        "-i", file_path,
+        "-vn",
+        "-ar", str(XTTS_SAMPLE_RATE),
+        "-ac", "1",
+        "-c:a", "pcm_s16le",
+        xtts_wav_path
+    ])
+
+    return {
+        "content_hash": content_hash,
+        "duration": info["duration"],
+        "xtts_wav_path": xtts_wav_path,
+        "source_fingerprint": source_fingerprint(file_path)
+    }
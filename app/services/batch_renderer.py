@@ -0,0 +1,253 @@
+"""
+Пакетный рендер поздравлений с конвейером этапов.
+
+Синтез речи и кодирование видео идут в отдельных потоках, связанных
+ограниченной очередью: пока кодируется задание N, уже синтезируется N+1.
+Задания можно читать из JSONL (по объекту на строку):
+    {"template_id": "...", "text": "...", "job_id": "...", "output": "...", "profile": "..."}
+(job_id, output и profile необязательны).
+
+Запуск из командной строки:
+    python -m app.services.batch_renderer jobs.jsonl --out results/ --profile fast-preview
+"""
+
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+from dataclasses import dataclass, asdict
+from typing import Iterable, NamedTuple, Optional
+from app.models.template_manager import TemplateManager
+from app.services.greeting_generator import greeting_result_key, render_greeting_to, synthesize_greeting_audio
+from app.segment_cache import SegmentCache
+from app.result_cache import GreetingResultCache
+from app.media_io import copy_to_target
+from app.disk_lru import release_pin
+from app.encoding_profiles import ProfileArg, PROFILES, DEFAULT_PROFILE
+from app.tts_pool import TTSWorkerPool
+
+# Признак конца потока заданий в очереди
+_DONE = object()
+
+
+class BatchJob(NamedTuple):
+    job_id: str
+    template_id: str
+    text: str
+    output_path: str
+    profile: Optional[str] = None   # профиль кодирования; None — общий для пакета
+
+
+@dataclass
+class BatchJobResult:
+    job_id: str
+    template_id: str
+    output_path: str
+    ok: bool
+    error: Optional[str] = None
+    tts_seconds: float = 0.0
+    render_seconds: float = 0.0
+    cached: bool = False          # взято из кэша готовых роликов
+
+
+def load_jobs_jsonl(path: str, output_dir: str) -> list[BatchJob]:
+    """Читает задания из JSONL; пустые строки пропускаются, повторяющиеся job_id — ошибка."""
+    jobs = []
+    seen: dict[str, int] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if "template_id" not in data or "text" not in data:
+                raise ValueError(f"Строка {line_no}: нужны поля template_id и text")
+            job_id = str(data.get("job_id") or data.get("request_id") or line_no)
+            if job_id in seen:
+                raise ValueError(
+                    f"Строка {line_no}: job_id {job_id} уже встречался в строке {seen[job_id]}"
+                )
+            seen[job_id] = line_no
+            output_path = data.get("output") or os.path.join(output_dir, f"{job_id}.mp4")
+            jobs.append(BatchJob(
+                job_id, data["template_id"], data["text"], output_path, data.get("profile")
+            ))
+    return jobs
+
+
+def render_batch(
+    template_manager: TemplateManager,
+    jobs: Iterable[BatchJob],
+    queue_size: int = 2,
+    pool: Optional[TTSWorkerPool] = None,
+    segment_cache: Optional[SegmentCache] = None,
+    fade_duration: float = 1.0,
+    tts_volume_boost_db: float = 0.0,
+    post_audio_padding: float = 1.0,
+    profile: ProfileArg = None,
+    result_cache: Optional[GreetingResultCache] = None
+) -> list[BatchJobResult]:
+    """
+    Рендерит задания конвейером «синтез → кодирование».
+
+    Параметры:
+        queue_size: сколько готовых TTS может ждать кодирования
+                    (ограничивает память и забег синтеза вперёд)
+        pool: пул процессов TTS для параллельного синтеза предложений
+        segment_cache, fade_duration, tts_volume_boost_db, post_audio_padding:
+            как у generate_greeting_from_template
+        profile: профиль кодирования для заданий без своего profile
+        result_cache: кэш готовых роликов — задания с попаданием только копируются,
+                      минуя синтез и кодирование, промахи пополняют кэш
+
+    Возвращает:
+        результаты в порядке заданий; ошибка одного задания не останавливает пакет
+    """
+    jobs = list(jobs)
+    # По номеру задания: job_id в переданном списке могут повторяться
+    results: dict[int, BatchJobResult] = {}
+    synthesized: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+
+    def tts_stage():
+        try:
+            for index, job in enumerate(jobs):
+                if stop.is_set():
+                    break
+                started = time.perf_counter()
+                key = None
+                try:
+                    if result_cache is not None:
+                        key = greeting_result_key(
+                            template_manager, job.template_id, job.text,
+                            fade_duration=fade_duration,
+                            tts_volume_boost_db=tts_volume_boost_db,
+                            post_audio_padding=post_audio_padding,
+                            profile=job.profile or profile
+                        )
+                        cached_path = result_cache.checkout(key)
+                        if cached_path is not None:
+                            try:
+                                copy_to_target(cached_path, job.output_path)
+                            finally:
+                                release_pin(cached_path)
+                            results[index] = BatchJobResult(
+                                job.job_id, job.template_id, job.output_path, ok=True,
+                                render_seconds=time.perf_counter() - started, cached=True
+                            )
+                            continue
+                    tts_audio_bytes = synthesize_greeting_audio(
+                        template_manager, job.template_id, job.text, pool
+                    )
+                except Exception as e:
+                    results[index] = BatchJobResult(
+                        job.job_id, job.template_id, job.output_path, ok=False,
+                        error=f"tts: {e}", tts_seconds=time.perf_counter() - started
+                    )
+                    continue
+                synthesized.put((index, job, key, tts_audio_bytes, time.perf_counter() - started))
+        finally:
+            synthesized.put(_DONE)
+
+    def render_stage():
+        while True:
+            item = synthesized.get()
+            if item is _DONE:
+                break
+            index, job, key, tts_audio_bytes, tts_seconds = item
+            started = time.perf_counter()
+            render_kwargs = dict(
+                fade_duration=fade_duration,
+                tts_volume_boost_db=tts_volume_boost_db,
+                post_audio_padding=post_audio_padding,
+                segment_cache=segment_cache,
+                profile=job.profile or profile
+            )
+            try:
+                if key is None:
+                    # Видео пишется сразу в файл задания, без копии в памяти
+                    render_greeting_to(
+                        template_manager, job.template_id, tts_audio_bytes, job.output_path,
+                        **render_kwargs
+                    )
+                else:
+                    with result_cache.writing(key) as tmp_path:
+                        render_greeting_to(
+                            template_manager, job.template_id, tts_audio_bytes, tmp_path,
+                            **render_kwargs
+                        )
+                        copy_to_target(tmp_path, job.output_path)
+                results[index] = BatchJobResult(
+                    job.job_id, job.template_id, job.output_path, ok=True,
+                    tts_seconds=tts_seconds, render_seconds=time.perf_counter() - started
+                )
+            except Exception as e:
+                results[index] = BatchJobResult(
+                    job.job_id, job.template_id, job.output_path, ok=False,
+                    error=f"render: {e}", tts_seconds=tts_seconds,
+                    render_seconds=time.perf_counter() - started
+                )
+
+    tts_thread = threading.Thread(target=tts_stage, name="batch-tts", daemon=True)
+    render_thread = threading.Thread(target=render_stage, name="batch-render", daemon=True)
+    tts_thread.start()
+    render_thread.start()
+    try:
+        tts_thread.join()
+        render_thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        raise
+
+    return [
+        results.get(index) or BatchJobResult(
+            job.job_id, job.template_id, job.output_path, ok=False, error="не выполнено"
+        )
+        for index, job in enumerate(jobs)
+    ]
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Пакетный рендер поздравлений из JSONL")
+    parser.add_argument("jobs", help="файл заданий JSONL")
+    parser.add_argument("--db", default="app/db/templates.db", help="база шаблонов")
+    parser.add_argument("--out", default="results", help="каталог для видео")
+    parser.add_argument("--report", help="куда записать результаты (JSONL)")
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help="профиль кодирования по умолчанию")
+    parser.add_argument("--result-cache", metavar="DIR",
+                        help="каталог кэша готовых роликов (повторы заданий только копируются)")
+    parser.add_argument("--tts-workers", type=int, default=0,
+                        help="процессов TTS (0 — синтез в основном процессе)")
+    args = parser.parse_args(argv)
+
+    template_manager = TemplateManager(args.db)
+    jobs = load_jobs_jsonl(args.jobs, args.out)
+    pool = TTSWorkerPool(size=args.tts_workers) if args.tts_workers > 0 else None
+    result_cache = GreetingResultCache(args.result_cache) if args.result_cache else None
+    try:
+        results = render_batch(
+            template_manager, jobs, queue_size=args.queue_size, pool=pool, profile=args.profile,
+            result_cache=result_cache
+        )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    lines = [json.dumps(asdict(result), ensure_ascii=False) for result in results]
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    for line in lines:
+        print(line)
+
+    failed = sum(1 for result in results if not result.ok)
+    print(f"Готово: {len(results) - failed} из {len(results)}, ошибок: {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,13 +3,814 @@
 Связывает: TemplateManager, TTS, VideoMixer.
 """
 
+import io
 import os
-import tempfile
-from typing import Optional
-from moviepy.editor import VideoFileClip, concatenate_videoclips
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, Union
 from app.models.template_manager import TemplateManager
-from app.tts_generator import generate_speech
-from app.video_mixer import mix_video_with_audio
+from app.tts_generator import generate_speech_to, model_key, plan_speech
+from app.video_mixer import open_mixed_clip, plan_mixed_audio, remux_with_audio, write_clip
+from app.audio_mixer import audio_duration
+from app.media_io import MediaSource, MediaTarget, copy_to_target, make_temp_path, source_path, target_path
+from app.ffmpeg_utils import concat_copy, encode_normalized, probe_media, run_ffmpeg, streams_compatible
+from app.segment_cache import SegmentCache, build_segment_profile
+from app.encoding_profiles import EncodingProfile, ProfileArg, get_profile
+from app.greeting_audio_cache import GreetingAudioCache, default_cache
+from app.disk_lru import release_pin
+from app.result_cache import GreetingResultCache
+from app.chunk_planner import ChunkPlan
+from app.duration_planner import (
+    SpeechRateModel, VideoSpan, default_model, plan_video_span, warn_if_exceeds, warn_if_speech_exceeds
+)
+from app.services.asset_ingest import source_fingerprint
+from app.tts_pool import TTSWorkerPool
+from app import instrumentation
+
+# Черновой рендер (preview): "video" — всё видео профилем PREVIEW_PROFILE,
+# "audio" — смешанный звук основной части с одним кадром-постером
+PREVIEW_VIDEO = "video"
+PREVIEW_AUDIO = "audio"
+PREVIEW_PROFILE = "fast-preview"
+# Момент основного видео для постера, сек
+POSTER_TIME = 1.0
+
+
+class _VideoAsset(NamedTuple):
+    path: str                  # подготовленная (нормализованная) копия или исходник
+    info: Optional[dict]       # метаданные ingest; None — файл не подготовлен
+
+    def probe(self) -> dict:
+        """Параметры потоков: из базы, а для неподготовленных файлов — через ffmpeg."""
+        return self.info if self.info is not None else probe_media(self.path)
+
+    @property
+    def original_audio_path(self) -> Optional[str]:
+        return self.info["original_audio_path"] if self.info is not None else None
+
+
+def _video_asset(resolved: dict, role: str) -> Optional[_VideoAsset]:
+    """Сегмент шаблона ("intro" | "video" | "outro") из get_resolved_template."""
+    path = resolved[f"{role}_path"]
+    if not path:
+        return None
+    info = resolved[f"{role}_info"]
+    if info is not None and info["normalized_path"] and os.path.exists(info["normalized_path"]):
+        return _VideoAsset(info["normalized_path"], info)
+    return _VideoAsset(path, info)
+
+
+def _load_reference(resolved: dict) -> tuple[bytes, Optional[str]]:
+    """Байты reference-аудио: готовый WAV для XTTS, если reference подготовлен."""
+    info = resolved["reference_info"]
+    if info is not None and os.path.exists(info["xtts_wav_path"]):
+        with open(info["xtts_wav_path"], "rb") as f:
+            return f.read(), "wav"
+    with open(resolved["reference_path"], "rb") as f:
+        return f.read(), None
+
+
+def _reference_fingerprint(resolved: dict) -> str:
+    """Версия reference-аудио для ключей кэша: хэш содержимого из ingest или mtime + размер."""
+    info = resolved["reference_info"]
+    if info is not None and info["content_hash"]:
+        return info["content_hash"]
+    return source_fingerprint(resolved["reference_path"])
+
+
+def _preview_mode(preview: Union[bool, str]) -> Optional[str]:
+    if preview is True:
+        return PREVIEW_VIDEO
+    if not preview:
+        return None
+    if preview not in (PREVIEW_VIDEO, PREVIEW_AUDIO):
+        raise ValueError(f"Неизвестный режим preview: {preview}")
+    return preview
+
+
+def _target_resolution(asset: _VideoAsset, encoding: EncodingProfile) -> Optional[tuple[int, int]]:
+    """Размер кадра для VideoFileClip, если профиль уменьшает видео."""
+    if not encoding.max_height:
+        return None
+    return encoding.target_resolution(asset.probe())
+
+
+class _SpanPlan(NamedTuple):
+    main: _VideoAsset
+    main_info: dict                # параметры потоков основного видео
+    plan: ChunkPlan                # план фрагментов синтеза
+    voice: str                     # голос для калибровки скорости (ID reference)
+    span: VideoSpan
+
+
+def _plan_main_span(
+    template_manager: TemplateManager,
+    template_id: str,
+    text: str,
+    post_audio_padding: float,
+    duration_model: SpeechRateModel
+) -> _SpanPlan:
+    """Оценка длительности речи до синтеза и нужный под неё отрезок основного видео."""
+    with instrumentation.span("greeting.plan_duration"):
+        resolved = template_manager.get_resolved_template(template_id)
+        main = _video_asset(resolved, "video")
+        main_info = main.probe()
+        if main_info["duration"] is None:
+            raise ValueError(f"Не удалось определить длительность: {main.path}")
+        plan = plan_speech(text)
+        voice = resolved["reference_id"]
+        estimate = duration_model.estimate(plan, voice)
+        span = plan_video_span(estimate, main_info["duration"], post_audio_padding)
+    return _SpanPlan(main, main_info, plan, voice, span)
+
+
+def _extract_original_audio(video_path: str, seconds: float, output_path: str) -> None:
+    """Оригинальная дорожка видео в PCM WAV; декодируется только первые seconds секунд."""
+    with instrumentation.span("greeting.prepare_span", seconds=seconds):
+        run_ffmpeg([
+            "-t", f"{seconds:.3f}",
+            "-i", video_path,
+            "-vn",
+            "-c:a", "pcm_s16le",
+            output_path
+        ])
+
+
+def _render_single_pass(
+    intro: Optional[_VideoAsset],
+    main: _VideoAsset,
+    outro: Optional[_VideoAsset],
+    tts_path: str,
+    output_path: str,
+    fade_duration: float,
+    tts_volume_boost_db: float,
+    post_audio_padding: float,
+    encoding: EncodingProfile
+) -> None:
+    """
+    Обрезанное основное видео со смешанным аудио склеивается с intro/outro
+    и кодируется один раз с параметрами профиля encoding.
+    """
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+
+    clips = []
+    final_clip = None
+
+    with open_mixed_clip(
+        main.path, tts_path, tts_volume_boost_db, post_audio_padding,
+        original_audio_path=main.original_audio_path,
+        info=main.info,
+        target_resolution=_target_resolution(main, encoding)
+    ) as mixed:
+        try:
+            # === Intro ===
+            if intro:
+                clips.append(VideoFileClip(
+                    intro.path, target_resolution=_target_resolution(intro, encoding)
+                ))
+
+            # === Main ===
+            clips.append(mixed.clip)
+
+            # === Outro ===
+            if outro:
+                clips.append(VideoFileClip(
+                    outro.path, target_resolution=_target_resolution(outro, encoding)
+                ))
+
+            # === Склейка ===
+            final_clip = concatenate_videoclips(clips, method="compose")
+
+            # Применяем fade-out ко всему видео
+            if fade_duration > 0 and fade_duration < final_clip.duration:
+                final_clip = final_clip.fadeout(fade_duration)
+
+            with instrumentation.span("render.encode"):
+                write_clip(final_clip, output_path, encoding)
+
+        finally:
+            # Закрываем клипы (основной закроет open_mixed_clip)
+            for clip in clips:
+                if clip is not mixed.clip:
+                    clip.close()
+            if final_clip is not None:
+                final_clip.close()
+
+
+def _render_concat_copy(
+    intro: Optional[_VideoAsset],
+    main: _VideoAsset,
+    outro: Optional[_VideoAsset],
+    tts_path: str,
+    output_path: str,
+    tts_volume_boost_db: float,
+    post_audio_padding: float,
+    encoding: EncodingProfile
+) -> bool:
+    """
+    Склейка без перекодирования видео: основное видео копируется с новой AAC-дорожкой,
+    intro/outro — как есть, всё соединяется concat-демуксером.
+    Возвращает False, если кодеки/параметры сегментов не совпадают
+    или профиль кодирования меняет размер кадра/fps.
+    """
+    main_info = main.probe()
+    extra_infos = [asset.probe() for asset in (intro, outro) if asset]
+    if any(encoding.changes_stream(info) for info in [main_info] + extra_infos):
+        return False
+    if not streams_compatible([main_info] + extra_infos, check_audio=False):
+        return False
+    audio_sample_rate = audio_channels = None
+    if extra_infos:
+        if not streams_compatible(extra_infos) or extra_infos[0]["audio_codec"] != "aac":
+            return False
+        audio_sample_rate = extra_infos[0]["audio_sample_rate"]
+        audio_channels = extra_infos[0]["audio_channels"]
+
+    main_temp = make_temp_path(".mp4")
+    try:
+        # Смесь считается потоково и подаётся в ffmpeg без промежуточного WAV
+        mix = plan_mixed_audio(
+            main.path, tts_path, tts_volume_boost_db, post_audio_padding,
+            original_audio_path=main.original_audio_path,
+            info=main.info
+        )
+        with instrumentation.span("render.remux_main"):
+            remux_with_audio(
+                main.path, mix.as_ffmpeg_input(), mix.duration, main_temp,
+                audio_sample_rate, audio_channels, encoding.audio_bitrate,
+                # Промежуточный сегмент: moov переставит итоговая склейка
+                faststart=False
+            )
+        segments = [path for path in (
+            intro.path if intro else None, main_temp, outro.path if outro else None
+        ) if path]
+        with instrumentation.span("render.concat"):
+            concat_copy(segments, output_path, faststart=encoding.faststart)
+        return True
+    except RuntimeError:
+        return False
+    finally:
+        if os.path.exists(main_temp):
+            try:
+                os.remove(main_temp)
+            except (OSError, PermissionError):
+                pass
+
+
+def _render_with_segment_cache(
+    segment_cache: SegmentCache,
+    template_id: str,
+    intro: Optional[_VideoAsset],
+    main: _VideoAsset,
+    outro: Optional[_VideoAsset],
+    tts_path: str,
+    output_path: str,
+    fade_duration: float,
+    tts_volume_boost_db: float,
+    post_audio_padding: float,
+    encoding: EncodingProfile
+) -> bool:
+    """
+    Intro/outro берутся из кэша уже закодированными, кодируется только основное видео
+    (тем же профилем), затем всё склеивается concat-демуксером.
+    Профиль encoding входит в профиль сегментов — и в ключ кэша.
+    Возвращает False, если затемнение не помещается в outro — тогда нужен обычный путь.
+    """
+    main_info = main.probe()
+    profile = build_segment_profile(main_info, encoding=encoding)
+
+    # Затемнение в конце: вариант outro из кэша или само основное видео
+    outro_fade = main_fade = 0.0
+    if fade_duration > 0:
+        if outro:
+            outro_duration = outro.probe()["duration"]
+            if outro_duration is None or fade_duration >= outro_duration:
+                return False
+            outro_fade = fade_duration
+        else:
+            main_fade = fade_duration
+
+    main_temp = make_temp_path(".mp4")
+    # Сегменты из кэша закреплены до конца склейки: их может вытеснить параллельный рендер
+    pinned = []
+    try:
+        segments = []
+        if intro:
+            with instrumentation.span("render.cached_segment", role="intro"):
+                pinned.append(segment_cache.checkout_segment(
+                    template_id, "intro", intro.path, profile, info=intro.info
+                ))
+            segments.append(pinned[-1])
+
+        mix = plan_mixed_audio(
+            main.path, tts_path, tts_volume_boost_db, post_audio_padding,
+            original_audio_path=main.original_audio_path,
+            info=main_info
+        )
+        with instrumentation.span("render.encode_main"):
+            encode_normalized(
+                main.path, main_temp, profile,
+                audio_path=mix.as_ffmpeg_input(),
+                duration=mix.duration,
+                fade_out=main_fade if main_fade < mix.duration else 0.0,
+                info=main_info
+            )
+        segments.append(main_temp)
+
+        if outro:
+            with instrumentation.span("render.cached_segment", role="outro"):
+                pinned.append(segment_cache.checkout_segment(
+                    template_id, "outro", outro.path, profile,
+                    fade_out=outro_fade, info=outro.info
+                ))
+            segments.append(pinned[-1])
+
+        with instrumentation.span("render.concat"):
+            concat_copy(segments, output_path, faststart=encoding.faststart)
+        return True
+    finally:
+        for path in pinned:
+            release_pin(path)
+        if os.path.exists(main_temp):
+            try:
+                os.remove(main_temp)
+            except (OSError, PermissionError):
+                pass
+
+
+def _render_poster_preview(
+    main: _VideoAsset,
+    tts_path: str,
+    output_path: str,
+    tts_volume_boost_db: float,
+    post_audio_padding: float,
+    encoding: EncodingProfile
+) -> None:
+    """
+    Черновик «звук + постер»: смешанная дорожка основной части и один кадр
+    основного видео. Видео почти не кодируется — 1 кадр в секунду, tune stillimage.
+    """
+    main_info = main.probe()
+    mix = plan_mixed_audio(
+        main.path, tts_path, tts_volume_boost_db, post_audio_padding,
+        original_audio_path=main.original_audio_path,
+        info=main_info
+    )
+    width, height = encoding.output_size(main_info["width"], main_info["height"])
+    poster_path = make_temp_path(".jpg")
+    try:
+        run_ffmpeg([
+            "-ss", f"{min(POSTER_TIME, mix.duration / 2):.3f}",
+            "-i", main.path,
+            "-frames:v", "1",
+            "-vf", f"scale={width}:{height}",
+            poster_path
+        ])
+        audio = mix.as_ffmpeg_input()
+        run_ffmpeg([
+            "-loop", "1", "-framerate", "1", "-i", poster_path,
+            *audio.args,
+            "-map", "0:v:0",
+            "-map", "1:a:0",
+            "-t", f"{mix.duration:.3f}",
+            "-c:v", "libx264",
+            "-preset", "ultrafast",
+            "-tune", "stillimage",
+            "-pix_fmt", "yuv420p",
+            "-r", "1",
+            "-c:a", "aac",
+            "-b:a", encoding.audio_bitrate,
+            *encoding.movflags_args(),
+            output_path
+        ], stdin_blocks=audio.blocks)
+    finally:
+        if os.path.exists(poster_path):
+            try:
+                os.remove(poster_path)
+            except (OSError, PermissionError):
+                pass
+
+
+def synthesize_greeting_audio_to(
+    template_manager: TemplateManager,
+    template_id: str,
+    text: str,
+    output: MediaTarget,
+    pool: Optional[TTSWorkerPool] = None
+) -> None:
+    """Этап 1: синтез речи голосом шаблона с записью WAV в путь или поток."""
+    with instrumentation.trace("greeting.synthesize", template_id=template_id):
+        with instrumentation.span("greeting.resolve_template"):
+            resolved = template_manager.get_resolved_template(template_id)
+            ref_bytes, ref_format = _load_reference(resolved)
+        generate_speech_to(
+            text,
+            ref_bytes,
+            output,
+            input_format=ref_format,
+            reference_id=resolved["reference_id"],
+            pool=pool
+        )
+
+
+def synthesize_greeting_audio(
+    template_manager: TemplateManager,
+    template_id: str,
+    text: str,
+    pool: Optional[TTSWorkerPool] = None
+) -> bytes:
+    """
+    Этап 1: синтез речи голосом шаблона.
+
+    Возвращает:
+        байты TTS-аудио в формате WAV
+    """
+    buffer = io.BytesIO()
+    synthesize_greeting_audio_to(template_manager, template_id, text, buffer, pool)
+    return buffer.getvalue()
+
+
+def _cached_greeting_audio(
+    template_manager: TemplateManager,
+    template_id: str,
+    text: str,
+    tts_cache: GreetingAudioCache,
+    pool: Optional[TTSWorkerPool] = None
+) -> str:
+    """
+    TTS-дорожка из кэша; при промахе речь синтезируется прямо в кэш.
+    Возвращает закреплённую копию записи (GreetingAudioCache.pin) — её удаляет
+    вызывающий код; вытеснение записи во время рендера на неё не влияет.
+    """
+    resolved = template_manager.get_resolved_template(template_id)
+    key = GreetingAudioCache.make_key(
+        text, resolved["reference_id"], _reference_fingerprint(resolved), model=model_key()
+    )
+    pinned = tts_cache.checkout(key)
+    if pinned is not None:
+        instrumentation.count("greeting_tts_cache_hits")
+        return pinned
+    with tts_cache.writing(key) as tmp_path:
+        synthesize_greeting_audio_to(template_manager, template_id, text, tmp_path, pool)
+        # Закрепляем до публикации: сразу после неё запись может быть вытеснена
+        pinned = tts_cache.pin(tmp_path)
+    return pinned
+
+
+def render_greeting_to(
+    template_manager: TemplateManager,
+    template_id: str,
+    tts_audio: MediaSource,
+    output: MediaTarget,
+    fade_duration: float = 1.0,
+    tts_volume_boost_db: float = 0.0,
+    post_audio_padding: float = 1.0,
+    concat_without_reencode: bool = False,
+    segment_cache: Optional[SegmentCache] = None,
+    profile: ProfileArg = None,
+    preview: Union[bool, str] = False
+) -> None:
+    """
+    Этап 2: смешивание готового TTS с видео шаблона, склейка и кодирование.
+
+    tts_audio: путь к WAV (читается на месте), его байты или файловый объект.
+    output: путь или поток для итогового MP4; в путь ffmpeg пишет напрямую.
+    Остальные параметры — как у generate_greeting_from_template.
+    """
+    _render_greeting(
+        template_manager, template_id, tts_audio, output,
+        fade_duration=fade_duration,
+        tts_volume_boost_db=tts_volume_boost_db,
+        post_audio_padding=post_audio_padding,
+        concat_without_reencode=concat_without_reencode,
+        segment_cache=segment_cache,
+        profile=profile,
+        preview=preview
+    )
+
+
+def _render_greeting(
+    template_manager: TemplateManager,
+    template_id: str,
+    tts_audio: MediaSource,
+    output: MediaTarget,
+    fade_duration: float = 1.0,
+    tts_volume_boost_db: float = 0.0,
+    post_audio_padding: float = 1.0,
+    concat_without_reencode: bool = False,
+    segment_cache: Optional[SegmentCache] = None,
+    profile: ProfileArg = None,
+    preview: Union[bool, str] = False,
+    main: Optional[_VideoAsset] = None
+) -> None:
+    """
+    render_greeting_to; main — уже разобранное основное видео (например, из
+    _plan_main_span, с извлечённой оригинальной дорожкой), чтобы не разбирать его повторно.
+    """
+    mode = _preview_mode(preview)
+    encoding = get_profile(PREVIEW_PROFILE if mode else profile)
+    with instrumentation.trace(
+        "greeting.render", template_id=template_id, encoding=encoding.name, preview=mode
+    ) as trace:
+        with instrumentation.span("greeting.resolve_template"):
+            resolved = template_manager.get_resolved_template(template_id)
+
+            # Сегменты (читаются на месте, без копий во временные файлы)
+            if main is None:
+                main = _video_asset(resolved, "video")
+            intro = _video_asset(resolved, "intro")
+            outro = _video_asset(resolved, "outro")
+
+        with source_path(tts_audio, ".wav") as tts_path, \
+             target_path(output, ".mp4") as output_path:
+            if mode == PREVIEW_AUDIO:
+                with instrumentation.span("render.poster_preview"):
+                    _render_poster_preview(
+                        main, tts_path, output_path,
+                        tts_volume_boost_db, post_audio_padding, encoding
+                    )
+                render_path = "poster_preview"
+            else:
+                render_path = _render_to_path(
+                    template_id, intro, main, outro, tts_path, output_path,
+                    fade_duration, tts_volume_boost_db, post_audio_padding,
+                    concat_without_reencode, segment_cache, encoding
+                )
+            if trace is not None:
+                trace.attrs["render_path"] = render_path
+                instrumentation.count("video_bytes_written", os.path.getsize(output_path))
+
+
+def _render_to_path(
+    template_id: str,
+    intro: Optional[_VideoAsset],
+    main: _VideoAsset,
+    outro: Optional[_VideoAsset],
+    tts_path: str,
+    output_path: str,
+    fade_duration: float,
+    tts_volume_boost_db: float,
+    post_audio_padding: float,
+    concat_without_reencode: bool,
+    segment_cache: Optional[SegmentCache],
+    encoding: EncodingProfile
+) -> str:
+    """Рендерит первым подходящим способом; возвращает его название."""
+    # 1. Склейка без перекодирования, если возможно
+    if concat_without_reencode and fade_duration <= 0:
+        with instrumentation.span("render.concat_copy"):
+            done = _render_concat_copy(
+                intro, main, outro, tts_path, output_path,
+                tts_volume_boost_db, post_audio_padding, encoding
+            )
+        if done:
+            return "concat_copy"
+
+    # 2. Готовые intro/outro из кэша + кодирование только основного видео
+    if segment_cache is not None and (intro or outro):
+        with instrumentation.span("render.segment_cache"):
+            done = _render_with_segment_cache(
+                segment_cache, template_id, intro, main, outro, tts_path, output_path,
+                fade_duration, tts_volume_boost_db, post_audio_padding, encoding
+            )
+        if done:
+            return "segment_cache"
+
+    # 3. Единственный проход кодирования
+    with instrumentation.span("render.single_pass"):
+        _render_single_pass(
+            intro, main, outro, tts_path, output_path,
+            fade_duration, tts_volume_boost_db, post_audio_padding, encoding
+        )
+    return "single_pass"
+
+
+def render_greeting(
+    template_manager: TemplateManager,
+    template_id: str,
+    tts_audio_bytes: bytes,
+    fade_duration: float = 1.0,
+    tts_volume_boost_db: float = 0.0,
+    post_audio_padding: float = 1.0,
+    concat_without_reencode: bool = False,
+    segment_cache: Optional[SegmentCache] = None,
+    profile: ProfileArg = None,
+    preview: Union[bool, str] = False
+) -> bytes:
+    """
+    Этап 2: смешивание готового TTS с видео шаблона, склейка и кодирование.
+    Параметры — как у generate_greeting_from_template.
+    """
+    buffer = io.BytesIO()
+    render_greeting_to(
+        template_manager,
+        template_id,
+        tts_audio_bytes,
+        buffer,
+        fade_duration=fade_duration,
+        tts_volume_boost_db=tts_volume_boost_db,
+        post_audio_padding=post_audio_padding,
+        concat_without_reencode=concat_without_reencode,
+        segment_cache=segment_cache,
+        profile=profile,
+        preview=preview
+    )
+    return buffer.getvalue()
+
+
+def generate_greeting_from_template_to(
+    template_manager: TemplateManager,
+    template_id: str,
+    text: str,
+    output: MediaTarget,
+    fade_duration: float = 1.0,
+    tts_volume_boost_db: float = 0.0,
+    post_audio_padding: float = 1.0,
+    concat_without_reencode: bool = False,
+    segment_cache: Optional[SegmentCache] = None,
+    pool: Optional[TTSWorkerPool] = None,
+    profile: ProfileArg = None,
+    preview: Union[bool, str] = False,
+    tts_cache: Optional[GreetingAudioCache] = None,
+    result_cache: Optional[GreetingResultCache] = None,
+    duration_model: Optional[SpeechRateModel] = None
+) -> None:
+    """
+    То же, что generate_greeting_from_template, но итоговое видео пишется
+    прямо в output (путь или поток), а TTS — во временный файл
+    (или в tts_cache), без копий в памяти.
+    """
+    # Неверный режим — ошибка до синтеза, а не после
+    _preview_mode(preview)
+    if tts_cache is None:
+        # preview заполняет общий кэш процесса, полный рендер ищет в нём,
+        # если он уже есть — речь не синтезируется второй раз
+        tts_cache = default_cache(create=bool(preview))
+    if result_cache is not None:
+        _generate_cached_result(
+            template_manager, template_id, text, output, result_cache,
+            fade_duration=fade_duration,
+            tts_volume_boost_db=tts_volume_boost_db,
+            post_audio_padding=post_audio_padding,
+            concat_without_reencode=concat_without_reencode,
+            segment_cache=segment_cache,
+            pool=pool,
+            profile=profile,
+            preview=preview,
+            tts_cache=tts_cache,
+            duration_model=duration_model
+        )
+        return
+
+    if duration_model is None:
+        duration_model = default_model()
+    temp_path = None
+    span_audio_path = None
+    try:
+        with instrumentation.trace("greeting", template_id=template_id, chars=len(text)) as trace:
+            span_plan = _plan_main_span(
+                template_manager, template_id, text, post_audio_padding, duration_model
+            )
+            span = span_plan.span
+            if warn_if_exceeds(span, template_id):
+                instrumentation.count("greeting_text_exceeds_video")
+            if trace is not None:
+                trace.attrs["estimated_seconds"] = round(span.speech_seconds, 2)
+                trace.attrs["exceeds_video"] = span.exceeds_video
+
+            # Пока идёт синтез, из видео извлекается оригинальная дорожка —
+            # только на оценённую длительность (у подготовленных ассетов она уже есть)
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="greeting-span") as executor:
+                prepared = None
+                if span_plan.main.original_audio_path is None and span_plan.main_info["audio_codec"]:
+                    span_audio_path = make_temp_path(".wav")
+                    # В контексте вызывающего: span извлечения попадает в текущую трассу
+                    prepared = executor.submit(
+                        contextvars.copy_context().run,
+                        _extract_original_audio, span_plan.main.path, span.seconds, span_audio_path
+                    )
+
+                if tts_cache is not None:
+                    tts_path = temp_path = _cached_greeting_audio(
+                        template_manager, template_id, text, tts_cache, pool
+                    )
+                else:
+                    tts_path = temp_path = make_temp_path(".wav")
+                    synthesize_greeting_audio_to(template_manager, template_id, text, tts_path, pool)
+
+                # Уточняем оценку по факту: калибровка скорости голоса
+                tts_seconds = audio_duration(tts_path)
+                estimate = duration_model.observe(span_plan.plan, span_plan.voice, tts_seconds)
+                if tts_seconds > 0:
+                    instrumentation.gauge(
+                        "tts_duration_estimate_error", (estimate.seconds - tts_seconds) / tts_seconds
+                    )
+                if warn_if_speech_exceeds(span, tts_seconds, template_id):
+                    instrumentation.count("greeting_speech_exceeds_video")
+                if trace is not None:
+                    trace.attrs["speech_exceeds_video"] = tts_seconds > span.video_duration
+
+                # Основное видео уже разобрано в _plan_main_span — повторно не пробуем
+                main = span_plan.main
+                if main.info is None:
+                    main = _VideoAsset(main.path, dict(span_plan.main_info, original_audio_path=None))
+                if prepared is not None:
+                    needed = min(tts_seconds + post_audio_padding, span.video_duration)
+                    try:
+                        prepared.result()
+                    except RuntimeError:
+                        # Не получилось — дорожка декодируется из видео при рендере
+                        pass
+                    else:
+                        if span.seconds >= needed - 1e-3:
+                            main = _VideoAsset(
+                                main.path, dict(main.info, original_audio_path=span_audio_path)
+                            )
+                        else:
+                            instrumentation.count("greeting_span_underestimated")
+
+            _render_greeting(
+                template_manager,
+                template_id,
+                tts_path,
+                output,
+                fade_duration=fade_duration,
+                tts_volume_boost_db=tts_volume_boost_db,
+                post_audio_padding=post_audio_padding,
+                concat_without_reencode=concat_without_reencode,
+                segment_cache=segment_cache,
+                profile=profile,
+                preview=preview,
+                main=main
+            )
+    finally:
+        for path in (temp_path, span_audio_path):
+            try:
+                if path is not None and os.path.exists(path):
+                    os.remove(path)
+            except (OSError, PermissionError):
+                pass
+
+
+def greeting_result_key(
+    template_manager: TemplateManager,
+    template_id: str,
+    text: str,
+    fade_duration: float = 1.0,
+    tts_volume_boost_db: float = 0.0,
+    post_audio_padding: float = 1.0,
+    concat_without_reencode: bool = False,
+    profile: ProfileArg = None,
+    preview: Union[bool, str] = False
+) -> str:
+    """Ключ GreetingResultCache для запроса; параметры — как у generate_greeting_from_template."""
+    mode = _preview_mode(preview)
+    encoding = get_profile(PREVIEW_PROFILE if mode else profile)
+    resolved = template_manager.get_resolved_template(template_id)
+    render_params = {
+        "fade_duration": fade_duration,
+        "tts_volume_boost_db": tts_volume_boost_db,
+        "post_audio_padding": post_audio_padding,
+        "concat_without_reencode": concat_without_reencode,
+        "preview": mode
+    }
+    return GreetingResultCache.make_key(resolved, text, render_params, encoding.key, model=model_key())
+
+
+def _generate_cached_result(
+    template_manager: TemplateManager,
+    template_id: str,
+    text: str,
+    output: MediaTarget,
+    result_cache: GreetingResultCache,
+    **kwargs
+) -> None:
+    """Готовый ролик из кэша результатов; при промахе рендерится прямо в кэш и копируется в output."""
+    with instrumentation.trace("greeting.result_cache", template_id=template_id) as trace:
+        key = greeting_result_key(
+            template_manager, template_id, text,
+            **{name: kwargs[name] for name in (
+                "fade_duration", "tts_volume_boost_db", "post_audio_padding",
+                "concat_without_reencode", "profile", "preview"
+            )}
+        )
+        # Закреплённая копия: запись может вытеснить параллельный рендер
+        pinned = result_cache.checkout(key)
+        if trace is not None:
+            trace.attrs["hit"] = pinned is not None
+        if pinned is not None:
+            instrumentation.count("greeting_result_cache_hits")
+            try:
+                copy_to_target(pinned, output)
+            finally:
+                release_pin(pinned)
+            return
+
+    instrumentation.count("greeting_result_cache_misses")
+    with result_cache.writing(key) as tmp_path:
+        generate_greeting_from_template_to(template_manager, template_id, text, tmp_path, **kwargs)
+        # Копируем до публикации записи: её может сразу вытеснить другой поток
+        copy_to_target(tmp_path, output)
 
 
 def generate_greeting_from_template(
@@ -18,7 +819,15 @@ def generate_greeting_from_template(
     text: str,
     fade_duration: float = 1.0,
     tts_volume_boost_db: float = 0.0,
-    post_audio_padding: float = 1.0
+    post_audio_padding: float = 1.0,
+    concat_without_reencode: bool = False,
+    segment_cache: Optional[SegmentCache] = None,
+    pool: Optional[TTSWorkerPool] = None,
+    profile: ProfileArg = None,
+    preview: Union[bool, str] = False,
+    tts_cache: Optional[GreetingAudioCache] = None,
+    result_cache: Optional[GreetingResultCache] = None,
+    duration_model: Optional[SpeechRateModel] = None
 ) -> bytes:
     """
     Генерирует поздравление по шаблону.
@@ -26,106 +835,56 @@ def generate_greeting_from_template(
     Поведение:
       - Intro и Outro: используются как есть (без TTS)
       - Основное видео: накладывается TTS-аудио
-      - Всё склеивается в один ролик с fade-out в конце
+      - Всё склеивается в один ролик с fade-out в конце и кодируется один раз
+
+    Если ассеты прошли ingest (TemplateManager.add_video/add_reference),
+    используются подготовленные копии и сохранённые метаданные — исходные
+    файлы на запросе не анализируются и не перекодируются.
+
+    concat_without_reencode: если fade-out не нужен и кодеки сегментов совпадают,
+    склеивать concat-демуксером вообще без перекодирования видео.
+    segment_cache: кэш закодированных intro/outro — на запрос кодируется
+    только основное видео.
+    pool: пул процессов TTS для параллельного синтеза предложений.
+    profile: профиль кодирования — "fast-preview", "standard" (по умолчанию),
+    "archive" или EncodingProfile (см. app/encoding_profiles.py); при изменении
+    размера кадра/fps склейка без перекодирования не используется.
+    preview: черновой рендер — "video" (или True): всё видео профилем fast-preview;
+    "audio": смешанный звук основной части с кадром-постером.
+    tts_cache: кэш TTS-дорожек (app/greeting_audio_cache.py): полный рендер после
+    preview того же запроса берёт речь из него, а не синтезирует заново. Если не
+    передан, preview включает общий кэш процесса на диске (greeting_audio_cache.default_cache,
+    каталог db/greeting_audio_cache внутри пакета) и пишет в него, а полные рендеры
+    после этого тоже ищут и пишут в нём; каталог меняется или кэш выключается
+    через greeting_audio_cache.configure_default_cache. Между процессами
+    передавайте один и тот же кэш явно.
+    result_cache: кэш готовых роликов (app/result_cache.py) — повторный запрос
+    того же текста с теми же параметрами для неизменённого шаблона отдаётся
+    копией файла, без синтеза и кодирования.
+    duration_model: калибровка скорости речи по голосам (app/duration_planner.py;
+    по умолчанию — общая в памяти процесса). По ней до синтеза оценивается
+    длительность речи: если текст длиннее основного видео, пишется предупреждение
+    (конец речи будет обрезан), а оригинальная дорожка неподготовленного видео
+    извлекается параллельно с синтезом и только на нужную длительность.
+
+    Чтобы не держать видео в памяти, используйте generate_greeting_from_template_to.
     """
-    # 1. Получаем шаблон
-    template = template_manager.get_template(template_id)
-    
-    # 2. Загружаем reference-аудио
-    ref_path = template_manager.get_reference_path(template["reference_id"])
-    with open(ref_path, "rb") as f:
-        ref_bytes = f.read()
-    
-    # 3. Генерируем TTS
-    tts_audio_bytes = generate_speech(
-        text=text,
-        reference_audio_bytes=ref_bytes
-    )
-    
-    # 4. Обрабатываем основное видео (с TTS)
-    video_path = template_manager.get_video_path(template["video_id"])
-    with open(video_path, "rb") as f:
-        video_bytes = f.read()
-    
-    main_video_bytes = mix_video_with_audio(
-        video_bytes=video_bytes,
-        tts_audio_bytes=tts_audio_bytes,
-        fade_duration=0,  # fade-out применится ко всему видео в конце
+    buffer = io.BytesIO()
+    generate_greeting_from_template_to(
+        template_manager,
+        template_id,
+        text,
+        buffer,
+        fade_duration=fade_duration,
         tts_volume_boost_db=tts_volume_boost_db,
-        post_audio_padding=post_audio_padding
+        post_audio_padding=post_audio_padding,
+        concat_without_reencode=concat_without_reencode,
+        segment_cache=segment_cache,
+        pool=pool,
+        profile=profile,
+        preview=preview,
+        tts_cache=tts_cache,
+        result_cache=result_cache,
+        duration_model=duration_model
     )
-    
-    # 5. Собираем все части
-    temp_files = []
-    clips = []
-    
-    try:
-        # === Intro ===
-        if template["intro_id"]:
-            intro_path = template_manager.get_video_path(template["intro_id"])
-            with open(intro_path, "rb") as f:
-                intro_bytes = f.read()
-            intro_temp = tempfile.mktemp(suffix=".mp4")
-            with open(intro_temp, "wb") as f:
-                f.write(intro_bytes)
-            temp_files.append(intro_temp)
-            clips.append(VideoFileClip(intro_temp))
-        
-        # === Main ===
-        main_temp = tempfile.mktemp(suffix=".mp4")
-        with open(main_temp, "wb") as f:
-            f.write(main_video_bytes)
-        temp_files.append(main_temp)
-        clips.append(VideoFileClip(main_temp))
-        
-        # === Outro ===
-        if template["outro_id"]:
-            outro_path = template_manager.get_video_path(template["outro_id"])
-            with open(outro_path, "rb") as f:
-                outro_bytes = f.read()
-            outro_temp = tempfile.mktemp(suffix=".mp4")
-            with open(outro_temp, "wb") as f:
-                f.write(outro_bytes)
-            temp_files.append(outro_temp)
-            clips.append(VideoFileClip(outro_temp))
-        
-        # === Склейка ===
-        if not clips:
-            raise ValueError("Нет видео для склейки")
-        
-        final_clip = concatenate_videoclips(clips, method="compose")
-        
-        # Применяем fade-out ко всему видео
-        if fade_duration > 0 and fade_duration < final_clip.duration:
-            final_clip = final_clip.fadeout(fade_duration)
-        
-        # Экспорт в байты
-        output_temp = tempfile.mktemp(suffix=".mp4")
-        temp_files.append(output_temp)
-        final_clip.write_videofile(
-            output_temp,
-            codec="libx264",
-            audio_codec="aac",
-            temp_audiofile="temp-audio.m4a",
-            remove_temp=True,
-            logger=None
-        )
-        
-        with open(output_temp, "rb") as f:
-            result = f.read()
-        
-        return result
-        
-    finally:
-        # Закрываем клипы
-        for clip in clips:
-            clip.close()
-        final_clip.close()
-        
-        # Удаляем временные файлы
-        for path in temp_files:
-            try:
-                if os.path.exists(path):
-                    os.remove(path)
-            except (OSError, PermissionError):
-                pass
\ No newline at end of file
+    return buffer.getvalue()
@@ -0,0 +1,275 @@
+"""
+Асинхронный сервис заданий на генерацию поздравлений (asyncio).
+
+- submit() ставит задание в ограниченную очередь (при заполнении ждёт — backpressure)
+- get_job() — опрос состояния, wait() — ожидание результата
+- одновременных рендеров одного шаблона не больше per_template_limit;
+  лишние задания шаблона ждут в его очереди и не занимают воркеров,
+  так что задания других шаблонов идут без задержки
+- одинаковые задания в работе (тот же шаблон, текст и параметры)
+  объединяются в один рендер
+- блокирующие TTS/MoviePy выполняются в пуле потоков
+- завершённые задания (с видео в памяти) хранятся ограниченно:
+  не больше max_finished и не дольше result_ttl секунд
+"""
+
+import time
+import uuid
+import asyncio
+import functools
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+from app.models.template_manager import TemplateManager
+from app.services.greeting_generator import generate_greeting_from_template
+from app.encoding_profiles import EncodingProfile
+from app.sentence_cache import normalize_sentence
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+@dataclass
+class GreetingJob:
+    job_id: str
+    template_id: str
+    text: str
+    params: dict
+    status: str = STATUS_QUEUED
+    result: Optional[bytes] = None
+    error: Optional[str] = None
+    coalesced: int = 0             # сколько одинаковых запросов объединено с этим
+    _done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (STATUS_DONE, STATUS_FAILED)
+
+
+def _param_key(params: dict) -> tuple:
+    """Параметры, по которым различаются задания (объекты вроде пулов и кэшей не входят)."""
+    items = []
+    for name, value in params.items():
+        if isinstance(value, EncodingProfile):
+            items.append((name, value.key))
+        elif isinstance(value, (str, int, float, bool, type(None))):
+            items.append((name, value))
+    return tuple(sorted(items))
+
+
+class GreetingJobService:
+    def __init__(
+        self,
+        template_manager: TemplateManager,
+        max_queue_size: int = 100,
+        workers: int = 2,
+        per_template_limit: int = 1,
+        executor: Optional[Executor] = None,
+        max_finished: int = 100,
+        result_ttl: Optional[float] = 600.0,
+        **render_kwargs
+    ):
+        """
+        Параметры:
+            max_queue_size: размер очереди ожидающих заданий
+            workers: сколько заданий выполняется одновременно
+            per_template_limit: одновременных рендеров одного шаблона
+            executor: пул для блокирующей работы (по умолчанию — потоки по числу workers)
+            max_finished: сколько завершённых заданий держать в памяти
+                          (более старые забываются, как после forget)
+            result_ttl: через сколько секунд после завершения задание забывается
+                        (None — только по max_finished)
+            render_kwargs: параметры generate_greeting_from_template по умолчанию
+                           (segment_cache, result_cache, pool, fade_duration, profile и т.д.)
+        """
+        self.template_manager = template_manager
+        self.workers = workers
+        self.per_template_limit = per_template_limit
+        self.render_kwargs = render_kwargs
+        self._executor = executor
+        self._own_executor = executor is None
+        self.max_finished = max_finished
+        self.result_ttl = result_ttl
+        self._max_queue_size = max_queue_size
+        # Места в очереди ожидающих (backpressure для submit)
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Задания, которые можно запускать сразу (лимит шаблона уже учтён)
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._jobs: dict[str, GreetingJob] = {}
+        self._in_flight: dict[tuple, str] = {}
+        # По шаблону: сколько заданий в _ready или в работе, и кто ждёт сверх лимита
+        self._active: dict[str, int] = {}
+        self._waiting: dict[str, deque] = {}
+        # Завершённые задания: ID -> время завершения (от старых к новым)
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+
+    async def start(self, warmup: bool = False):
+        """warmup=True — до приёма заданий загрузить и прогреть модель TTS."""
+        if self._tasks:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="greeting-job"
+            )
+        if warmup:
+            from app.tts_generator import warmup as warmup_tts
+            await asyncio.get_running_loop().run_in_executor(self._executor, warmup_tts)
+        self._slots = asyncio.Semaphore(self._max_queue_size)
+        self._ready = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"greeting-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self, drain: bool = True):
+        """Останавливает сервис; drain=True — сначала выполнить задания из очереди."""
+        if not self._tasks:
+            return
+        if drain:
+            await self._ready.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._own_executor and self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def __aenter__(self) -> "GreetingJobService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop(drain=exc_type is None)
+
+    async def submit(self, template_id: str, text: str, wait: bool = True, **params) -> str:
+        """
+        Ставит задание в очередь и возвращает его ID.
+
+        Если такое же задание уже в работе, возвращается ID существующего.
+        wait=False — при заполненной очереди сразу бросить asyncio.QueueFull.
+        """
+        if not self._tasks:
+            raise RuntimeError("Сервис не запущен: вызовите start()")
+        self._prune_finished()
+        params = {**self.render_kwargs, **params}
+        # Та же нормализация, что в ключах кэшей предложений и готовых роликов
+        key = (template_id, normalize_sentence(text), _param_key(params))
+
+        existing_id = self._in_flight.get(key)
+        if existing_id is not None:
+            self._jobs[existing_id].coalesced += 1
+            return existing_id
+
+        job = GreetingJob(str(uuid.uuid4()), template_id, text, params)
+        # Регистрируем до ожидания места в очереди, чтобы дубликаты объединялись и тогда
+        self._jobs[job.job_id] = job
+        self._in_flight[key] = job.job_id
+        try:
+            if wait:
+                await self._slots.acquire()
+            elif self._slots.locked():
+                raise asyncio.QueueFull
+            else:
+                await self._slots.acquire()
+        except BaseException:
+            del self._jobs[job.job_id]
+            self._in_flight.pop(key, None)
+            raise
+        self._enqueue(job, key)
+        return job.job_id
+
+    def get_job(self, job_id: str) -> GreetingJob:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise ValueError(f"Задание с ID {job_id} не найдено")
+        return job
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None) -> bytes:
+        """Ждёт завершения задания и возвращает видео; при ошибке — RuntimeError."""
+        job = self.get_job(job_id)
+        await asyncio.wait_for(job._done.wait(), timeout)
+        if job.status == STATUS_FAILED:
+            raise RuntimeError(job.error)
+        return job.result
+
+    async def generate(self, template_id: str, text: str, **params) -> bytes:
+        """submit + wait."""
+        return await self.wait(await self.submit(template_id, text, **params))
+
+    def forget(self, job_id: str):
+        """Удаляет завершённое задание (и его результат) из памяти."""
+        job = self.get_job(job_id)
+        if not job.finished:
+            raise ValueError(f"Задание {job_id} ещё выполняется")
+        del self._jobs[job_id]
+        self._finished.pop(job_id, None)
+
+    def _prune_finished(self):
+        """Забывает завершённые задания сверх max_finished и старше result_ttl."""
+        now = time.monotonic()
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            expired = self.result_ttl is not None and now - finished_at > self.result_ttl
+            if not expired and len(self._finished) <= self.max_finished:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+
+    def _enqueue(self, job: GreetingJob, key: tuple):
+        """В очередь на выполнение, если лимит шаблона позволяет, иначе — в ожидание шаблона."""
+        template_id = job.template_id
+        if self._active.get(template_id, 0) < self.per_template_limit:
+            self._active[template_id] = self._active.get(template_id, 0) + 1
+            self._ready.put_nowait((job, key))
+        else:
+            self._waiting.setdefault(template_id, deque()).append((job, key))
+
+    def _release_template(self, template_id: str):
+        """Задание шаблона завершилось: место занимает следующее ожидающее."""
+        waiting = self._waiting.get(template_id)
+        if waiting:
+            # Место шаблона переходит следующему заданию, счётчик не меняется
+            self._ready.put_nowait(waiting.popleft())
+            if not waiting:
+                del self._waiting[template_id]
+            return
+        self._active[template_id] -= 1
+        if not self._active[template_id]:
+            del self._active[template_id]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, key = await self._ready.get()
+            # Задание покинуло очередь ожидающих — освобождаем место для submit
+            self._slots.release()
+            try:
+                job.status = STATUS_RUNNING
+                job.result = await loop.run_in_executor(
+                    self._executor,
+                    functools.partial(
+                        generate_greeting_from_template,
+                        self.template_manager, job.template_id, job.text, **job.params
+                    )
+                )
+                job.status = STATUS_DONE
+            except asyncio.CancelledError:
+                job.status = STATUS_FAILED
+                job.error = "задание отменено"
+                raise
+            except Exception as e:
+                job.status = STATUS_FAILED
+                job.error = str(e)
+            finally:
+                self._in_flight.pop(key, None)
+                job._done.set()
+                self._finished[job.job_id] = time.monotonic()
+                # Следующее задание шаблона ставится до task_done: join() не завершится раньше времени
+                self._release_template(job.template_id)
+                self._ready.task_done()
+                self._prune_finished()
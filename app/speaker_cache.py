@@ -0,0 +1,120 @@
+"""
+Кэш speaker-conditioning латентов XTTS (GPT cond latent + speaker embedding).
+
+Латенты вычисляются по reference-аудио один раз и переиспользуются
+для всех предложений и запросов с тем же голосом.
+Поддерживает:
+- LRU-вытеснение в памяти
+- Опциональное сохранение на диск (по файлу на ключ)
+"""
+
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Tuple
+
+if TYPE_CHECKING:
+    import torch
+
+# Каталог по умолчанию — рядом с app/db/templates.db
+DEFAULT_LATENTS_DIR = "app/db/speaker_latents"
+
+Latents = Tuple["torch.Tensor", "torch.Tensor"]
+
+
+class SpeakerLatentsCache:
+    def __init__(self, max_entries: int = 32, persist_dir: Optional[str] = None):
+        if max_entries < 1:
+            raise ValueError("max_entries должен быть >= 1")
+        self.max_entries = max_entries
+        self.persist_dir = persist_dir
+        self._entries: "OrderedDict[str, Latents]" = OrderedDict()
+        self._lock = threading.Lock()
+        if persist_dir:
+            os.makedirs(persist_dir, exist_ok=True)
+
+    @staticmethod
+    def content_hash(reference_audio_bytes: bytes) -> str:
+        return hashlib.sha256(reference_audio_bytes).hexdigest()
+
+    @staticmethod
+    def make_key(
+        content_hash: str,
+        model_name: str,
+        reference_id: Optional[str] = None
+    ) -> str:
+        """
+        Ключ = модель + ID reference + хэш содержимого.
+        Хэш учитывается всегда: при замене файла под тем же ID кэш не устареет.
+        """
+        return f"{model_name}|{reference_id or ''}|{content_hash}"
+
+    def _disk_path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.persist_dir, f"{name}.pt")
+
+    def get(self, key: str, device: Optional[str] = None) -> Optional[Latents]:
+        with self._lock:
+            latents = self._entries.get(key)
+            if latents is not None:
+                self._entries.move_to_end(key)
+                return latents
+
+        if not self.persist_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        import torch
+        try:
+            data = torch.load(path, map_location=device or "cpu", weights_only=True)
+            latents = (data["gpt_cond_latent"], data["speaker_embedding"])
+        except Exception:
+            # Битый файл — считаем промахом, он будет перезаписан
+            return None
+
+        self._remember(key, latents)
+        return latents
+
+    def put(self, key: str, latents: Latents):
+        self._remember(key, latents)
+        if self.persist_dir:
+            import torch
+            gpt_cond_latent, speaker_embedding = latents
+            path = self._disk_path(key)
+            # Своё имя на каждую запись: ключ могут сохранять несколько потоков сразу
+            fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".pt", dir=self.persist_dir)
+            os.close(fd)
+            try:
+                torch.save(
+                    {
+                        "gpt_cond_latent": gpt_cond_latent.detach().cpu(),
+                        "speaker_embedding": speaker_embedding.detach().cpu()
+                    },
+                    tmp_path
+                )
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    try:
+                        os.remove(tmp_path)
+                    except (OSError, PermissionError):
+                        pass
+
+    def _remember(self, key: str, latents: Latents):
+        with self._lock:
+            self._entries[key] = latents
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Очищает кэш в памяти (файлы на диске не трогает)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -1,10 +1,18 @@
 """
 Библиотека для генерации синтезированной речи на русском языке.
 Поддерживает:
-- Разбиение длинных текстов на предложения (nltk==3.7)
-- Генерацию по предложениям с последующей склейкой
+- Разбиение длинных текстов на предложения (nltk==3.7) и упаковку их
+  во фрагменты сбалансированной длины (см. app/chunk_planner.py, plan_speech)
+- Генерацию по фрагментам с последующей склейкой
 - Улучшение качества звука
+- Потоковую выдачу PCM по мере синтеза предложений (stream_speech)
 - Работу с байтами (без прямой зависимости от файловой системы)
+  и запись WAV сразу в файл или поток (generate_speech_to)
+- Кэш speaker-латентов reference-голосов (см. app/speaker_cache.py)
+- Кэш аудио повторяющихся предложений (см. app/sentence_cache.py)
+- Ленивый импорт torch/TTS/nltk и явный прогрев модели (warmup)
+- Режимы инференса на CPU: int8-квантование, inference_mode, потоки,
+  torch.compile (configure_inference, см. app/cpu_inference.py)
 
 Требуемые зависимости:
     TTS>=0.22.0
@@ -13,50 +21,198 @@
     transformers==4.33.0
     pydub==0.25.1
     nltk==3.7
+    numpy
+    scipy
 """
 
 import os
+import time
 import uuid
-import torch
 import io
+import wave
 import tempfile
-import nltk
-from typing import Optional
-from TTS.api import TTS
-from pydub import AudioSegment
-from pydub.effects import low_pass_filter, normalize
-
-# === Инициализация NLTK ===
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt', quiet=True)
+import threading
+import numpy as np
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator, Optional, Sequence, Union
+from app.speaker_cache import SpeakerLatentsCache, Latents
+from app.sentence_cache import SentenceAudioCache
+from app.audio_enhancer import AudioEnhancer, enhance_audio_array
+from app.media_io import MediaSource, MediaTarget, read_source_bytes
+from app.chunk_planner import ChunkPlan, plan_chunks
+from app.cpu_inference import (
+    InferenceMode, ModeArg, apply_inference_mode, configure_threads, for_device,
+    get_mode, inference_context
+)
+from app import instrumentation
+
+# torch, TTS, nltk и pydub импортируются при первом использовании:
+# модуль (и всё, что его импортирует) загружается быстро, а модель
+# и токенизатор можно подготовить заранее через warmup()
+if TYPE_CHECKING:
+    from TTS.api import TTS
+    from app.tts_pool import TTSWorkerPool
 
 # === Глобальные настройки ===
 _TTS_MODEL = None
-_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# Загрузка модели и вызовы одной модели из разных потоков идут по очереди;
+# для параллельного синтеза — app.tts_pool (модель в каждом процессе)
+_MODEL_LOCK = threading.RLock()
+_DEVICE: Optional[str] = None
+_PUNKT_READY = False
+_MODEL_NAME = "tts_models/daswer123/xtts_ru_dvae_100h"
+_SPEAKER_CACHE = SpeakerLatentsCache()
+_SENTENCE_CACHE: Optional[SentenceAudioCache] = None
+_INFERENCE_MODE: InferenceMode = get_mode()
 
+# Synthesizer.tts добавлял 10000 нулевых сэмплов после каждого предложения
+_SENTENCE_TAIL_SAMPLES = 10000
 
-def _load_tts_model() -> TTS:
-    """Загружает и кэширует модель XTTS v2."""
-    global _TTS_MODEL
-    if _TTS_MODEL is None:
+
+def _get_device() -> str:
+    global _DEVICE
+    if _DEVICE is None:
         try:
-            from TTS.tts.configs.xtts_config import XttsConfig
-            torch.serialization.add_safe_globals([XttsConfig])
+            import torch
         except ImportError:
-            pass
+            # Без torch настоящую модель не загрузить; заглушке (тесты, бенчмарки) хватает CPU
+            _DEVICE = "cpu"
+        else:
+            _DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+    return _DEVICE
 
-        _TTS_MODEL = TTS(
-            model_name="tts_models/daswer123/xtts_ru_dvae_100h",
-            progress_bar=False,
-            gpu=(_DEVICE == "cuda")
-        )
-    return _TTS_MODEL
+
+def _current_inference_mode() -> InferenceMode:
+    """Режим инференса с учётом устройства (на GPU без квантования и компиляции)."""
+    return for_device(_INFERENCE_MODE, _get_device())
+
+
+def model_key() -> str:
+    """Модель и её численный вариант (int8/compiled) — для ключей кэшей латентов и аудио."""
+    variant = _current_inference_mode().variant
+    return f"{_MODEL_NAME}#{variant}" if variant else _MODEL_NAME
+
+
+def configure_inference(mode: ModeArg = None, **overrides) -> InferenceMode:
+    """
+    Выбирает режим инференса: имя из app.cpu_inference.MODES ("fp32", "cpu",
+    "cpu-int8", "cpu-int8-compile") или InferenceMode; overrides — поля для замены,
+    например configure_inference("cpu-int8", num_threads=4).
+
+    Если модель уже загружена в другом численном варианте, она будет
+    перезагружена при следующем синтезе.
+    """
+    global _INFERENCE_MODE, _TTS_MODEL
+    new_mode = get_mode(mode, **overrides)
+    with _MODEL_LOCK:
+        if _TTS_MODEL is not None:
+            if for_device(new_mode, _get_device()).variant != _current_inference_mode().variant:
+                _TTS_MODEL = None
+            else:
+                configure_threads(new_mode)
+        _INFERENCE_MODE = new_mode
+    return new_mode
+
+
+def _load_tts_model() -> "TTS":
+    """Загружает и кэширует модель XTTS v2 (в выбранном режиме инференса)."""
+    global _TTS_MODEL
+    with _MODEL_LOCK:
+        if _TTS_MODEL is None:
+            import torch
+            from TTS.api import TTS
+            try:
+                from TTS.tts.configs.xtts_config import XttsConfig
+                torch.serialization.add_safe_globals([XttsConfig])
+            except ImportError:
+                pass
+
+            tts_model = TTS(
+                model_name=_MODEL_NAME,
+                progress_bar=False,
+                gpu=(_get_device() == "cuda")
+            )
+            mode = _current_inference_mode()
+            with instrumentation.span("tts.apply_inference_mode", mode=mode.name):
+                apply_inference_mode(tts_model.synthesizer.tts_model, mode)
+            _TTS_MODEL = tts_model
+        return _TTS_MODEL
+
+
+@dataclass
+class SpeechChunk:
+    """Фрагмент PCM, синтезированный по одному предложению."""
+    samples: np.ndarray        # моно, float32 в [-1, 1] или int16
+    sample_rate: int
+    sample_format: str         # "float32" | "int16"
+    index: int                 # номер предложения
+    text: str                  # текст предложения
+    is_last: bool
+    channels: int = 1
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def to_bytes(self) -> bytes:
+        """Сырые PCM-байты (little-endian) без заголовка WAV."""
+        return self.samples.tobytes()
+
+
+def configure_speaker_cache(
+    max_entries: int = 32,
+    persist_dir: Optional[str] = None
+) -> SpeakerLatentsCache:
+    """
+    Пересоздаёт кэш speaker-латентов.
+
+    Параметры:
+        max_entries: сколько голосов держать в памяти (LRU)
+        persist_dir: каталог для сохранения на диск
+                     (например, app.speaker_cache.DEFAULT_LATENTS_DIR), None — только память
+    """
+    global _SPEAKER_CACHE
+    _SPEAKER_CACHE = SpeakerLatentsCache(max_entries=max_entries, persist_dir=persist_dir)
+    return _SPEAKER_CACHE
+
+
+def configure_sentence_cache(
+    cache_dir: Optional[str] = None,
+    max_bytes: int = 512 * 1024 ** 2
+) -> Optional[SentenceAudioCache]:
+    """
+    Включает кэш аудио предложений (cache_dir, например
+    app.sentence_cache.DEFAULT_SENTENCE_CACHE_DIR) или выключает его (cache_dir=None).
+    Пока кэш включён, предложения по умолчанию не объединяются во фрагменты
+    (см. plan_speech): ключ кэша — отдельное предложение.
+    """
+    global _SENTENCE_CACHE
+    _SENTENCE_CACHE = SentenceAudioCache(cache_dir, max_bytes) if cache_dir else None
+    return _SENTENCE_CACHE
+
+
+def _ensure_punkt():
+    """
+    Проверяет токенизатор punkt и скачивает его, если нужно. Готовность
+    запоминается только после успешной проверки: если скачать не удалось
+    (LookupError), следующий вызов попробует снова.
+    """
+    global _PUNKT_READY
+    if _PUNKT_READY:
+        return
+    import nltk
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        nltk.download('punkt', quiet=True)
+        nltk.data.find('tokenizers/punkt')
+    _PUNKT_READY = True
 
 
 def _split_into_sentences(text: str) -> list[str]:
     """Разбивает текст на предложения (русский язык)."""
+    import nltk
+    _ensure_punkt()
     return nltk.sent_tokenize(text, language='russian')
 
 
@@ -65,6 +221,7 @@ def _convert_audio_bytes_to_xtts_format(
     input_format: Optional[str] = None
 ) -> bytes:
     """Конвертирует аудио в формат XTTS (22050 Гц, моно, 16 бит, WAV)."""
+    from pydub import AudioSegment
     audio = AudioSegment.from_file(io.BytesIO(audio_bytes), format=input_format)
     audio = audio.set_frame_rate(22050).set_channels(1).set_sample_width(2)
     buffer = io.BytesIO()
@@ -72,53 +229,344 @@ def _convert_audio_bytes_to_xtts_format(
     return buffer.getvalue()
 
 
-def _enhance_audio_bytes(audio_bytes: bytes) -> bytes:
+def _compute_conditioning_latents(
+    tts_model: "TTS",
+    reference_audio_bytes: bytes,
+    input_format: Optional[str] = None
+) -> Latents:
+    """Считает (gpt_cond_latent, speaker_embedding) моделью, без кэша."""
+    xtts = tts_model.synthesizer.tts_model
+    config = xtts.config
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as ref_tmp:
+        ref_path = ref_tmp.name
+    try:
+        with open(ref_path, "wb") as f:
+            f.write(_convert_audio_bytes_to_xtts_format(reference_audio_bytes, input_format))
+        # Те же параметры, что использует Xtts.full_inference при tts_to_file
+        with instrumentation.span("tts.speaker_latents"), _MODEL_LOCK, \
+             inference_context(_INFERENCE_MODE):
+            return xtts.get_conditioning_latents(
+                audio_path=[ref_path],
+                gpt_cond_len=config.gpt_cond_len,
+                gpt_cond_chunk_len=config.gpt_cond_chunk_len,
+                max_ref_length=config.max_ref_len,
+                sound_norm_refs=config.sound_norm_refs
+            )
+    finally:
+        try:
+            if os.path.exists(ref_path):
+                os.remove(ref_path)
+        except (OSError, PermissionError):
+            pass
+
+
+def _get_conditioning_latents(
+    tts_model: "TTS",
+    reference_audio_bytes: bytes,
+    input_format: Optional[str] = None,
+    reference_id: Optional[str] = None,
+    content_hash: Optional[str] = None
+) -> Latents:
+    """Возвращает (gpt_cond_latent, speaker_embedding) для reference, вычисляя их только при промахе кэша."""
+    if content_hash is None:
+        content_hash = SpeakerLatentsCache.content_hash(reference_audio_bytes)
+    key = SpeakerLatentsCache.make_key(content_hash, model_key(), reference_id)
+    latents = _SPEAKER_CACHE.get(key, device=_get_device())
+    if latents is not None:
+        instrumentation.count("tts_speaker_cache_hits")
+        return latents
+
+    latents = _compute_conditioning_latents(tts_model, reference_audio_bytes, input_format)
+    _SPEAKER_CACHE.put(key, latents)
+    return latents
+
+
+def _synthesize_sentence(
+    tts_model: "TTS",
+    sentence: str,
+    language: str,
+    latents: Latents
+) -> np.ndarray:
     """
-    Улучшает качество синтезированной речи:
-    - Сильно подавляет высокие частоты (>6.5 кГц), где "резкость"
-    - Применяет компрессию для сглаживания динамики
-    - Нормализует громкость
+    Синтезирует одно предложение по готовым латентам.
+    Результат совпадает с tts_to_file: хвост тишины и пиковая нормализация
+    в 16-битную шкалу. Возвращает float32-массив в диапазоне [-1, 1].
     """
-    try:
-        audio = AudioSegment.from_wav(io.BytesIO(audio_bytes))
-        
-        # 1. Агрессивный low-pass для устранения "цифровой резкости"
-        audio = low_pass_filter(audio, cutoff=6500)  # снизили с 7500 → 6500
-        
-        # 2. Лёгкая компрессия (сглаживает пики → звук "мягче")
-        audio = audio.compress_dynamic_range(
-            threshold=-20.0,   # дБ — начинаем сжимать тише этого уровня
-            ratio=2.5,         # степень сжатия
-            attack=5.0,        # мс — как быстро реагировать на пики
-            release=50.0       # мс — как быстро отпускать
+    xtts = tts_model.synthesizer.tts_model
+    config = xtts.config
+    gpt_cond_latent, speaker_embedding = latents
+    with inference_context(_INFERENCE_MODE):
+        out = xtts.inference(
+            text=sentence,
+            language=language,
+            gpt_cond_latent=gpt_cond_latent,
+            speaker_embedding=speaker_embedding,
+            temperature=config.temperature,
+            length_penalty=config.length_penalty,
+            repetition_penalty=config.repetition_penalty,
+            top_k=config.top_k,
+            top_p=config.top_p
         )
-        
-        # 3. Нормализация с запасом
-        audio = normalize(audio, headroom=0.5)  # 0.5 dB headroom → чуть громче и безопасно
-        
-        # Экспорт
-        buffer = io.BytesIO()
-        audio.export(buffer, format="wav")
-        return buffer.getvalue()
-        
-    except Exception as e:
-        # При ошибке — возвращаем оригинал
-        return audio_bytes
-
-
-def _concatenate_audio_segments(segments: list[bytes], pause_ms: int) -> bytes:
-    """Склеивает аудиосегменты с паузами между ними."""
+    wav = np.asarray(out["wav"], dtype=np.float32).squeeze()
+    wav = np.concatenate([wav, np.zeros(_SENTENCE_TAIL_SAMPLES, dtype=np.float32)])
+    pcm = np.trunc(wav * (32767 / max(0.01, float(np.max(np.abs(wav))))))
+    return (pcm / 32768.0).astype(np.float32)
+
+
+def _get_output_sample_rate(tts_model: "TTS") -> int:
+    return tts_model.synthesizer.tts_model.config.audio.output_sample_rate
+
+
+class _SpeakerSession:
+    """
+    Синтез предложений одним голосом в рамках запроса.
+
+    Модель и латенты загружаются лениво: если все предложения нашлись
+    в кэше предложений, модель не вызывается вовсе.
+    """
+
+    def __init__(
+        self,
+        reference_audio_bytes: bytes,
+        language: str,
+        input_format: Optional[str] = None,
+        reference_id: Optional[str] = None,
+        seed: Optional[int] = None
+    ):
+        self.reference_audio_bytes = reference_audio_bytes
+        self.reference_hash = SpeakerLatentsCache.content_hash(reference_audio_bytes)
+        self.language = language
+        self.input_format = input_format
+        self.reference_id = reference_id
+        self.seed = seed
+        self._latents = None
+
+    @property
+    def latents(self) -> Latents:
+        if self._latents is None:
+            self._latents = _get_conditioning_latents(
+                _load_tts_model(), self.reference_audio_bytes,
+                self.input_format, self.reference_id, self.reference_hash
+            )
+        return self._latents
+
+    def _cache_key(self, sentence: str) -> Optional[str]:
+        if _SENTENCE_CACHE is None:
+            return None
+        return _SENTENCE_CACHE.make_key(
+            sentence, self.reference_hash, model_key(), self.language, self.seed
+        )
+
+    def synthesize(self, sentence: str) -> tuple[np.ndarray, int]:
+        """Возвращает (float32-сэмплы, частота) — из кэша или от модели."""
+        cache = _SENTENCE_CACHE
+        key = self._cache_key(sentence)
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                instrumentation.count("tts_sentence_cache_hits")
+                return cached
+
+        tts_model = _load_tts_model()
+        latents = self.latents
+        with instrumentation.span("tts.sentence", chars=len(sentence)), _MODEL_LOCK:
+            if self.seed is not None:
+                import torch
+                # Сид на каждое предложение: результат не зависит от его позиции в тексте
+                torch.manual_seed(self.seed)
+            samples = _synthesize_sentence(tts_model, sentence, self.language, latents)
+        sample_rate = _get_output_sample_rate(tts_model)
+
+        if key is not None:
+            cache.put(key, samples, sample_rate)
+        return samples, sample_rate
+
+    def iter_synthesized(
+        self,
+        sentences: list[str],
+        pool: Optional["TTSWorkerPool"] = None
+    ) -> Iterator[tuple[np.ndarray, int]]:
+        """
+        Выдаёт (сэмплы, частота) для предложений по порядку.
+        С пулом все промахи кэша сразу отправляются в процессы-воркеры,
+        а результаты забираются в исходном порядке по мере готовности.
+        """
+        if pool is None:
+            for sentence in sentences:
+                yield self.synthesize(sentence)
+            return
+
+        cache = _SENTENCE_CACHE
+        pending = []
+        for sentence in sentences:
+            key = self._cache_key(sentence)
+            cached = cache.get(key) if key is not None else None
+            if cached is not None:
+                pending.append((None, cached, None))
+            else:
+                future = pool.submit(
+                    sentence, self.reference_audio_bytes, self.language,
+                    self.input_format, self.reference_id, self.seed
+                )
+                pending.append((future, None, key))
+
+        try:
+            for future, cached, key in pending:
+                if future is None:
+                    yield cached
+                    continue
+                with instrumentation.span("tts.sentence_wait"):
+                    samples, sample_rate = future.result()
+                if key is not None:
+                    cache.put(key, samples, sample_rate)
+                yield samples, sample_rate
+        finally:
+            # Генератор закрыт раньше времени — не занимаем воркеры зря
+            for future, _, _ in pending:
+                if future is not None:
+                    future.cancel()
+
+
+def _float_to_int16(samples: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(samples * 32768.0), -32768, 32767).astype(np.int16)
+
+
+def _write_wav(target, samples: np.ndarray, sample_rate: int):
+    """Пишет моно float32/int16-массив как WAV (16 бит) в путь или поток."""
+    if samples.dtype != np.int16:
+        samples = _float_to_int16(samples)
+    with wave.open(target, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(samples.tobytes())
+
+
+def _array_to_wav_bytes(samples: np.ndarray, sample_rate: int) -> bytes:
+    """Сериализует моно float32/int16-массив в WAV (16 бит)."""
+    buffer = io.BytesIO()
+    _write_wav(buffer, samples, sample_rate)
+    return buffer.getvalue()
+
+
+def _concatenate_audio_arrays(
+    segments: list[np.ndarray],
+    sample_rate: int,
+    pause_ms: Union[int, Sequence[int]]
+) -> np.ndarray:
+    """
+    Склеивает аудиосегменты с паузами между ними.
+    pause_ms — одна пауза для всех стыков или список пауз после каждого сегмента.
+    """
     if len(segments) == 1:
         return segments[0]
-    combined = AudioSegment.empty()
+    if isinstance(pause_ms, int):
+        pause_ms = [pause_ms] * len(segments)
+    parts = []
     for i, seg in enumerate(segments):
-        audio = AudioSegment.from_wav(io.BytesIO(seg))
-        combined += audio
-        if i < len(segments) - 1:
-            combined += AudioSegment.silent(duration=pause_ms)
-    buffer = io.BytesIO()
-    combined.export(buffer, format="wav")
-    return buffer.getvalue()
+        parts.append(seg)
+        if i < len(segments) - 1 and pause_ms[i] > 0:
+            parts.append(np.zeros(int(sample_rate * pause_ms[i] / 1000), dtype=np.float32))
+    return np.concatenate(parts)
+
+
+def plan_speech(
+    text: str,
+    max_sentence_length: int = 180,
+    language: str = "ru",
+    target_length: Optional[int] = None,
+    pack_sentences: Optional[bool] = None,
+    separate_first: bool = False
+) -> ChunkPlan:
+    """
+    План фрагментов, которыми generate_speech/stream_speech вызывают модель:
+    текст фрагментов, исходные предложения и паузы после них.
+
+    Параметры:
+        max_sentence_length: максимальная длина фрагмента (не больше лимита XTTS для языка)
+        target_length: желаемая длина фрагмента (по умолчанию 80% от максимальной)
+        pack_sentences: объединять короткие соседние предложения в один вызов модели;
+            None — только если кэш предложений выключен: с кэшем каждое предложение
+            синтезируется и кэшируется отдельно, чтобы повторялось и в других текстах
+        separate_first: первое предложение — отдельным фрагментом (для stream_speech)
+    """
+    if pack_sentences is None:
+        pack_sentences = _SENTENCE_CACHE is None
+    # _split_into_sentences берётся из модуля при вызове — его подменяет заглушка бенчмарков
+    return plan_chunks(
+        text,
+        _split_into_sentences,
+        max_length=max_sentence_length,
+        target_length=target_length,
+        language=language,
+        pack=pack_sentences,
+        separate_first=separate_first
+    )
+
+
+def generate_speech_array(
+    text: str,
+    reference_audio_bytes: bytes,
+    language: str = "ru",
+    enhance: bool = True,
+    input_format: Optional[str] = None,
+    max_sentence_length: int = 180,
+    pack_sentences: Optional[bool] = None,
+    reference_id: Optional[str] = None,
+    dtype: str = "float32",
+    seed: Optional[int] = None,
+    pool: Optional["TTSWorkerPool"] = None
+) -> tuple[np.ndarray, int]:
+    """
+    То же, что generate_speech, но без сериализации в WAV.
+
+    Параметры:
+        dtype: "float32" (диапазон [-1, 1]) или "int16"
+        (остальные — как у generate_speech)
+
+    Возвращает:
+        (моно-массив сэмплов, частота дискретизации)
+    """
+    if dtype not in ("float32", "int16"):
+        raise ValueError(f"Неподдерживаемый dtype: {dtype}")
+
+    with instrumentation.trace("tts.generate", chars=len(text)):
+        with instrumentation.span("tts.prepare_sentences"):
+            plan = plan_speech(text, max_sentence_length, language, pack_sentences=pack_sentences)
+            sentences = plan.texts
+
+        # Генерация: латенты голоса считаются один раз (и берутся из кэша),
+        # модель вызывается только для предложений, которых нет в кэше предложений
+        session = _SpeakerSession(
+            reference_audio_bytes, language, input_format, reference_id, seed
+        )
+        started = time.perf_counter()
+        with instrumentation.span(
+            "tts.synthesis", sentences=len(sentences), source_sentences=plan.sentence_count
+        ):
+            sentence_audios = []
+            for samples, sample_rate in session.iter_synthesized(sentences, pool):
+                sentence_audios.append(samples)
+        synthesis_seconds = time.perf_counter() - started
+
+        with instrumentation.span("tts.concatenate"):
+            samples = _concatenate_audio_arrays(sentence_audios, sample_rate, plan.pauses_ms)
+
+        audio_seconds = len(samples) / sample_rate
+        instrumentation.count("tts_sentences", len(sentences))
+        instrumentation.count("tts_characters", sum(len(sentence) for sentence in sentences))
+        instrumentation.count("tts_audio_seconds", audio_seconds)
+        instrumentation.count("tts_synthesis_seconds", synthesis_seconds)
+        if audio_seconds > 0:
+            instrumentation.gauge("tts_realtime_factor", synthesis_seconds / audio_seconds)
+
+        # Улучшение — один проход по всей склеенной дорожке (app/audio_enhancer.py)
+        if enhance:
+            with instrumentation.span("tts.enhance"):
+                samples = enhance_audio_array(samples, sample_rate)
+        if dtype == "int16":
+            samples = _float_to_int16(samples)
+        return samples, sample_rate
 
 
 def generate_speech(
@@ -127,7 +575,11 @@ def generate_speech(
     language: str = "ru",
     enhance: bool = True,
     input_format: Optional[str] = None,
-    max_sentence_length: int = 180
+    max_sentence_length: int = 180,
+    pack_sentences: Optional[bool] = None,
+    reference_id: Optional[str] = None,
+    seed: Optional[int] = None,
+    pool: Optional["TTSWorkerPool"] = None
 ) -> bytes:
     """
     Генерирует синтезированную речь из текста и reference-аудио.
@@ -138,80 +590,179 @@ def generate_speech(
         language: язык (по умолчанию "ru")
         enhance: применять улучшение звука (по умолчанию True)
         input_format: формат reference-аудио (если известен)
-        max_sentence_length: максимальная длина "предложения"
+        max_sentence_length: максимальная длина фрагмента на один вызов модели
+        pack_sentences: объединять короткие соседние предложения во фрагменты
+              около 80% от max_sentence_length (меньше вызовов модели, см. plan_speech);
+              по умолчанию — только без кэша предложений (configure_sentence_cache)
+        reference_id: ID reference-аудио (для кэша speaker-латентов)
+        seed: фиксированный сид генерации (одинаковый результат для одинаковых
+              предложений — свежий синтез совпадает с кэшем предложений)
+        pool: пул процессов app.tts_pool.TTSWorkerPool — предложения
+              синтезируются параллельно (None — последовательно в этом процессе)
     
     Возвращает:
         байты аудио в формате WAV
     """
-    if not text.strip():
-        raise ValueError("Текст не может быть пустым")
+    buffer = io.BytesIO()
+    generate_speech_to(
+        text, reference_audio_bytes, buffer,
+        language=language,
+        enhance=enhance,
+        input_format=input_format,
+        max_sentence_length=max_sentence_length,
+        pack_sentences=pack_sentences,
+        reference_id=reference_id,
+        seed=seed,
+        pool=pool
+    )
+    return buffer.getvalue()
 
-    # Разбиваем на предложения
-    sentences = _split_into_sentences(text.strip())
-    
-    # Защита от очень длинных "предложений"
-    safe_sentences = []
-    for sent in sentences:
-        if len(sent) > max_sentence_length:
-            words = sent.split()
-            chunks = []
-            current = []
-            for word in words:
-                if len(" ".join(current + [word])) <= max_sentence_length:
-                    current.append(word)
-                else:
-                    if current:
-                        chunks.append(" ".join(current))
-                    current = [word]
-            if current:
-                chunks.append(" ".join(current))
-            safe_sentences.extend(chunks)
-        else:
-            safe_sentences.append(sent)
-    
-    sentences = [s.strip() for s in safe_sentences if s.strip()]
-    if not sentences:
-        raise ValueError("Не удалось извлечь осмысленные предложения")
 
-    # Генерация
-    sentence_audios = []
-    tts_model = _load_tts_model()
+def generate_speech_to(
+    text: str,
+    reference_audio: MediaSource,
+    output: MediaTarget,
+    language: str = "ru",
+    enhance: bool = True,
+    input_format: Optional[str] = None,
+    max_sentence_length: int = 180,
+    pack_sentences: Optional[bool] = None,
+    reference_id: Optional[str] = None,
+    seed: Optional[int] = None,
+    pool: Optional["TTSWorkerPool"] = None
+) -> None:
+    """
+    То же, что generate_speech, но WAV пишется сразу в путь или поток.
 
-    for sentence in sentences:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as ref_tmp, \
-             tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as out_tmp:
+    Параметры:
+        reference_audio: путь к reference-аудио, его байты или файловый объект
+        output: путь или поток для записи WAV
+        (остальные — как у generate_speech)
+    """
+    with instrumentation.trace("tts", chars=len(text)):
+        samples, sample_rate = generate_speech_array(
+            text=text,
+            reference_audio_bytes=read_source_bytes(reference_audio),
+            language=language,
+            enhance=enhance,
+            input_format=input_format,
+            max_sentence_length=max_sentence_length,
+            pack_sentences=pack_sentences,
+            reference_id=reference_id,
+            dtype="int16",
+            seed=seed,
+            pool=pool
+        )
+        # Единственная сериализация в WAV за весь синтез; длина известна заранее,
+        # поэтому заголовок не переписывается и поток может быть без seek
+        if isinstance(output, os.PathLike):
+            output = os.fspath(output)
+        with instrumentation.span("tts.wav_encode"):
+            _write_wav(output, samples, sample_rate)
+        instrumentation.count("tts_wav_bytes_written", 44 + samples.nbytes)
 
-            ref_path = ref_tmp.name
-            out_path = out_tmp.name
 
-            try:
-                ref_xtts = _convert_audio_bytes_to_xtts_format(
-                    reference_audio_bytes, input_format
-                )
-                with open(ref_path, "wb") as f:
-                    f.write(ref_xtts)
-
-                tts_model.tts_to_file(
-                    text=sentence,
-                    speaker_wav=ref_path,
-                    language=language,
-                    file_path=out_path
-                )
+def stream_speech(
+    text: str,
+    reference_audio_bytes: bytes,
+    language: str = "ru",
+    enhance: bool = True,
+    input_format: Optional[str] = None,
+    max_sentence_length: int = 180,
+    pack_sentences: Optional[bool] = None,
+    reference_id: Optional[str] = None,
+    dtype: str = "int16",
+    seed: Optional[int] = None,
+    pool: Optional["TTSWorkerPool"] = None
+) -> Iterator[SpeechChunk]:
+    """
+    Генератор: выдаёт PCM по одному фрагменту сразу после его синтеза.
+
+    Разбиение на фрагменты такое же, как в generate_speech (plan_speech), но
+    первое предложение всегда идёт отдельным фрагментом: первый чанк готов
+    через время синтеза одного предложения. Пауза после фрагмента (конец
+    абзаца) входит в его чанк.
+    Улучшение звука применяется инкрементально: фильтр и компрессор
+    продолжают состояние между предложениями, нормализация — по предложению.
+
+    Параметры:
+        dtype: формат сэмплов в чанках — "int16" (по умолчанию) или "float32"
+        (остальные — как у generate_speech)
+    """
+    if dtype not in ("float32", "int16"):
+        raise ValueError(f"Неподдерживаемый dtype: {dtype}")
+
+    plan = plan_speech(
+        text, max_sentence_length, language, pack_sentences=pack_sentences, separate_first=True
+    )
+    sentences = plan.texts
+    session = _SpeakerSession(
+        reference_audio_bytes, language, input_format, reference_id, seed
+    )
+    enhancer = None
+
+    synthesized = session.iter_synthesized(sentences, pool)
+    for i, (sentence, (samples, sample_rate)) in enumerate(zip(sentences, synthesized)):
+        if enhance:
+            if enhancer is None:
+                enhancer = AudioEnhancer(sample_rate)
+            samples = enhancer.process(samples)
+        pause_ms = plan.chunks[i].pause_after_ms
+        if pause_ms:
+            pause = np.zeros(int(sample_rate * pause_ms / 1000), dtype=np.float32)
+            samples = np.concatenate([samples, pause])
+        if dtype == "int16":
+            samples = _float_to_int16(samples)
+        yield SpeechChunk(
+            samples=samples,
+            sample_rate=sample_rate,
+            sample_format=dtype,
+            index=i,
+            text=sentence,
+            is_last=(i == len(sentences) - 1)
+        )
+
 
-                with open(out_path, "rb") as f:
-                    audio_bytes = f.read()
+_WARMUP_TEXT = "Привет! Это проверка синтеза речи."
 
-                if enhance:
-                    audio_bytes = _enhance_audio_bytes(audio_bytes)
 
-                sentence_audios.append(audio_bytes)
+def _warmup_reference_wav() -> bytes:
+    """Синтетический «голос» для пробного синтеза: 3 секунды тона с огибающей."""
+    sample_rate = 22050
+    t = np.arange(sample_rate * 3, dtype=np.float32) / sample_rate
+    samples = 0.3 * np.sin(2 * np.pi * 180 * t) * 0.5 * (1 - np.cos(2 * np.pi * 4 * t))
+    return _array_to_wav_bytes(samples.astype(np.float32), sample_rate)
 
-            finally:
-                for path in [ref_path, out_path]:
-                    try:
-                        if os.path.exists(path):
-                            os.remove(path)
-                    except (OSError, PermissionError):
-                        pass
 
-    return _concatenate_audio_segments(sentence_audios, pause_ms=0)
\ No newline at end of file
+def warmup(
+    reference_audio_bytes: Optional[bytes] = None,
+    language: str = "ru",
+    input_format: Optional[str] = None,
+    reference_id: Optional[str] = None
+) -> float:
+    """
+    Готовит синтез заранее (например, при старте сервиса), чтобы первый запрос
+    не платил за загрузку: токенизатор punkt, модель XTTS и пробный синтез
+    короткой фразы (инициализация и выделение буферов модели).
+
+    Параметры:
+        reference_audio_bytes: голос для пробного синтеза — его латенты заодно
+            попадут в кэш; по умолчанию синтетический тон (в кэш не попадает)
+        input_format, reference_id: как у generate_speech
+
+    Возвращает:
+        затраченное время, сек
+    """
+    started = time.perf_counter()
+    with instrumentation.span("tts.warmup"):
+        _split_into_sentences(_WARMUP_TEXT)
+        tts_model = _load_tts_model()
+        if reference_audio_bytes is not None:
+            latents = _get_conditioning_latents(
+                tts_model, reference_audio_bytes, input_format, reference_id
+            )
+        else:
+            latents = _compute_conditioning_latents(tts_model, _warmup_reference_wav(), "wav")
+        with _MODEL_LOCK:
+            _synthesize_sentence(tts_model, _WARMUP_TEXT, language, latents)
+    return time.perf_counter() - started
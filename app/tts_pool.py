@@ -0,0 +1,149 @@
+"""
+Пул процессов для параллельного синтеза предложений.
+
+Каждый процесс держит свою загруженную модель XTTS (и свои кэши латентов),
+число потоков torch в процессе настраивается, режим инференса
+(app/cpu_inference.py) — как в родительском процессе или заданный явно.
+Предложения одного запроса или нескольких одновременных запросов
+распределяются по процессам, результаты возвращаются в исходном порядке.
+
+Для тестов вместо XTTS можно передать model_factory — функцию уровня модуля
+(её нужно уметь передать в процесс через pickle), возвращающую объект
+с тем же интерфейсом, что TTS.api.TTS (synthesizer.tts_model с
+get_conditioning_latents/inference и config).
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import replace
+from typing import Callable, Optional
+
+import numpy as np
+from app.cpu_inference import InferenceMode, ModeArg, get_mode
+
+
+def _init_worker(
+    num_threads: int,
+    model_factory: Optional[Callable[[], object]],
+    warmup: bool = False,
+    inference_mode: Optional[InferenceMode] = None
+):
+    from app import tts_generator
+
+    if inference_mode is not None:
+        tts_generator.configure_inference(replace(inference_mode, num_threads=num_threads))
+    if model_factory is not None:
+        # Заглушка может обходиться без torch — он нужен только настоящей модели
+        tts_generator._TTS_MODEL = model_factory()
+    else:
+        import torch
+        torch.set_num_threads(num_threads)
+    if warmup:
+        tts_generator.warmup()
+    else:
+        tts_generator._load_tts_model()
+
+
+def _worker_synthesize(
+    sentence: str,
+    reference_audio_bytes: bytes,
+    language: str,
+    input_format: Optional[str],
+    reference_id: Optional[str],
+    seed: Optional[int]
+) -> tuple[np.ndarray, int]:
+    from app import tts_generator
+
+    # Латенты голоса кэшируются в процессе, так что повторно не считаются
+    session = tts_generator._SpeakerSession(
+        reference_audio_bytes, language, input_format, reference_id, seed
+    )
+    return session.synthesize(sentence)
+
+
+class TTSWorkerPool:
+    def __init__(
+        self,
+        size: int = 2,
+        num_threads: Optional[int] = None,
+        model_factory: Optional[Callable[[], object]] = None,
+        warmup: bool = False,
+        inference_mode: ModeArg = None
+    ):
+        """
+        Параметры:
+            size: число процессов (по модели в каждом)
+            num_threads: torch.set_num_threads в каждом процессе
+                         (по умолчанию ядра делятся поровну между процессами)
+            model_factory: функция, создающая модель вместо XTTS (например, заглушка для тестов)
+            warmup: при старте процесса прогреть модель (tts_generator.warmup)
+            inference_mode: режим инференса в процессах (по умолчанию — текущий
+                            tts_generator.configure_inference, чтобы ключи кэшей совпадали)
+        """
+        if size < 1:
+            raise ValueError("size должен быть >= 1")
+        if num_threads is None:
+            num_threads = max(1, (os.cpu_count() or 1) // size)
+
+        if inference_mode is None:
+            from app import tts_generator
+            inference_mode = tts_generator._INFERENCE_MODE
+        else:
+            inference_mode = get_mode(inference_mode)
+
+        self.size = size
+        self.num_threads = num_threads
+        self.inference_mode = inference_mode
+        # spawn: torch и fork плохо совместимы
+        self._executor = ProcessPoolExecutor(
+            max_workers=size,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(num_threads, model_factory, warmup, inference_mode)
+        )
+
+    def submit(
+        self,
+        sentence: str,
+        reference_audio_bytes: bytes,
+        language: str = "ru",
+        input_format: Optional[str] = None,
+        reference_id: Optional[str] = None,
+        seed: Optional[int] = None
+    ) -> "Future[tuple[np.ndarray, int]]":
+        """Ставит предложение в очередь; результат — (float32-сэмплы, частота)."""
+        return self._executor.submit(
+            _worker_synthesize, sentence, reference_audio_bytes,
+            language, input_format, reference_id, seed
+        )
+
+    def synthesize_many(
+        self,
+        sentences: list[str],
+        reference_audio_bytes: bytes,
+        language: str = "ru",
+        input_format: Optional[str] = None,
+        reference_id: Optional[str] = None,
+        seed: Optional[int] = None
+    ) -> list[tuple[np.ndarray, int]]:
+        """Синтезирует предложения параллельно и возвращает их в исходном порядке."""
+        futures = [
+            self.submit(sentence, reference_audio_bytes, language, input_format, reference_id, seed)
+            for sentence in sentences
+        ]
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        """
+        Останавливает процессы.
+        wait=True — дождаться текущих задач; cancel_pending=True — отменить ещё не начатые.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_pending)
+
+    def __enter__(self) -> "TTSWorkerPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # При ошибке не ждём хвост очереди
+        self.shutdown(wait=True, cancel_pending=exc_type is not None)
@@ -1,9 +1,279 @@
 import os
 import io
-import tempfile
-from typing import Union
-from moviepy.editor import VideoFileClip, AudioFileClip, AudioClip
-from pydub import AudioSegment as PydubAudio
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, NamedTuple, Optional, Union
+from app.audio_mixer import DEFAULT_CHANNELS, DEFAULT_SAMPLE_RATE, MixedAudio, audio_duration
+from app.ffmpeg_utils import MP4_COPY_VIDEO_CODECS, PipedInput, probe_media, run_ffmpeg
+from app.media_io import MediaSource, MediaTarget, make_temp_path, source_path, target_path
+from app.encoding_profiles import EncodingProfile, ProfileArg, get_profile
+from app import instrumentation
+
+if TYPE_CHECKING:
+    from moviepy.editor import VideoFileClip
+
+
+def plan_mixed_audio(
+    video_path: str,
+    tts_path: str,
+    tts_volume_boost_db: float = 0.0,
+    post_audio_padding: float = 1.0,
+    original_audio_path: Optional[str] = None,
+    info: Optional[dict] = None,
+    duck_original_db: float = 0.0,
+    audio_fade_in: float = 0.0,
+    audio_fade_out: float = 0.0
+) -> MixedAudio:
+    """
+    Описывает смесь оригинальной дорожки видео с TTS (app/audio_mixer.py);
+    сами дорожки читаются потоком только при кодировании.
+
+    Итоговая длительность — TTS + post_audio_padding, но не длиннее видео.
+    original_audio_path: заранее извлечённая оригинальная дорожка (WAV),
+    иначе она декодируется прямо из видео.
+    info: уже известные параметры потоков видео (probe_media).
+    """
+    with instrumentation.span("mix.plan"):
+        if info is None:
+            info = probe_media(video_path)
+        if info["duration"] is None:
+            raise ValueError(f"Не удалось определить длительность: {video_path}")
+        tts_duration = audio_duration(tts_path)
+    target_duration = min(tts_duration + post_audio_padding, info["duration"])
+
+    has_original_audio = original_audio_path is not None or info["audio_codec"] is not None
+    return MixedAudio(
+        tts_path,
+        target_duration,
+        original_path=original_audio_path or (video_path if has_original_audio else None),
+        sample_rate=info["audio_sample_rate"] or DEFAULT_SAMPLE_RATE,
+        channels=min(info["audio_channels"] or DEFAULT_CHANNELS, 2),
+        tts_volume_boost_db=tts_volume_boost_db,
+        duck_original_db=duck_original_db,
+        fade_in=audio_fade_in,
+        fade_out=audio_fade_out,
+        tts_duration=tts_duration
+    )
+
+
+def _can_remux(
+    video_path: str,
+    fade_duration: float,
+    exact_cut: bool,
+    encoding: Optional[EncodingProfile] = None
+) -> bool:
+    """
+    Можно ли обойтись копированием видеопотока без перекодирования.
+
+    Нельзя, если нужен fade-out (меняются кадры), точный до сэмпла рез
+    (копирование режет по границе кадра), кодек не копируется в MP4
+    или профиль кодирования меняет размер кадра/fps.
+    """
+    if fade_duration > 0 or exact_cut:
+        return False
+    try:
+        info = probe_media(video_path)
+    except (OSError, ValueError):
+        return False
+    if encoding is not None and encoding.changes_stream(info):
+        return False
+    return info["video_codec"] in MP4_COPY_VIDEO_CODECS
+
+
+def remux_with_audio(
+    video_path: str,
+    audio_path: Union[str, PipedInput],
+    target_duration: float,
+    output_path: str,
+    audio_sample_rate: Optional[int] = None,
+    audio_channels: Optional[int] = None,
+    audio_bitrate: Optional[str] = None,
+    faststart: bool = True
+) -> None:
+    """
+    Копирует видеопоток с начала до target_duration и подставляет новую AAC-дорожку.
+
+    Рез идёт с нулевой позиции (ключевой кадр), поэтому конец обрезается
+    по границе кадра без перекодирования хвостового GOP.
+    audio_path: файл или PipedInput (например, MixedAudio.as_ffmpeg_input()).
+    audio_sample_rate/audio_channels задают параметры AAC (нужно для склейки
+    concat-демуксером с другими сегментами), audio_bitrate — битрейт AAC,
+    faststart — moov в начале файла (EncodingProfile.faststart).
+    """
+    audio_args = ["-c:a", "aac"]
+    if audio_bitrate:
+        audio_args += ["-b:a", audio_bitrate]
+    if audio_sample_rate:
+        audio_args += ["-ar", str(audio_sample_rate)]
+    if audio_channels:
+        audio_args += ["-ac", str(audio_channels)]
+    if isinstance(audio_path, PipedInput):
+        audio_input, stdin_blocks = audio_path.args, audio_path.blocks
+    else:
+        audio_input, stdin_blocks = ["-i", audio_path], None
+    run_ffmpeg([
+        "-i", video_path,
+        *audio_input,
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+        "-t", f"{target_duration:.3f}",
+        "-c:v", "copy",
+        *audio_args,
+        *(["-movflags", "+faststart"] if faststart else []),
+        output_path
+    ], stdin_blocks=stdin_blocks)
+
+
+class MixedClip(NamedTuple):
+    clip: "VideoFileClip"      # видео, обрезанное до duration, со смешанным аудио
+    audio_path: str            # смешанное аудио (WAV)
+    duration: float
+
+
+@contextmanager
+def open_mixed_clip(
+    video_path: str,
+    tts_path: str,
+    tts_volume_boost_db: float = 0.0,
+    post_audio_padding: float = 1.0,
+    original_audio_path: Optional[str] = None,
+    info: Optional[dict] = None,
+    duck_original_db: float = 0.0,
+    target_resolution: Optional[tuple[int, int]] = None
+) -> Iterator[MixedClip]:
+    """
+    Открывает видео, смешивает его дорожку с TTS и отдаёт клип без кодирования.
+    Кодирует вызывающий код — один раз, вместе с остальными сегментами.
+    Все временные файлы и клипы закрываются при выходе из контекста.
+
+    Смесь считается потоково (plan_mixed_audio) и пишется в WAV для MoviePy.
+    Если MoviePy не нужен, удобнее подать смесь в ffmpeg напрямую:
+    plan_mixed_audio(...).as_ffmpeg_input().
+    target_resolution: (высота, ширина) — уменьшать кадры при декодировании
+    (EncodingProfile.target_resolution).
+    """
+    # MoviePy тяжёлый — импортируется только там, где нужен
+    from moviepy.editor import VideoFileClip, AudioFileClip
+
+    mixed_path = make_temp_path(".wav")
+    video = None
+    final_video = None
+    mixed_audio_clip = None
+
+    try:
+        mix = plan_mixed_audio(
+            video_path, tts_path, tts_volume_boost_db, post_audio_padding,
+            original_audio_path=original_audio_path,
+            info=info,
+            duck_original_db=duck_original_db
+        )
+        with instrumentation.span("mix.audio", seconds=mix.duration):
+            mix.write_wav(mixed_path)
+
+        # Звук видео MoviePy не читает — он уже в смеси
+        with instrumentation.span("mix.open_clip"):
+            video = VideoFileClip(video_path, audio=False, target_resolution=target_resolution)
+            mixed_audio_clip = AudioFileClip(mixed_path)
+            final_video = video.subclip(0, mix.duration).set_audio(mixed_audio_clip)
+
+        yield MixedClip(final_video, mixed_path, mix.duration)
+
+    finally:
+        if final_video is not None:
+            final_video.close()
+        if mixed_audio_clip is not None:
+            mixed_audio_clip.close()
+        if video is not None:
+            video.close()
+        if os.path.exists(mixed_path):
+            try:
+                os.remove(mixed_path)
+            except (OSError, PermissionError):
+                pass
+
+
+def write_clip(clip, output_path: str, encoding: EncodingProfile) -> None:
+    """Кодирует клип MoviePy в MP4 (H.264 + AAC) с параметрами профиля encoding."""
+    # Своя временная AAC-дорожка на каждый рендер: параллельные рендеры не пишут в один файл
+    audio_path = make_temp_path(".m4a")
+    try:
+        clip.write_videofile(
+            output_path,
+            codec="libx264",
+            audio_codec="aac",
+            temp_audiofile=audio_path,
+            remove_temp=True,
+            logger=None,
+            **encoding.moviepy_kwargs(clip.fps)
+        )
+    finally:
+        if os.path.exists(audio_path):
+            try:
+                os.remove(audio_path)
+            except (OSError, PermissionError):
+                pass
+
+
+def mix_video_with_audio_to(
+    video: MediaSource,
+    tts_audio: MediaSource,
+    output: MediaTarget,
+    fade_duration: float = 1.0,
+    tts_volume_boost_db: float = 0.0,
+    post_audio_padding: float = 1.0,
+    fast: bool = False,
+    exact_cut: bool = False,
+    duck_original_db: float = 0.0,
+    profile: ProfileArg = None
+) -> None:
+    """
+    То же, что mix_video_with_audio, но без копий файлов в памяти.
+
+    Параметры:
+        video, tts_audio: путь (читается на месте), байты или файловый объект
+        output: путь или поток для записи итогового MP4
+        (остальные — как у mix_video_with_audio)
+    """
+    encoding = get_profile(profile)
+    with instrumentation.trace("mix_video", encoding=encoding.name), \
+         source_path(video, ".mp4") as video_path, \
+         source_path(tts_audio, ".wav") as tts_path, \
+         target_path(output, ".mp4") as output_path:
+
+        # === Быстрый путь: копирование видеопотока, смесь идёт в ffmpeg напрямую ===
+        if fast and _can_remux(video_path, fade_duration, exact_cut, encoding):
+            try:
+                mix = plan_mixed_audio(
+                    video_path, tts_path, tts_volume_boost_db, post_audio_padding,
+                    duck_original_db=duck_original_db
+                )
+                with instrumentation.span("mix.remux"):
+                    remux_with_audio(
+                        video_path, mix.as_ffmpeg_input(), mix.duration, output_path,
+                        audio_bitrate=encoding.audio_bitrate,
+                        faststart=encoding.faststart
+                    )
+                instrumentation.count("video_bytes_written", os.path.getsize(output_path))
+                return
+            except RuntimeError:
+                # Не получилось — идём полным путём
+                pass
+
+        info = probe_media(video_path)
+        with open_mixed_clip(
+            video_path, tts_path, tts_volume_boost_db, post_audio_padding,
+            info=info,
+            duck_original_db=duck_original_db,
+            target_resolution=encoding.target_resolution(info)
+        ) as mixed:
+            final_video = mixed.clip
+
+            # Fade-out к концу видео
+            if fade_duration > 0 and fade_duration < final_video.duration:
+                final_video = final_video.fadeout(fade_duration)
+
+            with instrumentation.span("mix.encode"):
+                write_clip(final_video, output_path, encoding)
+        instrumentation.count("video_bytes_written", os.path.getsize(output_path))
 
 
 def mix_video_with_audio(
@@ -11,7 +281,11 @@ def mix_video_with_audio(
     tts_audio_bytes: bytes,
     fade_duration: float = 1.0,
     tts_volume_boost_db: float = 0.0,
-    post_audio_padding: float = 1.0  # ← НОВЫЙ ПАРАМЕТР
+    post_audio_padding: float = 1.0,  # ← НОВЫЙ ПАРАМЕТР
+    fast: bool = False,
+    exact_cut: bool = False,
+    duck_original_db: float = 0.0,
+    profile: ProfileArg = None
 ) -> bytes:
     """
     Смешивает оригинальное аудио и TTS, и оставляет видео работать ещё post_audio_padding секунд после конца TTS.
@@ -22,120 +296,25 @@ def mix_video_with_audio(
         fade_duration: длительность fade-out
         tts_volume_boost_db: усиление TTS
         post_audio_padding: сколько секунд держать видео после окончания TTS (по умолчанию 1.0)
+        fast: копировать видеопоток без перекодирования (перекодируется только AAC);
+              при fade-out, exact_cut или неподходящем кодеке — обычный путь через MoviePy
+        exact_cut: требовать точный рез по длительности (отключает fast)
+        duck_original_db: приглушить оригинальный звук под речью на столько дБ
+        profile: профиль кодирования — имя ("fast-preview", "standard", "archive")
+                 или EncodingProfile (см. app/encoding_profiles.py)
     
     Возвращает:
         байты итогового видео
     """
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as vid_tmp, \
-         tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tts_tmp, \
-         tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as orig_audio_tmp:
-
-        video_path = vid_tmp.name
-        tts_path = tts_tmp.name
-        orig_audio_path = orig_audio_tmp.name
-
-        try:
-            with open(video_path, "wb") as f:
-                f.write(video_bytes)
-            with open(tts_path, "wb") as f:
-                f.write(tts_audio_bytes)
-
-            video = VideoFileClip(video_path)
-            has_original_audio = video.audio is not None
-
-            if has_original_audio:
-                video.audio.write_audiofile(orig_audio_path, logger=None)
-            else:
-                silent = PydubAudio.silent(duration=int(video.duration * 1000))
-                silent.export(orig_audio_path, format="wav")
-
-            tts_audio_clip = AudioFileClip(tts_path)
-            tts_duration = tts_audio_clip.duration
-
-            # === Вычисляем итоговую длительность ===
-            target_duration = tts_duration + post_audio_padding
-            if video.duration < target_duration:
-                # Если видео короче — обрезаем цель до длины видео
-                target_duration = video.duration
-
-            # Обрезаем видео до target_duration
-            final_video = video.subclip(0, target_duration)
-
-            # === Обработка аудио ===
-            # Оригинальное аудио — обрезаем до target_duration
-            if has_original_audio:
-                orig_pydub = PydubAudio.from_wav(orig_audio_path)
-                orig_duration_ms = len(orig_pydub)
-                target_duration_ms = int(target_duration * 1000)
-                if orig_duration_ms > target_duration_ms:
-                    orig_pydub = orig_pydub[:target_duration_ms]
-                elif orig_duration_ms < target_duration_ms:
-                    silence = PydubAudio.silent(duration=target_duration_ms - orig_duration_ms)
-                    orig_pydub = orig_pydub + silence
-            else:
-                orig_pydub = PydubAudio.silent(duration=int(target_duration * 1000))
-
-            # TTS — обрезаем до tts_duration (не продлеваем!)
-            tts_pydub = PydubAudio.from_wav(tts_path)
-            tts_duration_ms = len(tts_pydub)
-            target_tts_ms = int(tts_duration * 1000)
-            if tts_duration_ms > target_tts_ms:
-                tts_pydub = tts_pydub[:target_tts_ms]
-
-            # Добавляем тишину после TTS до конца target_duration
-            tts_total_ms = len(tts_pydub)
-            if tts_total_ms < int(target_duration * 1000):
-                silence = PydubAudio.silent(duration=int(target_duration * 1000) - tts_total_ms)
-                tts_pydub = tts_pydub + silence
-
-            # Усиление TTS
-            if tts_volume_boost_db != 0:
-                tts_pydub += tts_volume_boost_db
-
-            # Микс
-            mixed_audio = orig_pydub.overlay(tts_pydub)
-            mixed_path = tempfile.mktemp(suffix=".wav")
-            mixed_audio.export(mixed_path, format="wav")
-            mixed_audio_clip = AudioFileClip(mixed_path)
-
-            try:
-                # Fade-out к концу видео
-                if fade_duration > 0 and fade_duration < final_video.duration:
-                    final_video = final_video.fadeout(fade_duration)
-
-                final_video = final_video.set_audio(mixed_audio_clip)
-
-                output_temp = tempfile.mktemp(suffix=".mp4")
-                final_video.write_videofile(
-                    output_temp,
-                    codec="libx264",
-                    audio_codec="aac",
-                    temp_audiofile="temp-audio.m4a",
-                    remove_temp=True,
-                    logger=None
-                )
-
-                with open(output_temp, "rb") as f:
-                    result_bytes = f.read()
-                if os.path.exists(output_temp):
-                    os.remove(output_temp)
-
-                return result_bytes
-
-            finally:
-                final_video.close()
-                mixed_audio_clip.close()
-                if has_original_audio:
-                    video.audio.close()
-                video.close()
-                tts_audio_clip.close()
-                if os.path.exists(mixed_path):
-                    os.remove(mixed_path)
-
-        finally:
-            for path in [video_path, tts_path, orig_audio_path]:
-                if os.path.exists(path):
-                    try:
-                        os.remove(path)
-                    except (OSError, PermissionError):
-                        pass
\ No newline at end of file
+    buffer = io.BytesIO()
+    mix_video_with_audio_to(
+        video_bytes, tts_audio_bytes, buffer,
+        fade_duration=fade_duration,
+        tts_volume_boost_db=tts_volume_boost_db,
+        post_audio_padding=post_audio_padding,
+        fast=fast,
+        exact_cut=exact_cut,
+        duck_original_db=duck_original_db,
+        profile=profile
+    )
+    return buffer.getvalue()
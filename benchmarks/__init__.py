@@ -0,0 +1,10 @@
+"""
+Бенчмарки конвейера генерации поздравлений.
+
+Работают офлайн на CPU: вместо XTTS — детерминированная заглушка
+(benchmarks/stub_tts.py), ассеты генерируются ffmpeg (benchmarks/synthetic_assets.py).
+
+Запуск:
+    python -m benchmarks.pipeline_benchmark --out bench.json
+    python -m benchmarks.pipeline_benchmark --out new.json --compare bench.json
+"""
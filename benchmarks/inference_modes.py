@@ -0,0 +1,326 @@
+"""
+Сравнение режимов инференса XTTS (app/cpu_inference.py) по скорости и качеству
+на фиксированных русских фразах относительно fp32.
+
+Для каждого режима модель загружается заново; замеряются загрузка
+(вместе с квантованием/компиляцией), расчёт латентов голоса и синтез
+каждой фразы (медиана по повторам, фиксированный seed). Качество —
+относительно первого режима в списке (базового):
+    duration_ratio — длительность фразы к базовой
+    spectral_distance_db — RMS-разница усреднённых лог-мел-спектров, дБ;
+        для масштаба приводится разброс самого базового режима при другом seed
+    speaker_similarity — косинус speaker embedding фразы и reference
+        (считается базовой моделью для всех режимов одинаково)
+
+Нужна настоящая модель (TTS, torch). Запуск:
+    python -m benchmarks.inference_modes --reference voice.wav --out modes.json
+    python -m benchmarks.inference_modes --reference voice.wav --modes fp32,cpu-int8 --threads 4
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from typing import Optional
+import numpy as np
+
+from benchmarks.pipeline_benchmark import _environment
+
+PROMPTS = [
+    "Привет! С днём рождения!",
+    "Дорогая Анна, поздравляю тебя с праздником и желаю счастья, здоровья и удачи.",
+    "Сегодня особенный день: тебе исполняется двадцать пять лет, и все друзья собрались, чтобы сказать тебе тёплые слова.",
+    "Пусть каждый новый день приносит радость, а мечты сбываются быстрее, чем ты успеваешь их загадать!",
+    "Ты огромный молодец. Так держать!"
+]
+DEFAULT_MODES = ["fp32", "cpu", "cpu-int8"]
+
+
+def _mel_filterbank(sample_rate: int, n_fft: int, n_mels: int) -> np.ndarray:
+    def hz_to_mel(hz):
+        return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    mels = np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2), n_mels + 2)
+    bins = np.floor((n_fft + 1) * mel_to_hz(mels) / sample_rate).astype(int)
+    bank = np.zeros((n_mels, n_fft // 2 + 1))
+    for i in range(n_mels):
+        left, center, right = bins[i], bins[i + 1], bins[i + 2]
+        if center > left:
+            bank[i, left:center] = (np.arange(left, center) - left) / (center - left)
+        if right > center:
+            bank[i, center:right] = (right - np.arange(center, right)) / (right - center)
+    return bank
+
+
+def log_mel_profile(
+    samples: np.ndarray,
+    sample_rate: int,
+    n_fft: int = 1024,
+    hop: int = 256,
+    n_mels: int = 40
+) -> np.ndarray:
+    """Усреднённый по озвученным кадрам лог-мел-спектр (дБ)."""
+    if len(samples) < n_fft:
+        samples = np.pad(samples, (0, n_fft - len(samples)))
+    frames = np.lib.stride_tricks.sliding_window_view(samples, n_fft)[::hop]
+    power = np.abs(np.fft.rfft(frames * np.hanning(n_fft), axis=1)) ** 2
+    mel_db = 10.0 * np.log10(power @ _mel_filterbank(sample_rate, n_fft, n_mels).T + 1e-10)
+    # Паузы и хвост тишины не учитываем: кадры тише пика больше чем на 40 дБ
+    energy = mel_db.mean(axis=1)
+    return mel_db[energy > energy.max() - 40.0].mean(axis=0)
+
+
+def spectral_distance_db(a: np.ndarray, b: np.ndarray, sample_rate: int) -> float:
+    diff = log_mel_profile(a, sample_rate) - log_mel_profile(b, sample_rate)
+    return float(np.sqrt(np.mean(diff ** 2)))
+
+
+def _to_numpy(tensor) -> np.ndarray:
+    if hasattr(tensor, "detach"):
+        tensor = tensor.detach().float().cpu().numpy()
+    return np.asarray(tensor, dtype=np.float64).ravel()
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b) / norm) if norm > 0 else 0.0
+
+
+def _reload(mode: str, num_threads: Optional[int]):
+    """Переключает режим и сбрасывает модель и кэши, чтобы замер шёл с нуля."""
+    from app import tts_generator
+
+    overrides = {"num_threads": num_threads} if num_threads else {}
+    tts_generator.configure_inference(mode, **overrides)
+    tts_generator._TTS_MODEL = None
+    tts_generator._SPEAKER_CACHE.clear()
+
+
+def synthesize_prompts(
+    reference_bytes: bytes,
+    reference_format: Optional[str],
+    prompts: list[str],
+    seed: int,
+    repeat: int
+) -> dict:
+    """Синтез фраз текущим режимом: время этапов и аудио первого повтора."""
+    from app import tts_generator
+
+    started = time.perf_counter()
+    tts_generator._load_tts_model()
+    load_seconds = time.perf_counter() - started
+
+    session = tts_generator._SpeakerSession(reference_bytes, "ru", reference_format, seed=seed)
+    started = time.perf_counter()
+    session.latents
+    latents_seconds = time.perf_counter() - started
+
+    rows = []
+    for prompt in prompts:
+        timings = []
+        audio = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            samples, sample_rate = session.synthesize(prompt)
+            timings.append(time.perf_counter() - started)
+            if audio is None:
+                audio = samples
+        rows.append({
+            "prompt": prompt,
+            "chars": len(prompt),
+            "samples": audio,
+            "sample_rate": sample_rate,
+            "synthesis_seconds": statistics.median(timings)
+        })
+    return {"load_seconds": load_seconds, "latents_seconds": latents_seconds, "prompts": rows}
+
+
+def _speaker_similarities(
+    reference_bytes: bytes,
+    reference_format: Optional[str],
+    outputs: dict[str, list[dict]]
+) -> dict[str, list[float]]:
+    """Косинус speaker embedding каждой фразы и reference — загруженной (базовой) моделью."""
+    from app import tts_generator
+
+    tts_model = tts_generator._load_tts_model()
+    _, reference_embedding = tts_generator._compute_conditioning_latents(
+        tts_model, reference_bytes, reference_format
+    )
+    reference_embedding = _to_numpy(reference_embedding)
+    similarities = {}
+    for mode, rows in outputs.items():
+        similarities[mode] = []
+        for row in rows:
+            wav_bytes = tts_generator._array_to_wav_bytes(row["samples"], row["sample_rate"])
+            _, embedding = tts_generator._compute_conditioning_latents(tts_model, wav_bytes, "wav")
+            similarities[mode].append(_cosine(_to_numpy(embedding), reference_embedding))
+    return similarities
+
+
+def run_comparison(
+    reference_path: str,
+    modes: list[str],
+    prompts: list[str] = PROMPTS,
+    seed: int = 1234,
+    repeat: int = 2,
+    num_threads: Optional[int] = None,
+    save_audio_dir: Optional[str] = None
+) -> dict:
+    """
+    Прогоняет режимы по очереди и возвращает отчёт:
+        {"environment", "parameters", "baseline", "seed_spread_db",
+         "modes": {режим: {load_seconds, latents_seconds, realtime_factor, speedup,
+                            spectral_distance_db, speaker_similarity, prompts: [...]}}}
+    """
+    from app import tts_generator
+
+    with open(reference_path, "rb") as f:
+        reference_bytes = f.read()
+    reference_format = os.path.splitext(reference_path)[1].lstrip(".").lower() or None
+
+    saved_sentence_cache = tts_generator._SENTENCE_CACHE
+    saved_mode = tts_generator._INFERENCE_MODE
+    tts_generator._SENTENCE_CACHE = None
+    baseline = modes[0]
+    results = {}
+    outputs = {}
+    try:
+        for mode in modes:
+            _reload(mode, num_threads)
+            results[mode] = synthesize_prompts(
+                reference_bytes, reference_format, prompts, seed, repeat
+            )
+            outputs[mode] = results[mode]["prompts"]
+
+        # Разброс базового режима при другом seed и сходство голоса — базовой моделью
+        _reload(baseline, num_threads)
+        spread = synthesize_prompts(reference_bytes, reference_format, prompts, seed + 1, 1)
+        similarities = _speaker_similarities(reference_bytes, reference_format, outputs)
+    finally:
+        tts_generator._SENTENCE_CACHE = saved_sentence_cache
+        tts_generator.configure_inference(saved_mode)
+
+    base_rows = outputs[baseline]
+    base_synthesis = sum(row["synthesis_seconds"] for row in base_rows)
+    seed_spread = [
+        spectral_distance_db(row["samples"], base["samples"], base["sample_rate"])
+        for row, base in zip(spread["prompts"], base_rows)
+    ]
+
+    report_modes = {}
+    for mode in modes:
+        prompt_rows = []
+        for i, (row, base) in enumerate(zip(outputs[mode], base_rows)):
+            sample_rate = row["sample_rate"]
+            audio_seconds = len(row["samples"]) / sample_rate
+            prompt_rows.append({
+                "prompt": row["prompt"],
+                "chars": row["chars"],
+                "audio_seconds": round(audio_seconds, 3),
+                "synthesis_seconds": round(row["synthesis_seconds"], 4),
+                "realtime_factor": round(row["synthesis_seconds"] / audio_seconds, 4),
+                "duration_ratio": round(len(row["samples"]) / len(base["samples"]), 4),
+                "spectral_distance_db": round(
+                    spectral_distance_db(row["samples"], base["samples"], sample_rate), 3
+                ),
+                "speaker_similarity": round(similarities[mode][i], 4)
+            })
+            if save_audio_dir:
+                os.makedirs(save_audio_dir, exist_ok=True)
+                tts_generator._write_wav(
+                    os.path.join(save_audio_dir, f"{mode}_{i}.wav"), row["samples"], sample_rate
+                )
+
+        synthesis = sum(row["synthesis_seconds"] for row in outputs[mode])
+        audio = sum(row["audio_seconds"] for row in prompt_rows)
+        report_modes[mode] = {
+            "load_seconds": round(results[mode]["load_seconds"], 3),
+            "latents_seconds": round(results[mode]["latents_seconds"], 4),
+            "realtime_factor": round(synthesis / audio, 4) if audio else None,
+            "speedup": round(base_synthesis / synthesis, 3) if synthesis else None,
+            "spectral_distance_db": round(
+                statistics.mean(row["spectral_distance_db"] for row in prompt_rows), 3
+            ),
+            "speaker_similarity": round(
+                statistics.mean(row["speaker_similarity"] for row in prompt_rows), 4
+            ),
+            "prompts": prompt_rows
+        }
+
+    return {
+        "environment": _environment(),
+        "parameters": {
+            "reference": os.path.abspath(reference_path),
+            "modes": modes,
+            "seed": seed,
+            "repeat": repeat,
+            "num_threads": num_threads,
+            "model": tts_generator._MODEL_NAME
+        },
+        "baseline": baseline,
+        "seed_spread_db": round(statistics.mean(seed_spread), 3),
+        "modes": report_modes
+    }
+
+
+def format_table(report: dict) -> list[str]:
+    lines = [
+        f"Базовый режим: {report['baseline']}; разброс при другом seed: "
+        f"{report['seed_spread_db']:.2f} дБ",
+        f"{'режим':<18}{'загрузка,с':>11}{'RTF':>8}{'ускорение':>11}{'спектр,дБ':>11}{'голос':>8}"
+    ]
+    for mode, row in report["modes"].items():
+        lines.append(
+            f"{mode:<18}{row['load_seconds']:>11.2f}{row['realtime_factor']:>8.3f}"
+            f"{row['speedup']:>11.2f}{row['spectral_distance_db']:>11.2f}{row['speaker_similarity']:>8.3f}"
+        )
+    return lines
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    from app.cpu_inference import MODES
+
+    parser = argparse.ArgumentParser(description="Сравнение режимов инференса XTTS на CPU")
+    parser.add_argument("--reference", required=True, help="reference-аудио голоса")
+    parser.add_argument("--modes", default=",".join(DEFAULT_MODES),
+                        help=f"режимы через запятую, первый — базовый ({', '.join(MODES)})")
+    parser.add_argument("--threads", type=int, help="torch.set_num_threads для всех режимов")
+    parser.add_argument("--repeat", type=int, default=2, help="повторов синтеза каждой фразы")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--save-audio", help="каталог для WAV каждой фразы в каждом режиме")
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию — stdout)")
+    args = parser.parse_args(argv)
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"неизвестные режимы: {', '.join(unknown)}")
+
+    report = run_comparison(
+        args.reference,
+        modes,
+        seed=args.seed,
+        repeat=max(1, args.repeat),
+        num_threads=args.threads,
+        save_audio_dir=args.save_audio
+    )
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    for line in format_table(report):
+        print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,347 @@
+"""
+Бенчмарк этапов конвейера: generate_speech, mix_video_with_audio,
+generate_greeting_from_template — для нескольких длин текста и разрешений видео.
+
+Модель XTTS подменяется заглушкой (benchmarks/stub_tts.py), поэтому время
+синтеза отражает только обвязку вокруг модели; ассеты создаются ffmpeg
+во временном каталоге. Результат — JSON, два прогона можно сравнить (--compare).
+
+Запуск:
+    python -m benchmarks.pipeline_benchmark --out bench.json
+    python -m benchmarks.pipeline_benchmark --resolutions 640x360 --texts short --repeat 1
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Iterator, Optional
+
+from benchmarks.stub_tts import stub_tts_model
+from benchmarks.synthetic_assets import build_template
+
+_SENTENCE = (
+    "Дорогой друг, поздравляю тебя с днём рождения и желаю тебе счастья, "
+    "здоровья и удачи во всех делах!"
+)
+TEXTS = {
+    "short": _SENTENCE,
+    "medium": " ".join([_SENTENCE] * 4),
+    "long": " ".join([_SENTENCE] * 12)
+}
+DEFAULT_RESOLUTIONS = ["640x360", "1280x720"]
+
+
+class StageTimer:
+    """Собирает длительности этапов одного прогона (секунды)."""
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def _summarize(runs: list[dict[str, float]]) -> dict[str, dict[str, float]]:
+    """min/median/mean по повторам для каждого этапа."""
+    summary = {}
+    for name in runs[0]:
+        values = [run[name] for run in runs]
+        summary[name] = {
+            "min": round(min(values), 4),
+            "median": round(statistics.median(values), 4),
+            "mean": round(statistics.mean(values), 4)
+        }
+    return summary
+
+
+def _repeat(repeat: int, run: Callable[[StageTimer], None]) -> dict[str, dict[str, float]]:
+    runs = []
+    for _ in range(repeat):
+        timer = StageTimer()
+        run(timer)
+        runs.append(timer.stages)
+    return _summarize(runs)
+
+
+def bench_generate_speech(
+    reference_bytes: bytes,
+    reference_format: Optional[str],
+    text: str,
+    repeat: int
+) -> dict:
+    """Этапы generate_speech по отдельности (как в generate_speech_array) и целиком."""
+    from app import tts_generator
+    from app.audio_enhancer import enhance_audio_array
+
+    def run(timer: StageTimer):
+        tts_generator._SPEAKER_CACHE.clear()
+        with timer.stage("prepare_sentences"):
+            plan = tts_generator.plan_speech(text)
+        sentences = plan.texts
+        session = tts_generator._SpeakerSession(reference_bytes, "ru", reference_format)
+        with timer.stage("speaker_latents"):
+            session.latents
+        with timer.stage("synthesis"):
+            synthesized = list(session.iter_synthesized(sentences))
+        sample_rate = synthesized[0][1]
+        with timer.stage("concatenate"):
+            samples = tts_generator._concatenate_audio_arrays(
+                [samples for samples, _ in synthesized], sample_rate, plan.pauses_ms
+            )
+        with timer.stage("enhance"):
+            samples = enhance_audio_array(samples, sample_rate)
+        with timer.stage("wav_encode"):
+            tts_generator._array_to_wav_bytes(samples, sample_rate)
+
+        tts_generator._SPEAKER_CACHE.clear()
+        with timer.stage("total"):
+            tts_generator.generate_speech(text, reference_bytes, input_format=reference_format)
+
+    return _repeat(repeat, run)
+
+
+def bench_mix(video_path: str, tts_path: str, work_dir: str, repeat: int) -> dict:
+    """Смешивание звука отдельно и mix_video_with_audio_to полным и быстрым путём."""
+    from app.video_mixer import mix_video_with_audio_to, plan_mixed_audio
+
+    output_path = os.path.join(work_dir, "mix.mp4")
+    mixed_path = os.path.join(work_dir, "mix.wav")
+
+    def run(timer: StageTimer):
+        with timer.stage("mix_audio"):
+            plan_mixed_audio(video_path, tts_path).write_wav(mixed_path)
+        with timer.stage("mix_video"):
+            mix_video_with_audio_to(video_path, tts_path, output_path)
+        with timer.stage("mix_video_fast"):
+            mix_video_with_audio_to(video_path, tts_path, output_path, fade_duration=0, fast=True)
+
+    return _repeat(repeat, run)
+
+
+def bench_greeting(template_manager, template_id: str, text: str, work_dir: str, repeat: int) -> dict:
+    """Синтез и каждый способ рендера поздравления, плюс весь запрос целиком."""
+    from app import tts_generator
+    from app.segment_cache import SegmentCache
+    from app.services.greeting_generator import (
+        generate_greeting_from_template_to, render_greeting_to, synthesize_greeting_audio_to
+    )
+
+    tts_path = os.path.join(work_dir, "greeting_tts.wav")
+    output_path = os.path.join(work_dir, "greeting.mp4")
+
+    def run(timer: StageTimer):
+        tts_generator._SPEAKER_CACHE.clear()
+        with timer.stage("synthesize"):
+            synthesize_greeting_audio_to(template_manager, template_id, text, tts_path)
+        with timer.stage("render_single_pass"):
+            render_greeting_to(template_manager, template_id, tts_path, output_path)
+        with timer.stage("render_concat_copy"):
+            render_greeting_to(
+                template_manager, template_id, tts_path, output_path,
+                fade_duration=0, concat_without_reencode=True
+            )
+        segment_cache = SegmentCache(tempfile.mkdtemp(dir=work_dir, prefix="segments-"))
+        with timer.stage("render_segment_cache_cold"):
+            render_greeting_to(
+                template_manager, template_id, tts_path, output_path, segment_cache=segment_cache
+            )
+        with timer.stage("render_segment_cache_warm"):
+            render_greeting_to(
+                template_manager, template_id, tts_path, output_path, segment_cache=segment_cache
+            )
+        shutil.rmtree(segment_cache.cache_dir, ignore_errors=True)
+
+        tts_generator._SPEAKER_CACHE.clear()
+        with timer.stage("total"):
+            generate_greeting_from_template_to(template_manager, template_id, text, output_path)
+
+    return _repeat(repeat, run)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True
+        )
+        return result.stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment() -> dict:
+    from app.ffmpeg_utils import get_ffmpeg_binary
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": get_ffmpeg_binary()
+    }
+
+
+def run_benchmarks(
+    text_names: list[str],
+    resolutions: list[str],
+    repeat: int = 3,
+    realtime_factor: float = 0.0,
+    work_dir: Optional[str] = None
+) -> dict:
+    """
+    Прогоняет все бенчмарки и возвращает результаты:
+        {"environment": {...}, "parameters": {...}, "results": [
+            {"benchmark", "text", "chars", "resolution", "stages": {этап: {min, median, mean}}}
+        ]}
+    """
+    from app.tts_generator import generate_speech_to
+    from app.services.greeting_generator import _load_reference
+
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="greeting-bench-")
+    results = []
+    try:
+        with stub_tts_model(realtime_factor):
+            for resolution in resolutions:
+                width, height = (int(value) for value in resolution.split("x"))
+                started = time.perf_counter()
+                template_manager, template_id = build_template(work_dir, width, height)
+                results.append({
+                    "benchmark": "ingest_template",
+                    "text": None,
+                    "chars": None,
+                    "resolution": resolution,
+                    "stages": _summarize([{"total": time.perf_counter() - started}])
+                })
+                # Reference в том виде, в каком его передаёт сервис (подготовленный WAV)
+                resolved = template_manager.get_resolved_template(template_id)
+                reference_bytes, reference_format = _load_reference(resolved)
+
+                for text_name in text_names:
+                    text = TEXTS[text_name]
+                    row = {"text": text_name, "chars": len(text), "resolution": resolution}
+
+                    # Синтез от разрешения не зависит — считаем один раз
+                    if resolution == resolutions[0]:
+                        results.append({
+                            "benchmark": "generate_speech", **row, "resolution": None,
+                            "stages": bench_generate_speech(
+                                reference_bytes, reference_format, text, repeat
+                            )
+                        })
+
+                    tts_path = os.path.join(work_dir, f"tts_{text_name}.wav")
+                    generate_speech_to(text, reference_bytes, tts_path, input_format=reference_format)
+                    results.append({
+                        "benchmark": "mix_video_with_audio", **row,
+                        "stages": bench_mix(resolved["video_path"], tts_path, work_dir, repeat)
+                    })
+                    results.append({
+                        "benchmark": "generate_greeting_from_template", **row,
+                        "stages": bench_greeting(template_manager, template_id, text, work_dir, repeat)
+                    })
+                template_manager.close()
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "environment": _environment(),
+        "parameters": {
+            "texts": text_names,
+            "resolutions": resolutions,
+            "repeat": repeat,
+            "stub_realtime_factor": realtime_factor
+        },
+        "results": results
+    }
+
+
+def _result_key(result: dict) -> tuple:
+    return result["benchmark"], result["text"], result["resolution"]
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = 0.1) -> list[str]:
+    """
+    Строки сравнения медиан по этапам; изменение больше threshold
+    (доля) помечается как регрессия или ускорение.
+    """
+    base_rows = {_result_key(result): result for result in baseline["results"]}
+    lines = []
+    for result in current["results"]:
+        base = base_rows.get(_result_key(result))
+        if base is None:
+            continue
+        label = "/".join(str(part) for part in _result_key(result) if part is not None)
+        for stage, timing in result["stages"].items():
+            if stage not in base["stages"]:
+                continue
+            before = base["stages"][stage]["median"]
+            after = timing["median"]
+            change = (after - before) / before if before > 0 else 0.0
+            mark = ""
+            if change > threshold:
+                mark = "  РЕГРЕССИЯ"
+            elif change < -threshold:
+                mark = "  ускорение"
+            lines.append(f"{label} {stage}: {before:.3f}s -> {after:.3f}s ({change:+.0%}){mark}")
+    return lines
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера поздравлений (заглушка TTS, CPU)")
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию — stdout)")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    parser.add_argument("--texts", default=",".join(TEXTS), help="длины текста: short,medium,long")
+    parser.add_argument("--resolutions", default=",".join(DEFAULT_RESOLUTIONS),
+                        help="разрешения видео, например 640x360,1280x720")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждого замера")
+    parser.add_argument("--stub-rtf", type=float, default=0.0,
+                        help="имитация времени модели: секунд на секунду аудио")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="порог изменения медианы для пометки при --compare")
+    args = parser.parse_args(argv)
+
+    text_names = [name for name in args.texts.split(",") if name]
+    unknown = [name for name in text_names if name not in TEXTS]
+    if unknown:
+        parser.error(f"неизвестные тексты: {', '.join(unknown)}")
+
+    report = run_benchmarks(
+        text_names,
+        [value for value in args.resolutions.split(",") if value],
+        repeat=max(1, args.repeat),
+        realtime_factor=args.stub_rtf
+    )
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for line in compare_results(baseline, report, args.threshold):
+            print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,120 @@
+"""
+Детерминированная заглушка модели XTTS для бенчмарков.
+
+Повторяет интерфейс TTS.api.TTS, которым пользуется app.tts_generator
+(synthesizer.tts_model с get_conditioning_latents/inference и config),
+но вместо речи выдаёт тон с «слоговой» огибающей. Длительность зависит
+от длины текста примерно как у живой речи, результат одинаков от запуска
+к запуску — время этапов после модели можно сравнивать между прогонами.
+"""
+
+import time
+import zlib
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Iterator
+import numpy as np
+
+STUB_SAMPLE_RATE = 24000
+# Средний темп русской речи XTTS, символов в секунду
+STUB_CHARS_PER_SECOND = 14.0
+
+
+class _StubXtts:
+    def __init__(self, realtime_factor: float = 0.0):
+        """realtime_factor: сколько секунд «думать» на секунду аудио (0 — мгновенно)."""
+        self.realtime_factor = realtime_factor
+        self.config = SimpleNamespace(
+            temperature=0.75,
+            length_penalty=1.0,
+            repetition_penalty=10.0,
+            top_k=50,
+            top_p=0.85,
+            gpt_cond_len=30,
+            gpt_cond_chunk_len=4,
+            max_ref_len=30,
+            sound_norm_refs=False,
+            audio=SimpleNamespace(output_sample_rate=STUB_SAMPLE_RATE)
+        )
+
+    def get_conditioning_latents(self, audio_path, **kwargs):
+        try:
+            import torch
+        except ImportError:
+            # Латенты заглушке не нужны — без torch хватает массивов той же формы
+            return np.zeros((1, 32, 1024), dtype=np.float32), np.zeros((1, 512, 1), dtype=np.float32)
+        return torch.zeros(1, 32, 1024), torch.zeros(1, 512, 1)
+
+    def inference(self, text: str, language: str, gpt_cond_latent, speaker_embedding, **kwargs) -> dict:
+        duration = max(0.4, len(text) / STUB_CHARS_PER_SECOND)
+        t = np.arange(int(duration * STUB_SAMPLE_RATE), dtype=np.float32) / STUB_SAMPLE_RATE
+        # Основной тон зависит от текста, огибающая ~4 слога в секунду
+        pitch = 110.0 + zlib.crc32(text.encode("utf-8")) % 80
+        envelope = 0.5 * (1.0 - np.cos(2 * np.pi * 4.0 * t))
+        wav = envelope * (
+            0.6 * np.sin(2 * np.pi * pitch * t)
+            + 0.3 * np.sin(2 * np.pi * 2 * pitch * t)
+            + 0.1 * np.sin(2 * np.pi * 3 * pitch * t)
+        )
+        if self.realtime_factor > 0:
+            time.sleep(duration * self.realtime_factor)
+        return {"wav": (0.8 * wav).astype(np.float32)}
+
+
+class StubTTS:
+    """Заменяет TTS.api.TTS: app.tts_generator обращается только к synthesizer.tts_model."""
+
+    def __init__(self, realtime_factor: float = 0.0):
+        self.synthesizer = SimpleNamespace(tts_model=_StubXtts(realtime_factor))
+
+
+def make_stub_model() -> StubTTS:
+    """Фабрика уровня модуля — подходит для TTSWorkerPool(model_factory=...)."""
+    return StubTTS()
+
+
+def _regex_split_into_sentences(text: str) -> list[str]:
+    import re
+    return [part for part in re.split(r"(?<=[.!?…])\s+", text) if part]
+
+
+def _punkt_available() -> bool:
+    """Есть ли punkt локально; только проверка — без скачивания и сети."""
+    try:
+        import nltk
+        nltk.data.find('tokenizers/punkt')
+    except (ImportError, LookupError):
+        return False
+    return True
+
+
+@contextmanager
+def stub_tts_model(realtime_factor: float = 0.0) -> Iterator[StubTTS]:
+    """
+    Подменяет app.tts_generator._load_tts_model заглушкой на время контекста.
+    Кэши латентов и предложений сбрасываются, чтобы замеры не зависели
+    от предыдущих прогонов. Если токенизатор punkt не скачан (офлайн),
+    предложения делятся регулярным выражением.
+    """
+    from app import tts_generator
+
+    model = StubTTS(realtime_factor)
+    saved = (
+        tts_generator._load_tts_model,
+        tts_generator._SENTENCE_CACHE,
+        tts_generator._split_into_sentences
+    )
+    tts_generator._load_tts_model = lambda: model
+    tts_generator._SENTENCE_CACHE = None
+    tts_generator._SPEAKER_CACHE.clear()
+    if not _punkt_available():
+        tts_generator._split_into_sentences = _regex_split_into_sentences
+    try:
+        yield model
+    finally:
+        (
+            tts_generator._load_tts_model,
+            tts_generator._SENTENCE_CACHE,
+            tts_generator._split_into_sentences
+        ) = saved
+        tts_generator._SPEAKER_CACHE.clear()
@@ -0,0 +1,68 @@
+"""
+Синтетические ассеты для бенчмарков: видео и reference-аудио из lavfi ffmpeg.
+"""
+
+import os
+from app.ffmpeg_utils import run_ffmpeg
+from app.models.template_manager import TemplateManager
+
+
+def make_video(path: str, width: int, height: int, duration: float, fps: int = 25, tone_hz: int = 440):
+    """Тестовая картинка с движением и тоном в стерео, H.264 + AAC."""
+    run_ffmpeg([
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency={tone_hz}:sample_rate=44100:duration={duration}",
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-ac", "2",
+        "-movflags", "+faststart",
+        path
+    ])
+
+
+def make_reference_audio(path: str, duration: float = 6.0):
+    """«Голос» для reference: тон с шумом, моно WAV."""
+    run_ffmpeg([
+        "-f", "lavfi", "-i", f"sine=frequency=180:sample_rate=22050:duration={duration}",
+        "-f", "lavfi", "-i", f"anoisesrc=color=pink:amplitude=0.05:sample_rate=22050:duration={duration}",
+        "-filter_complex", "amix=inputs=2",
+        "-ac", "1",
+        path
+    ])
+
+
+def build_template(
+    work_dir: str,
+    width: int,
+    height: int,
+    main_duration: float = 30.0,
+    segment_duration: float = 2.0
+) -> tuple[TemplateManager, str]:
+    """
+    Создаёт во work_dir базу шаблонов с intro/main/outro заданного размера
+    и reference-аудио. Возвращает (TemplateManager, template_id).
+    """
+    media_dir = os.path.join(work_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    suffix = f"{width}x{height}"
+    intro_path = os.path.join(media_dir, f"intro_{suffix}.mp4")
+    main_path = os.path.join(media_dir, f"main_{suffix}.mp4")
+    outro_path = os.path.join(media_dir, f"outro_{suffix}.mp4")
+    reference_path = os.path.join(media_dir, "reference.wav")
+
+    make_video(intro_path, width, height, segment_duration, tone_hz=330)
+    make_video(main_path, width, height, main_duration, tone_hz=440)
+    make_video(outro_path, width, height, segment_duration, tone_hz=550)
+    if not os.path.exists(reference_path):
+        make_reference_audio(reference_path)
+
+    template_manager = TemplateManager(os.path.join(work_dir, f"templates_{suffix}.db"))
+    reference_id = template_manager.add_reference(reference_path, "benchmark reference")
+    template_id = template_manager.add_template(
+        video_id=template_manager.add_video(main_path, "benchmark main"),
+        reference_id=reference_id,
+        intro_id=template_manager.add_video(intro_path, "benchmark intro"),
+        outro_id=template_manager.add_video(outro_path, "benchmark outro"),
+        description=f"benchmark {suffix}"
+    )
+    return template_manager, template_id
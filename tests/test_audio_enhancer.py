@@ -0,0 +1,72 @@
+"""Векторизованная цепочка улучшения против прежней pydub-цепочки."""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+pydub = pytest.importorskip("pydub")
+from pydub.effects import low_pass_filter, normalize
+
+from app import audio_enhancer
+from app.audio_enhancer import AudioEnhancer, enhance_audio_array
+
+SAMPLE_RATE = 22050
+
+
+def _synthetic_pcm(seconds: float = 0.6, seed: int = 0) -> np.ndarray:
+    """Речеподобный сигнал: тон с гармоникой, огибающая с громкими пиками и шум (int16)."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    tone = np.sin(2 * np.pi * 180 * t) + 0.4 * np.sin(2 * np.pi * 2400 * t)
+    envelope = 0.15 + 0.8 * (np.sin(2 * np.pi * 3 * t) > 0.6)
+    signal = envelope * tone / 1.4 + 0.02 * rng.standard_normal(len(t))
+    return np.clip(np.round(signal * 30000), -32768, 32767).astype(np.int16)
+
+
+def _pydub_chain(pcm: np.ndarray) -> np.ndarray:
+    """Цепочка, которую заменил app/audio_enhancer.py (параметры как в tts_generator)."""
+    audio = pydub.AudioSegment(
+        pcm.tobytes(), frame_rate=SAMPLE_RATE, sample_width=2, channels=1
+    )
+    audio = low_pass_filter(audio, cutoff=6500)
+    audio = audio.compress_dynamic_range(threshold=-20.0, ratio=2.5, attack=5.0, release=50.0)
+    audio = normalize(audio, headroom=0.5)
+    return np.array(audio.get_array_of_samples(), dtype=np.float64)
+
+
+def _assert_close(actual: np.ndarray, expected: np.ndarray):
+    assert actual.shape == expected.shape
+    diff = np.abs(actual - expected)
+    # Допуск в единицах int16: ±1 на сэмпл из-за округления, в среднем — почти точно
+    assert diff.max() <= 2
+    assert np.sqrt(np.mean(diff ** 2)) <= 0.5
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_enhance_audio_array_matches_pydub(seed):
+    pcm = _synthetic_pcm(seed=seed)
+    expected = _pydub_chain(pcm)
+
+    enhanced = enhance_audio_array(pcm.astype(np.float32) / 32768.0, SAMPLE_RATE)
+
+    _assert_close(np.round(enhanced.astype(np.float64) * 32768.0), expected)
+
+
+def test_audio_enhancer_blocks_match_one_shot(monkeypatch):
+    # Нормализация идёт по пику каждого блока; сравниваем состояние фильтра
+    # и компрессора на стыках, поэтому отключаем её
+    monkeypatch.setattr(audio_enhancer, "normalize_peak", lambda pcm, headroom: pcm)
+    samples = _synthetic_pcm().astype(np.float32) / 32768.0
+    # Неровные блоки: одиночный сэмпл, блоки короче и длиннее окна attack (110 сэмплов)
+    bounds = [0, 1, 38, 175, 2222, 2223, 9000, len(samples)]
+
+    expected = AudioEnhancer(SAMPLE_RATE).process(samples)
+    enhancer = AudioEnhancer(SAMPLE_RATE)
+    blocks = [enhancer.process(samples[a:b]) for a, b in zip(bounds, bounds[1:])]
+
+    assert [len(block) for block in blocks] == np.diff(bounds).tolist()
+    np.testing.assert_array_equal(np.concatenate(blocks), expected)
+
+
+def test_empty_input():
+    assert len(enhance_audio_array(np.zeros(0, dtype=np.float32), SAMPLE_RATE)) == 0
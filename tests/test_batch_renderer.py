@@ -0,0 +1,44 @@
+"""Чтение заданий пакетного рендера."""
+
+import json
+
+import pytest
+
+from app.services.batch_renderer import load_jobs_jsonl
+
+
+def _write_jobs(path, rows):
+    path.write_text("\n".join(json.dumps(row, ensure_ascii=False) for row in rows) + "\n\n", encoding="utf-8")
+
+
+def test_load_jobs_defaults(tmp_path):
+    jobs_path = tmp_path / "jobs.jsonl"
+    _write_jobs(jobs_path, [
+        {"template_id": "t1", "text": "Привет"},
+        {"template_id": "t2", "text": "Пока", "job_id": "x", "profile": "archive"}
+    ])
+
+    jobs = load_jobs_jsonl(str(jobs_path), "out")
+
+    assert [job.job_id for job in jobs] == ["1", "x"]
+    assert jobs[0].output_path.endswith("1.mp4")
+    assert jobs[1].profile == "archive"
+
+
+def test_duplicate_job_id_is_rejected(tmp_path):
+    jobs_path = tmp_path / "jobs.jsonl"
+    _write_jobs(jobs_path, [
+        {"template_id": "t1", "text": "a", "job_id": "same"},
+        {"template_id": "t1", "text": "b", "job_id": "same"}
+    ])
+
+    with pytest.raises(ValueError, match="same"):
+        load_jobs_jsonl(str(jobs_path), "out")
+
+
+def test_missing_fields_are_rejected(tmp_path):
+    jobs_path = tmp_path / "jobs.jsonl"
+    _write_jobs(jobs_path, [{"template_id": "t1"}])
+
+    with pytest.raises(ValueError):
+        load_jobs_jsonl(str(jobs_path), "out")
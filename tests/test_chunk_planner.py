@@ -0,0 +1,67 @@
+"""Планировщик фрагментов для синтеза."""
+
+import re
+
+from app.chunk_planner import DEFAULT_PARAGRAPH_PAUSE_MS, plan_chunks
+
+
+def _split(text):
+    return [s for s in re.split(r"(?<=[.!?])\s+", text) if s]
+
+
+def _sentence(words):
+    return " ".join(["слово"] * words) + "."
+
+
+def test_ru_limit_caps_max_length():
+    text = " ".join(_sentence(12) for _ in range(10))
+
+    plan = plan_chunks(text, _split, max_length=250, language="ru")
+
+    assert plan.max_length == 182
+    assert all(chunk.length <= 182 for chunk in plan.chunks)
+
+
+def test_short_sentences_are_packed_evenly():
+    # 12 предложений по 29 символов: 348 символов при лимите 120
+    sentences = [_sentence(4) for _ in range(12)]
+
+    plan = plan_chunks(" ".join(sentences), _split, max_length=120)
+
+    assert len(plan.chunks) == 3
+    assert [len(chunk.sentences) for chunk in plan.chunks] == [4, 4, 4]
+    assert all(chunk.split == "sentence" for chunk in plan.chunks)
+    assert plan.sentence_count == 12
+
+
+def test_paragraphs_are_not_merged_and_get_pause():
+    text = "Привет! Как дела?\n\nС днём рождения!"
+
+    plan = plan_chunks(text, _split, language="ru")
+
+    assert plan.texts == ["Привет! Как дела?", "С днём рождения!"]
+    # После последнего фрагмента паузы нет
+    assert plan.pauses_ms == [DEFAULT_PARAGRAPH_PAUSE_MS, 0]
+
+
+def test_long_sentence_is_split_at_clauses():
+    clause = " ".join(["слово"] * 10)
+    sentence = ", ".join([clause] * 6) + "."
+
+    plan = plan_chunks(sentence, _split, language="ru")
+
+    assert len(sentence) > 182
+    assert len(plan.chunks) > 1
+    assert all(chunk.length <= 182 for chunk in plan.chunks)
+    assert all(chunk.split == "clause" for chunk in plan.chunks[:-1])
+    assert plan.chunks[-1].sentences == [sentence]
+    assert " ".join(plan.texts) == sentence
+
+
+def test_separate_first_keeps_first_sentence_alone():
+    text = "Привет! Как дела? Рад тебя видеть."
+
+    assert plan_chunks(text, _split, language="ru").texts == [text]
+    assert plan_chunks(text, _split, language="ru", separate_first=True).texts == [
+        "Привет!", "Как дела? Рад тебя видеть."
+    ]
@@ -0,0 +1,74 @@
+"""Индекс вытеснения дисковых кэшей и кэш аудио предложений поверх него."""
+
+import os
+import time
+
+import numpy as np
+
+from app.disk_lru import DiskLRUIndex
+from app.sentence_cache import SentenceAudioCache
+
+
+def _write(path: str, size: int, mtime: float = None):
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_rebuilds_from_disk_and_evicts_oldest(tmp_path):
+    now = time.time()
+    for i, name in enumerate(["a.bin", "b.bin", "c.bin"]):
+        _write(str(tmp_path / name), 100, now - 100 + i)
+    _write(str(tmp_path / ".tmp-x.bin"), 100)
+    _write(str(tmp_path / "other.txt"), 100)
+
+    index = DiskLRUIndex(str(tmp_path), ".bin", max_bytes=250)
+    assert len(index) == 3
+    assert index.total_bytes == 300
+
+    index.touch(str(tmp_path / "a.bin"))
+    removed = index.evict()
+    assert removed == [str(tmp_path / "b.bin")]
+    assert not (tmp_path / "b.bin").exists()
+    assert (tmp_path / ".tmp-x.bin").exists()
+    assert index.total_bytes == 200
+
+
+def test_keep_and_ttl(tmp_path):
+    now = time.time()
+    _write(str(tmp_path / "old.bin"), 10, now - 1000)
+    _write(str(tmp_path / "new.bin"), 10, now)
+    index = DiskLRUIndex(str(tmp_path), ".bin", max_bytes=10 ** 6, ttl_seconds=500)
+
+    assert index.evict(keep=str(tmp_path / "old.bin")) == []
+    assert index.evict() == [str(tmp_path / "old.bin")]
+    assert (tmp_path / "new.bin").exists()
+
+
+def test_evict_does_not_rescan_directory(tmp_path, monkeypatch):
+    index = DiskLRUIndex(str(tmp_path), ".bin", max_bytes=10 ** 6, rescan_seconds=None)
+    monkeypatch.setattr(os, "walk", lambda *a, **kw: (_ for _ in ()).throw(AssertionError("walk")))
+    monkeypatch.setattr(os, "listdir", lambda *a, **kw: (_ for _ in ()).throw(AssertionError("listdir")))
+    for i in range(5):
+        path = str(tmp_path / f"{i}.bin")
+        _write(path, 10)
+        index.add(path)
+        index.evict(keep=path)
+    assert index.total_bytes == 50
+
+
+def test_sentence_cache_respects_limit(tmp_path):
+    samples = np.zeros(22050, dtype=np.float32)
+    cache = SentenceAudioCache(str(tmp_path), max_bytes=10 ** 9)
+    cache.put("first", samples, 22050)
+    entry_size = os.path.getsize(tmp_path / "first.npz")
+
+    cache = SentenceAudioCache(str(tmp_path), max_bytes=int(entry_size * 2.5))
+    cache.put("second", samples, 22050)
+    assert cache.get("first") is not None
+    cache.put("third", samples, 22050)
+
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
@@ -0,0 +1,23 @@
+"""Профили кодирования: когда можно копировать видеопоток."""
+
+from app.encoding_profiles import get_profile
+
+
+def test_odd_size_does_not_block_stream_copy():
+    info = {"width": 321, "height": 241, "fps": 25.0}
+
+    assert not get_profile("standard").changes_stream(info)
+    assert get_profile("fast-preview").changes_stream(info)
+
+
+def test_fps_cap_changes_stream():
+    info = {"width": 640, "height": 360, "fps": 30.0}
+
+    assert get_profile("fast-preview").changes_stream(info)
+    assert not get_profile("archive").changes_stream(info)
+
+
+def test_faststart_follows_profile():
+    assert get_profile().movflags_args() == ["-movflags", "+faststart"]
+    assert get_profile(faststart=False).movflags_args() == []
+    assert "-movflags" not in get_profile(faststart=False).moviepy_kwargs(25)["ffmpeg_params"]
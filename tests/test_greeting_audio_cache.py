@@ -0,0 +1,67 @@
+"""Кэш TTS-дорожек поздравлений: закрепление записи на время рендера."""
+
+import os
+
+from app.greeting_audio_cache import GreetingAudioCache, configure_default_cache, default_cache
+
+
+def _put(cache, key, size):
+    with cache.writing(key) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            f.write(b"\0" * size)
+
+
+def test_checkout_survives_eviction(tmp_path):
+    cache = GreetingAudioCache(str(tmp_path), max_bytes=150)
+    _put(cache, "a", 100)
+
+    pinned = cache.checkout("a")
+    # Новая запись вытесняет "a", пока закреплённая копия ещё нужна рендеру
+    _put(cache, "b", 100)
+
+    assert cache.get("a") is None
+    assert os.path.getsize(pinned) == 100
+    os.remove(pinned)
+    assert cache.stats()["hits"] == 1
+
+
+def test_checkout_miss_and_pins_not_counted(tmp_path):
+    cache = GreetingAudioCache(str(tmp_path), max_bytes=150)
+
+    assert cache.checkout("missing") is None
+    _put(cache, "a", 100)
+    pinned = cache.checkout("a")
+    # Скрытая закреплённая копия не считается в размере кэша
+    _put(cache, "b", 40)
+
+    assert cache.get("a") is not None
+    os.remove(pinned)
+    assert cache.stats()["misses"] == 1
+
+
+def test_stale_pins_are_swept_on_startup(tmp_path):
+    stale = tmp_path / ".pin-1000-abc.wav"
+    stale.write_bytes(b"x")
+    cache = GreetingAudioCache(str(tmp_path))
+    _put(cache, "a", 10)
+    fresh = cache.checkout("a")
+
+    GreetingAudioCache(str(tmp_path))
+
+    assert not stale.exists()
+    assert os.path.exists(fresh)
+    os.remove(fresh)
+
+
+def test_default_cache_is_absolute_and_configurable(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    try:
+        configure_default_cache("cache")
+        assert default_cache(create=False) is None
+        cache = default_cache()
+        assert cache.cache_dir == str(tmp_path / "cache")
+
+        configure_default_cache(None)
+        assert default_cache() is None
+    finally:
+        configure_default_cache()
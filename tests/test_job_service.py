@@ -0,0 +1,110 @@
+"""Планирование и хранение заданий GreetingJobService (рендер заменён заглушкой)."""
+
+import asyncio
+import threading
+import time
+import unicodedata
+
+import pytest
+
+from app.services import job_service
+from app.services.job_service import GreetingJobService, STATUS_DONE
+
+
+@pytest.fixture
+def fake_render(monkeypatch):
+    """Рендер-заглушка: «видео» = шаблон и текст; задания шаблона "slow" ждут события."""
+    calls = []
+    release_slow = threading.Event()
+
+    def render(template_manager, template_id, text, **params):
+        calls.append((template_id, text))
+        if template_id == "slow":
+            release_slow.wait(5)
+        return f"{template_id}:{text}".encode("utf-8")
+
+    monkeypatch.setattr(job_service, "generate_greeting_from_template", render)
+    return calls, release_slow
+
+
+def test_coalescing_uses_cache_normalization(fake_render):
+    calls, _ = fake_render
+
+    async def scenario():
+        async with GreetingJobService(None, workers=1) as service:
+            # "й" в NFD и лишние пробелы — тот же текст, что в ключах кэшей
+            nfd_text = unicodedata.normalize("NFD", "Привет, мой друг")
+            assert nfd_text != "Привет, мой друг"
+            first = await service.submit("t", "Привет,  мой  друг")
+            second = await service.submit("t", nfd_text)
+            assert first == second
+            return await service.wait(first)
+
+    assert asyncio.run(scenario()) == "t:Привет,  мой  друг".encode("utf-8")
+    assert len(calls) == 1
+
+
+def test_busy_template_does_not_block_other_templates(fake_render):
+    calls, release_slow = fake_render
+
+    async def scenario():
+        async with GreetingJobService(None, workers=2, per_template_limit=1) as service:
+            slow_ids = [await service.submit("slow", f"s{i}") for i in range(3)]
+            fast_id = await service.submit("fast", "f")
+            started = time.monotonic()
+            await service.wait(fast_id, timeout=2)
+            elapsed = time.monotonic() - started
+            # Пока задания "slow" ждут, второй воркер свободен для "fast"
+            assert service.get_job(slow_ids[1]).status != STATUS_DONE
+            release_slow.set()
+            for job_id in slow_ids:
+                await service.wait(job_id, timeout=5)
+            return elapsed
+
+    assert asyncio.run(scenario()) < 1.0
+    slow_calls = [text for template_id, text in calls if template_id == "slow"]
+    assert slow_calls == ["s0", "s1", "s2"]
+
+
+def test_finished_jobs_are_capped(fake_render):
+    async def scenario():
+        async with GreetingJobService(None, workers=1, max_finished=2) as service:
+            ids = []
+            for i in range(4):
+                ids.append(await service.submit("t", f"text {i}"))
+                await service.wait(ids[-1])
+            return service, ids
+
+    service, ids = asyncio.run(scenario())
+    with pytest.raises(ValueError):
+        service.get_job(ids[0])
+    assert service.get_job(ids[-1]).result == b"t:text 3"
+
+
+def test_finished_jobs_expire(fake_render):
+    async def scenario():
+        async with GreetingJobService(None, workers=1, result_ttl=0.05) as service:
+            first = await service.submit("t", "a")
+            await service.wait(first)
+            await asyncio.sleep(0.1)
+            await service.wait(await service.submit("t", "b"))
+            return service, first
+
+    service, first = asyncio.run(scenario())
+    with pytest.raises(ValueError):
+        service.get_job(first)
+
+
+def test_submit_without_wait_reports_full_queue(fake_render):
+    _, release_slow = fake_render
+
+    async def scenario():
+        async with GreetingJobService(None, workers=1, max_queue_size=1) as service:
+            await service.submit("slow", "running")
+            await asyncio.sleep(0.05)
+            await service.submit("slow", "queued")
+            with pytest.raises(asyncio.QueueFull):
+                await service.submit("other", "overflow", wait=False)
+            release_slow.set()
+
+    asyncio.run(scenario())
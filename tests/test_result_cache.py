@@ -0,0 +1,55 @@
+"""Кэш готовых роликов: закрепление записи и вытеснение по индексу."""
+
+import io
+import os
+
+from app.disk_lru import release_pin
+from app.media_io import copy_to_target
+from app.result_cache import GreetingResultCache
+
+
+def _put(cache, key, data):
+    with cache.writing(key) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+
+
+def test_eviction_between_lookup_and_copy(tmp_path):
+    cache = GreetingResultCache(str(tmp_path), max_bytes=150)
+    _put(cache, "t1/v1-a", b"a" * 100)
+
+    pinned = cache.checkout("t1/v1-a")
+    # Параллельный рендер пишет другую запись и вытесняет эту до копирования
+    _put(cache, "t2/v1-b", b"b" * 100)
+    assert cache.get("t1/v1-a") is None
+
+    output = io.BytesIO()
+    copy_to_target(pinned, output)
+    release_pin(pinned)
+    assert output.getvalue() == b"a" * 100
+    assert not os.path.exists(pinned)
+    # Вытесненная запись — обычный промах
+    assert cache.checkout("t1/v1-a") is None
+
+
+def test_new_version_drops_old_entries_of_template(tmp_path):
+    cache = GreetingResultCache(str(tmp_path))
+    _put(cache, "t1/v1-a", b"a")
+    _put(cache, "t2/v1-a", b"a")
+
+    _put(cache, "t1/v2-b", b"b")
+
+    assert cache.get("t1/v1-a") is None
+    assert cache.get("t1/v2-b") is not None
+    assert cache.get("t2/v1-a") is not None
+
+
+def test_invalidate_template(tmp_path):
+    cache = GreetingResultCache(str(tmp_path))
+    _put(cache, "t1/v1-a", b"a")
+    _put(cache, "t2/v1-a", b"a")
+
+    cache.invalidate("t1")
+
+    assert cache.get("t1/v1-a") is None
+    assert cache.get("t2/v1-a") is not None
@@ -0,0 +1,30 @@
+"""Кэш сегментов: закреплённые сегменты переживают вытеснение."""
+
+import os
+
+from app import segment_cache
+from app.disk_lru import release_pin
+from app.segment_cache import SegmentCache
+
+
+def _fake_encode(source_path, output_path, profile, fade_out=0.0, info=None):
+    with open(output_path, "wb") as f:
+        f.write(b"\0" * 100)
+
+
+def test_checkout_segment_survives_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(segment_cache, "encode_normalized", _fake_encode)
+    source = tmp_path / "intro.mp4"
+    source.write_bytes(b"src")
+    cache = SegmentCache(str(tmp_path / "cache"), max_bytes=150)
+
+    pinned = cache.checkout_segment("t1", "intro", str(source), {"fps": 25})
+    # Другой рендер кодирует свой сегмент и вытесняет этот до склейки
+    cache.get_segment("t1", "outro", str(source), {"fps": 25})
+
+    assert os.path.getsize(pinned) == 100
+    hit = cache.checkout_segment("t1", "outro", str(source), {"fps": 25})
+    assert os.path.getsize(hit) == 100
+    for path in (pinned, hit):
+        release_pin(path)
+    assert [name for name in os.listdir(tmp_path / "cache") if name.startswith(".")] == []
@@ -0,0 +1,46 @@
+"""Кэш предложений: общее предложение разных текстов синтезируется один раз."""
+
+import io
+import wave
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pydub")
+
+from benchmarks.stub_tts import stub_tts_model
+from app import tts_generator
+
+
+def _reference_wav() -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(22050)
+        wf.writeframes(np.zeros(22050, dtype=np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def test_shared_sentence_is_a_cache_hit(tmp_path):
+    reference = _reference_wav()
+    with stub_tts_model() as model:
+        calls = []
+        inference = model.synthesizer.tts_model.inference
+
+        def counting(text, *args, **kwargs):
+            calls.append(text)
+            return inference(text, *args, **kwargs)
+
+        model.synthesizer.tts_model.inference = counting
+        cache = tts_generator.configure_sentence_cache(str(tmp_path))
+
+        for text in ("Дорогая Анна! С днём рождения!", "Привет, Олег. С днём рождения!"):
+            tts_generator.generate_speech_array(
+                text, reference, enhance=False, input_format="wav"
+            )
+
+    # Без кэша короткие предложения упаковались бы во фрагменты вместе с соседями
+    assert calls.count("С днём рождения!") == 1
+    assert cache.stats()["hits"] == 1
+    assert "Привет, Олег." in calls
@@ -0,0 +1,93 @@
+"""Разрешение шаблона одним запросом и сброс его кэша при записи."""
+
+import pytest
+
+from app.models.template_manager import TemplateManager
+from app.services import asset_ingest
+from app.services.asset_ingest import source_fingerprint
+
+
+def _fake_ingest_video(file_path, assets_dir, asset_id, normalize=True):
+    return {
+        "source_fingerprint": source_fingerprint(file_path),
+        "normalized_path": f"{assets_dir}/{asset_id}.mp4",
+        "duration": 4.0,
+        "video_codec": "h264",
+        "width": 640,
+        "height": 360,
+        "fps": 25.0
+    }
+
+
+def _fake_ingest_reference(file_path, assets_dir, asset_id):
+    return {
+        "source_fingerprint": source_fingerprint(file_path),
+        "content_hash": "abc",
+        "duration": 6.5,
+        "xtts_wav_path": f"{assets_dir}/{asset_id}.wav"
+    }
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    # ffmpeg не нужен: ingest подменяется, метаданные пишутся в БД как обычно
+    monkeypatch.setattr(asset_ingest, "ingest_video", _fake_ingest_video)
+    monkeypatch.setattr(asset_ingest, "ingest_reference", _fake_ingest_reference)
+    manager = TemplateManager(str(tmp_path / "db" / "templates.db"))
+    yield manager
+    manager.close()
+
+
+def _media(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b"\0" * 16)
+    return str(path)
+
+
+def test_resolved_template_joins_paths_and_infos(tmp_path, manager):
+    intro_path = _media(tmp_path, "intro.mp4")
+    video_path = _media(tmp_path, "main.mp4")
+    reference_path = _media(tmp_path, "voice.wav")
+    intro_id = manager.add_video(intro_path)
+    video_id = manager.add_video(video_path, ingest=False)
+    reference_id = manager.add_reference(reference_path)
+    template_id = manager.add_template(video_id, reference_id, intro_id=intro_id, description="д/р")
+
+    resolved = manager.get_resolved_template(template_id)
+
+    assert resolved["template_id"] == template_id
+    assert resolved["description"] == "д/р"
+    assert (resolved["intro_id"], resolved["video_id"], resolved["outro_id"]) == (intro_id, video_id, None)
+    assert (resolved["intro_path"], resolved["video_path"], resolved["outro_path"]) == (
+        intro_path, video_path, None
+    )
+    assert resolved["intro_info"] == manager.get_video_info(intro_id)
+    assert resolved["intro_info"]["duration"] == 4.0
+    assert resolved["video_info"] is None
+    assert resolved["outro_info"] is None
+    assert resolved["reference_path"] == reference_path
+    assert resolved["reference_info"] == manager.get_reference_info(reference_id)
+
+    with pytest.raises(ValueError, match="не найден"):
+        manager.get_resolved_template("missing")
+
+
+def test_resolved_template_cache_is_reset_by_write(tmp_path, manager):
+    video_id = manager.add_video(_media(tmp_path, "main.mp4"), ingest=False)
+    reference_id = manager.add_reference(_media(tmp_path, "voice.wav"))
+    template_id = manager.add_template(video_id, reference_id)
+
+    assert manager.get_resolved_template(template_id)["video_info"] is None
+    assert template_id in manager._template_cache
+
+    # Запись в том же менеджере: кэш сбрасывается, следующий запрос видит новые метаданные
+    manager.ingest_video(video_id)
+
+    assert template_id not in manager._template_cache
+    resolved = manager.get_resolved_template(template_id)
+    assert resolved["video_info"]["normalized_path"].endswith(f"{video_id}.mp4")
+
+    # Добавление другого шаблона тоже сбрасывает кэш
+    manager.add_template(video_id, reference_id)
+    assert template_id not in manager._template_cache
+    assert manager.get_resolved_template(template_id)["video_info"] == resolved["video_info"]
@@ -0,0 +1,118 @@
+"""TTSWorkerPool с заглушкой модели вместо XTTS."""
+
+import io
+import os
+import time
+import wave
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pydub")
+
+from benchmarks.stub_tts import StubTTS
+from app.cpu_inference import get_mode
+from app.tts_pool import TTSWorkerPool
+
+# Каталог-«барьер»: каждый воркер отмечается в нём и ждёт второго
+_BARRIER_ENV = "TTS_POOL_TEST_BARRIER"
+_BARRIER_TIMEOUT = 30.0
+
+# Сколько моделей создано в этом процессе (в каждом воркере — своё значение)
+_MODELS_CREATED = 0
+# Номер воркера по порядку прихода к барьеру (1 или 2)
+_WORKER_NUMBER = None
+
+
+class _MarkedStub(StubTTS):
+    """
+    Заглушка, которая помечает результат: длина — по длине текста,
+    второй и третий сэмплы — номер модели в процессе и номер воркера.
+    """
+
+    def __init__(self):
+        global _MODELS_CREATED
+        super().__init__()
+        _MODELS_CREATED += 1
+        serial = _MODELS_CREATED
+        xtts = self.synthesizer.tts_model
+
+        def inference(text, language, gpt_cond_latent, speaker_embedding, **kwargs):
+            worker = _wait_for_both_workers()
+            wav = np.zeros(100 + len(text), dtype=np.float32)
+            wav[0] = 1.0
+            wav[1] = serial / 1000
+            wav[2] = worker / 1000
+            return {"wav": wav}
+
+        xtts.inference = inference
+
+
+def _wait_for_both_workers() -> int:
+    """
+    Первый синтез в процессе ждёт, пока свой первый синтез не начнёт второй
+    воркер. Возвращает номер воркера.
+    """
+    global _WORKER_NUMBER
+    if _WORKER_NUMBER is None:
+        barrier = os.environ[_BARRIER_ENV]
+        # Атомарно занимаем первый свободный номер
+        for number in (1, 2):
+            try:
+                os.close(os.open(os.path.join(barrier, str(number)), os.O_CREAT | os.O_EXCL))
+            except FileExistsError:
+                continue
+            _WORKER_NUMBER = number
+            break
+        deadline = time.monotonic() + _BARRIER_TIMEOUT
+        while len(os.listdir(barrier)) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    return _WORKER_NUMBER
+
+
+def make_marked_stub() -> _MarkedStub:
+    return _MarkedStub()
+
+
+def _reference_wav() -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(22050)
+        wf.writeframes(np.zeros(22050, dtype=np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def _marker(samples: np.ndarray, index: int) -> int:
+    return int(round(float(samples[index]) * 1000))
+
+
+def test_pool_keeps_order_and_reuses_model_per_process(tmp_path, monkeypatch):
+    # Воркеры наследуют окружение (spawn)
+    monkeypatch.setenv(_BARRIER_ENV, str(tmp_path))
+    sentences = [f"Предложение номер {i}." + " слово" * i for i in range(8)]
+    # Без torch.inference_mode: заглушке torch не нужен
+    mode = get_mode("fp32", inference_mode=False)
+
+    with TTSWorkerPool(
+        size=2, num_threads=1, model_factory=make_marked_stub, inference_mode=mode
+    ) as pool:
+        results = pool.synthesize_many(sentences, _reference_wav(), input_format="wav")
+
+    assert len(results) == len(sentences)
+    workers = set()
+    for sentence, (samples, sample_rate) in zip(sentences, results):
+        # Порядок: длина результата соответствует своему предложению
+        assert len(samples) - len(sentence) == len(results[0][0]) - len(sentences[0])
+        # Модель создаётся один раз на процесс и переиспользуется для всех предложений
+        assert _marker(samples, 1) == 1
+        workers.add(_marker(samples, 2))
+        assert sample_rate == 24000
+    # Оба процесса синтезировали одновременно
+    assert workers == {1, 2}
+
+
+def test_pool_rejects_zero_size():
+    with pytest.raises(ValueError):
+        TTSWorkerPool(size=0)